@@ -0,0 +1,543 @@
+'''
+Anytime replanner for agents that must decide within a per-tick time
+budget, implementing ARA* (Likhachev, Gordon & Thrun, 2003) over the flat
+cell indices of a MazeGrid, with the incremental repairs of D* Lite so
+that, as in Anytime D* (Likhachev et al., 2005), its search survives the
+agent moving and cells changing cost.
+
+Each improve call first makes sure there is a plan for the agent's
+current location and costs, found by weighted A* with heuristic weight
+epsilon (doubled for each budget the search runs past), then spends what
+is left of the budget lowering epsilon toward 1, where the plan is
+optimal. An improvement cut short by the budget is resumed by the next
+call rather than started over, and every plan comes with a bound on how
+far from optimal it can be. As in D* Lite, the agent moving offsets
+priorities (km) instead of re-keying the open list, which happens only
+when epsilon is lowered, a slice of the budget at a time.
+'''
+
+import heapq
+import random
+import time
+import unittest
+from array import array
+from maze_grid import MazeGrid
+from dstar_lite import DStarLite
+from pathfinder import astar_flat
+from environment import Environment
+
+class AraStar:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Cost-to-goal of states with no known path
+    INF = DStarLite.INF
+
+    # Heuristic weight of the first search, and how much each
+    # improvement lowers it
+    EPSILON = 3.0
+    EPSILON_STEP = 0.5
+
+    # Heuristic weight past which a search running over budget is left to
+    # finish, rather than being made any greedier
+    MAX_EPSILON = 1024.0
+
+    # Factor by which each improvement lowers an epsilon inflated past its
+    # first value, back down to that value
+    EPSILON_DECAY = 0.5
+
+    # Number of expansions between checks of the clock
+    CLOCK_INTERVAL = 64
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, grid, start, goal, epsilon = EPSILON, step = EPSILON_STEP, clock = time.perf_counter):
+        """
+        Constructs a new planner; no search is done until improve or path
+        is called
+        :grid: A MazeGrid holding the agent's current model of the maze; the
+        planner takes ownership of updates to it through update_cells
+        :start: A maze location tuple, the agent's current location
+        :goal: A maze location tuple, the goal location
+        :epsilon: The heuristic weight of the first search, at least 1
+        :step: How much each improvement lowers epsilon
+        :clock: The time source budgets are measured with, in seconds
+        """
+        self.grid = grid
+        n = len(grid)
+        self._inf = AraStar.INF
+        self.g = array('q', [self._inf]) * n
+        self.rhs = array('q', [self._inf]) * n
+        self._open = []
+        self._open_key = {}
+        self._closed = set()
+        self._incons = set()
+        # Open states still to be queued with keys for the current epsilon,
+        # after it was lowered
+        self._rekey = []
+        # Heap of (lower bound on min(g, rhs) + h + km, state) over the open
+        # and inconsistent states, from which the plan's bound is read
+        self._fronts = []
+        self._km = 0
+        self.start = grid.index(start)
+        self.goal = grid.index(goal)
+        self.epsilon = max(1.0, float(epsilon))
+        self._first_epsilon = self.epsilon
+        self.step = step
+        self.clock = clock
+        self.bound = None
+        self.expansions = 0
+        # Epsilon the current plan was found with, returned to when costs
+        # change during an improvement
+        self._plan_epsilon = self.epsilon
+
+        # Whether the search must finish for the current start and costs
+        # before there is a plan, whether costs changed since the last
+        # search began, and whether an improvement is under way
+        self._dirty = True
+        self._changed = False
+        self._improving = False
+
+        self.rhs[self.goal] = 0
+        self._push(self.goal)
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def move_start(self, loc):
+        """
+        Informs the planner that the agent now stands at the given location
+        tuple; priorities already queued stay valid by raising km
+        """
+        s = self.grid.index(loc)
+        if s != self.start:
+            self._km += self.grid.manhattan(self.start, s)
+            self.start = s
+            self._dirty = True
+
+    def update_cells(self, changes):
+        """
+        Applies the given cell changes to the grid and queues the states
+        around them for repair by the next improve; returns the number of
+        cells whose move cost changed
+        :changes: A dict (or iterable of pairs) of maze location tuple ->
+        new maze element
+        """
+        grid = self.grid
+        costs = grid.costs
+        changed = 0
+        items = changes.items() if isinstance(changes, dict) else changes
+        for (loc, block) in items:
+            v = grid.index(loc)
+            old_cost = grid.set_cell(loc, block)
+            if costs[v] == old_cost:
+                continue
+            changed += 1
+            self._update_state(v)
+            for u in self.grid.neighbours(v):
+                self._update_state(u)
+        if changed:
+            self._dirty = True
+            self._changed = True
+        return changed
+
+    def improve(self, budget = None):
+        """
+        Searches for up to budget seconds (without limit if None), first
+        for a plan from the agent's current location if the last one is
+        out of date, then for better ones; returns True if a new plan was
+        found, to be read with path. A plan is always found, however small
+        the budget, by making the search greedier each time it runs over
+        """
+        deadline = None if budget is None else self.clock() + budget
+        found = False
+        if self._dirty:
+            if self._changed:
+                # An improvement under way is given up, so that repairing
+                # the plan does not take as long as improving it
+                if self._improving:
+                    self.epsilon = self._plan_epsilon
+                    self._improving = False
+                self._reopen()
+            limit = deadline
+            while not self._compute(limit):
+                # Over budget with no plan: inflate the heuristic and give
+                # the greedier search a fresh budget (only the plan, not its
+                # improvement, overruns the first one), or no time limit once
+                # it is fully inflated. Keys already queued are now too low,
+                # and are raised as they reach the top of the open list
+                if self.epsilon >= AraStar.MAX_EPSILON:
+                    limit = None
+                else:
+                    self.epsilon = min(self.epsilon * 2, AraStar.MAX_EPSILON)
+                    limit = self.clock() + budget
+            self._improving = False
+            self._publish()
+            found = True
+        while self.epsilon > 1.0 or self._improving:
+            if deadline is not None and self.clock() >= deadline:
+                break
+            if not self._improving:
+                self._lower_epsilon()
+                self._begin_iteration()
+                self._improving = True
+            if not self._compute(deadline):
+                break
+            self._improving = False
+            self._publish()
+            found = True
+        return found
+
+    def path(self):
+        """
+        Returns the current plan as a (cost, actions) tuple, like pathfind,
+        from the agent's location to the goal; None if the goal is
+        unreachable. Its cost is at most bound times the optimal cost
+        """
+        if self._dirty:
+            self.improve(0)
+        return self.grid.descend(self.start, self.goal, self.g, self._inf)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _key(self, u):
+        g = self.g[u]
+        rhs = self.rhs[u]
+        if g > rhs:
+            return (rhs + self.epsilon * (self.grid.manhattan(self.start, u) + self._km), rhs)
+        return (g + self.grid.manhattan(self.start, u) + self._km, g)
+
+    def _push(self, u):
+        key = self._key(u)
+        if self._open_key.get(u) == key:
+            return
+        self._open_key[u] = key
+        heapq.heappush(self._open, (key[0], key[1], u))
+        self._push_front(u)
+
+    def _push_front(self, u):
+        heapq.heappush(self._fronts, (min(self.g[u], self.rhs[u]) + self.grid.manhattan(self.start, u) + self._km, u))
+
+    def _reopen(self):
+        """
+        Queues the states set aside as inconsistent, and lets every state
+        be expanded again, after costs changed
+        """
+        for u in self._incons:
+            self._push(u)
+        self._incons.clear()
+        self._closed.clear()
+        self._changed = False
+
+    def _begin_iteration(self):
+        """
+        Starts a new search, after epsilon was lowered, over the states left
+        inconsistent by the last one, none of which has yet been expanded
+        in this one; the open states are queued again with their new keys
+        by _compute
+        """
+        open_key = self._open_key
+        for u in self._incons:
+            open_key[u] = None
+        self._incons.clear()
+        self._closed.clear()
+        self._changed = False
+        self._rekey = list(open_key)
+        self._open = []
+
+    def _lower_epsilon(self):
+        """
+        Lowers epsilon for the next improvement: geometrically while it is
+        inflated past its first value, then by step
+        """
+        if self.epsilon > self._first_epsilon:
+            self.epsilon = max(self._first_epsilon, self.epsilon * AraStar.EPSILON_DECAY)
+        else:
+            self.epsilon = max(1.0, self.epsilon - self.step)
+
+    def _compute(self, deadline):
+        """
+        Expands inconsistent states until the agent's location is
+        consistent and no open state could lower its cost-to-goal; returns
+        False if the deadline passed first, leaving the search to resume
+        """
+        g = self.g
+        rhs = self.rhs
+        open_key = self._open_key
+        closed = self._closed
+        start = self.start
+        clock = self.clock
+        # Queue the open states still waiting for keys for the current
+        # epsilon before expanding any of them
+        rekey = self._rekey
+        while rekey:
+            if deadline is not None and len(rekey) % AraStar.CLOCK_INTERVAL == 0 and clock() >= deadline:
+                return False
+            u = rekey.pop()
+            if u in open_key:
+                key = self._key(u)
+                open_key[u] = key
+                heapq.heappush(self._open, (key[0], key[1], u))
+        open_list = self._open
+        count = 0
+        while open_list:
+            count += 1
+            if deadline is not None and count % AraStar.CLOCK_INTERVAL == 0 and clock() >= deadline:
+                return False
+            (k1, k2, u) = open_list[0]
+            if open_key.get(u) != (k1, k2):
+                heapq.heappop(open_list)
+                continue
+            if (k1, k2) >= self._key(start) and rhs[start] == g[start]:
+                break
+            key = self._key(u)
+            if (k1, k2) < key:
+                # Queued before the agent moved or epsilon was raised;
+                # requeue it with its current key
+                open_key[u] = key
+                heapq.heapreplace(open_list, (key[0], key[1], u))
+                continue
+            heapq.heappop(open_list)
+            del open_key[u]
+            self.expansions += 1
+            if g[u] > rhs[u]:
+                # Overconsistent: cost-to-goal lowered, settle it
+                g[u] = rhs[u]
+                closed.add(u)
+                for p in self.grid.neighbours(u):
+                    self._update_state(p)
+            else:
+                # Underconsistent: cost-to-goal raised, reopen it and its
+                # predecessors
+                g[u] = self._inf
+                self._update_state(u)
+                for p in self.grid.neighbours(u):
+                    self._update_state(p)
+        self._dirty = False
+        return True
+
+    def _publish(self):
+        """
+        Sets bound for the plan just found: the smaller of epsilon and the
+        plan's cost over the least any open or inconsistent state could
+        still lead to, read off the top of the fronts heap; None if there
+        is no plan
+        """
+        g = self.g
+        rhs = self.rhs
+        start = self.start
+        open_key = self._open_key
+        incons = self._incons
+        fronts = self._fronts
+        least = self._inf
+        while fronts:
+            (estimate, u) = fronts[0]
+            if u not in open_key and u not in incons:
+                heapq.heappop(fronts)
+                continue
+            # Entries are lower bounds, left behind as g, rhs and the
+            # agent's location change; bring the top one up to date
+            current = min(g[u], rhs[u]) + self.grid.manhattan(start, u) + self._km
+            if estimate != current:
+                heapq.heapreplace(fronts, (current, u))
+                continue
+            least = estimate - self._km
+            break
+        self._plan_epsilon = self.epsilon
+        if g[start] >= self._inf:
+            self.bound = None
+        elif g[start] <= least:
+            self.bound = 1.0
+        else:
+            self.bound = min(self.epsilon, g[start] / least)
+
+    def _update_state(self, u):
+        """
+        Recomputes rhs(u) as the cheapest one-step lookahead toward the goal
+        and, if u is inconsistent, queues it, or sets it aside until the
+        next improvement if it was already expanded in this one
+        """
+        g = self.g
+        costs = self.grid.costs
+        if u != self.goal:
+            best = self._inf
+            if costs[u] >= 0:
+                for v in self.grid.neighbours(u):
+                    cost = costs[v]
+                    if cost >= 0:
+                        candidate = cost + g[v]
+                        if candidate < best:
+                            best = candidate
+            self.rhs[u] = best
+        if g[u] != self.rhs[u]:
+            if u in self._closed:
+                self._open_key.pop(u, None)
+                self._incons.add(u)
+                self._push_front(u)
+            else:
+                self._push(u)
+        else:
+            self._open_key.pop(u, None)
+            self._incons.discard(u)
+
+
+class AraStarTests(unittest.TestCase):
+    COST_MAP = {"P": 20, ".": 1, "U": 7}
+
+    def _optimal(self, grid, start, goal):
+        found = astar_flat(grid, grid.index(start), grid.index(goal))
+        return None if found is None else found[0][grid.index(goal)]
+
+    def _random_maze(self, rng, width, height):
+        rows = ["X" * width]
+        for y in range(height - 2):
+            rows.append("X" + "".join(rng.choice("....XXPU") for x in range(width - 2)) + "X")
+        rows.append("X" * width)
+        return rows
+
+    def test_arastar1(self):
+        # Every plan is within its bound of optimal, and improving without
+        # a budget ends at the optimal plan
+        rng = random.Random(0)
+        for trial in range(40):
+            maze = self._random_maze(rng, 12, 9)
+            grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+            open_cells = [grid.location(i) for i in range(len(grid)) if not grid.is_wall(i)]
+            if len(open_cells) < 2:
+                continue
+            (start, goal) = rng.sample(open_cells, 2)
+            optimal = self._optimal(grid, start, goal)
+            planner = AraStar(grid, start, goal)
+            planner.improve(0)
+            first = planner.path()
+            if optimal is None:
+                self.assertTrue(first is None)
+                continue
+            self.assertTrue(optimal <= first[0] <= planner.bound * optimal)
+            self.assertTrue(1.0 <= planner.bound <= AraStar.EPSILON)
+            planner.improve()
+            self.assertEqual((planner.path()[0], planner.bound, planner.epsilon), (optimal, 1.0, 1.0))
+
+    def test_arastar2(self):
+        # Plans stay within bound as the agent moves and cells change, and
+        # agree with D* Lite once fully improved
+        rng = random.Random(1)
+        maze = self._random_maze(rng, 30, 30)
+        dstar = DStarLite(MazeGrid.from_maze(maze, self.COST_MAP, "X"), (1, 1), (28, 28))
+        grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+        grid.set_cell((1, 1), ".")
+        grid.set_cell((28, 28), ".")
+        dstar.update_cells({(1, 1): ".", (28, 28): "."})
+        planner = AraStar(grid, (1, 1), (28, 28))
+        loc = (1, 1)
+        for tick in range(25):
+            changes = {(rng.randrange(1, 29), rng.randrange(1, 29)): rng.choice(".PU") for k in range(3)}
+            changes.pop(loc, None)
+            changes.pop((28, 28), None)
+            dstar.update_cells(changes)
+            planner.update_cells(changes)
+            planner.improve(0)
+            optimal = dstar.path()
+            plan = planner.path()
+            if optimal is None:
+                self.assertTrue(plan is None)
+                break
+            self.assertTrue(optimal[0] <= plan[0] <= planner.bound * optimal[0])
+            planner.improve()
+            self.assertEqual((planner.path()[0], planner.bound), (optimal[0], 1.0))
+            if plan[1]:
+                (dx, dy) = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}[plan[1][0]]
+                loc = (loc[0] + dx, loc[1] + dy)
+                dstar.move_start(loc)
+                planner.move_start(loc)
+
+    def test_arastar3(self):
+        # A budget cut short is resumed, and the plan never gets worse
+        now = [0.0]
+        def clock():
+            now[0] += 1e-4
+            return now[0]
+        maze = ["X" * 42] + ["X" + "." * 40 + "X"] * 40 + ["X" * 42]
+        grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+        planner = AraStar(grid, (1, 1), (40, 40), epsilon = 5.0, step = 1.0, clock = clock)
+        self.assertTrue(planner.improve(0))
+        costs = [planner.path()[0]]
+        epsilons = [planner.epsilon]
+        for k in range(200):
+            planner.improve(0.002)
+            costs.append(planner.path()[0])
+            epsilons.append(planner.epsilon)
+        self.assertEqual(costs[-1], 78)
+        self.assertEqual(sorted(epsilons, reverse = True), epsilons)
+        self.assertEqual(sorted(costs, reverse = True), costs)
+        self.assertEqual(planner.bound, 1.0)
+
+    def test_arastar4(self):
+        # Agents given a think budget plan with AraStar and still finish
+        maze = ["XXXXXXXXX",
+                "X..PGP..X",
+                "X.......X",
+                "X..P.P..X",
+                "X.......X",
+                "X..@....X",
+                "XXXXXXXXX"]
+        # (imported here, as maze_agent imports this module, whose classes
+        # are the agent's only when it is not run as a script)
+        import maze_agent
+        env = Environment(maze, tick_length = 0, verbose = False, think_budget = 0.01)
+        agent = maze_agent.MazeAgent(env)
+        self.assertTrue(isinstance(agent.planner, maze_agent.AraStar))
+        self.assertEqual(agent.planner.bound, 1.0)
+        self.assertEqual(env.start_mission(), -7)
+
+    def test_arastar5(self):
+        # Moving along the plan costs no search, and an epsilon inflated to
+        # find a plan in time comes back down geometrically, then by step
+        now = [0.0]
+        def clock():
+            now[0] += 1e-4
+            return now[0]
+        maze = ["X" * 42] + ["X" + "." * 40 + "X"] * 40 + ["X" * 42]
+        grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+        planner = AraStar(grid, (1, 1), (40, 40), clock = clock)
+        planner.improve()
+        (cost, actions) = planner.path()
+        expansions = planner.expansions
+        loc = (1, 1)
+        for move in actions[:10]:
+            (dx, dy) = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}[move]
+            loc = (loc[0] + dx, loc[1] + dy)
+            planner.move_start(loc)
+            planner.improve(0)
+        self.assertEqual((planner.expansions, planner.path()[0], planner.bound), (expansions, cost - 10, 1.0))
+
+        lowered = []
+        class Recording(AraStar):
+            def _lower_epsilon(self):
+                AraStar._lower_epsilon(self)
+                lowered.append(self.epsilon)
+        grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+        planner = Recording(grid, (1, 1), (40, 40), clock = clock)
+        planner.improve(0)
+        self.assertTrue(planner.epsilon > AraStar.EPSILON)
+        expected = [planner.epsilon]
+        while expected[-1] > AraStar.EPSILON:
+            expected.append(max(AraStar.EPSILON, expected[-1] / 2))
+        expected += [2.5, 2.0, 1.5, 1.0]
+        while planner.epsilon > 1.0 or planner.bound > 1.0:
+            planner.improve(0.002)
+        self.assertEqual(lowered, expected[1:])
+        self.assertEqual((planner.path()[0], planner.bound), (78, 1.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+'''
+Scaling benchmarks for the Maze Pitfall stack, run on generated mazes
+from 10x10 up to 1000x1000: pathfind, MazeKnowledgeBase tell and ask,
+MazeAgent planning per tick, and whole Environment missions. Results are
+written as a JSON baseline, and a later run can be compared against a
+saved baseline to flag regressions, e.g.:
+
+    python benchmark.py --out baseline.json
+    python benchmark.py --sizes 10 100 --compare baseline.json
+'''
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import unittest
+from environment import Environment
+from maze_generator import generate_maze
+from maze_problem import MazeProblem
+from pathfinder import pathfind
+from maze_knowledge_base import MazeKnowledgeBase, MazeClause
+
+# Benchmark names, each timed at every size
+BENCHMARKS = ("pathfind", "kb_tell", "kb_ask", "think", "start_mission")
+
+# Default maze sizes (width and height, walls included)
+SIZES = (10, 30, 100, 300, 1000)
+
+# Most explored cells the KB benchmarks tell clauses about, per maze
+KB_CELLS = 20000
+
+# Number of queries timed by the kb_ask benchmark
+KB_QUERIES = 200
+
+def run_benchmarks(sizes = SIZES, names = BENCHMARKS, seed = 0, repeat = 3):
+    """
+    Times the named benchmarks on a generated maze of each size and
+    returns the results as a baseline dict, whose "results" map each name
+    to a dict of seconds (per operation, or per tick for think) by size
+    :repeat: The number of times each is run, keeping the fastest; runs
+    taking over a second are not repeated
+    """
+    results = {name: {} for name in names}
+    for size in sizes:
+        maze = generate_maze(size, size, seed = seed)
+        for name in names:
+            best = None
+            for k in range(repeat):
+                seconds = _BENCHMARK_FUNCTIONS[name](maze, seed)
+                best = seconds if best is None else min(best, seconds)
+                if seconds > 1:
+                    break
+            results[name][str(size)] = best
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "seed": seed, "results": results}
+
+def compare(baseline, current, tolerance = 0.25, floor = 1e-6):
+    """
+    Returns a list of (name, size, baseline seconds, current seconds)
+    for every benchmark present in both baseline dicts that got slower by
+    more than the given fraction (and by more than floor seconds)
+    """
+    regressions = []
+    for (name, by_size) in current["results"].items():
+        old_by_size = baseline["results"].get(name, {})
+        for (size, seconds) in by_size.items():
+            old = old_by_size.get(size)
+            if old is not None and seconds > old * (1 + tolerance) and seconds - old > floor:
+                regressions.append((name, size, old, seconds))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the Maze Pitfall stack on generated mazes")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = list(SIZES))
+    parser.add_argument("--only", nargs = "+", choices = BENCHMARKS, default = list(BENCHMARKS))
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--out", help = "file to write the results to, as a JSON baseline")
+    parser.add_argument("--compare", help = "baseline file to compare the results against")
+    parser.add_argument("--tolerance", type = float, default = 0.25,
+                        help = "slowdown fraction beyond which a result is a regression")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.sizes, args.only, args.seed, args.repeat)
+    for name in args.only:
+        for (size, seconds) in current["results"][name].items():
+            print("%-14s %6s %12.6f" % (name, size, seconds))
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(current, out, indent = 2)
+    if args.compare:
+        with open(args.compare) as saved:
+            baseline = json.load(saved)
+        regressions = compare(baseline, current, args.tolerance)
+        for (name, size, old, seconds) in regressions:
+            print("REGRESSION %s @ %s: %.6f -> %.6f (x%.2f)" % (name, size, old, seconds, seconds / old))
+        if regressions:
+            return 1
+    return 0
+
+
+##################################################################
+# Benchmarks: each takes a maze and a seed and returns seconds
+##################################################################
+
+def _locate(maze, block):
+    return next((row.index(block), y) for (y, row) in enumerate(maze) if block in row)
+
+def _bench_pathfind(maze, seed):
+    problem = MazeProblem([list(row) for row in maze])
+    (start, goal) = (_locate(maze, Environment.PLR_BLOCK), _locate(maze, Environment.GOAL_BLOCK))
+    begin = time.perf_counter()
+    pathfind(problem, start, goal)
+    return time.perf_counter() - begin
+
+def _kb_clauses(maze):
+    """
+    Returns the clauses an agent would tell after standing on each of the
+    maze's first KB_CELLS open cells
+    """
+    clauses = []
+    for (y, row) in enumerate(maze):
+        for (x, cell) in enumerate(row):
+            if cell in (Environment.WALL_BLOCK, Environment.PIT_BLOCK):
+                continue
+            if len(clauses) >= KB_CELLS:
+                return clauses
+            spots = [s for s in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)) if maze[s[1]][s[0]] != Environment.WALL_BLOCK]
+            clauses.append(MazeClause([(("P", (x, y)), False)]))
+            if any(maze[sy][sx] == Environment.PIT_BLOCK for (sx, sy) in spots):
+                clauses.append(MazeClause([(("P", spot), True) for spot in spots]))
+            else:
+                clauses.extend(MazeClause([(("P", spot), False)]) for spot in spots)
+    return clauses
+
+def _bench_kb_tell(maze, seed):
+    clauses = _kb_clauses(maze)
+    kb = MazeKnowledgeBase()
+    begin = time.perf_counter()
+    for clause in clauses:
+        kb.tell(clause)
+    return (time.perf_counter() - begin) / max(1, len(clauses))
+
+def _bench_kb_ask(maze, seed):
+    kb = MazeKnowledgeBase()
+    for clause in _kb_clauses(maze):
+        kb.tell(clause)
+    rng = random.Random(seed)
+    queries = [MazeClause([(("P", (rng.randrange(1, len(maze[0]) - 1), rng.randrange(1, len(maze) - 1))), rng.random() < 0.5)])
+               for k in range(KB_QUERIES)]
+    begin = time.perf_counter()
+    for query in queries:
+        kb.ask(query)
+    return (time.perf_counter() - begin) / KB_QUERIES
+
+def _bench_think(maze, seed):
+    env = Environment(maze, tick_length = 0, verbose = False)
+    env.start_mission()
+    stats = env.get_stats()
+    return stats["planning_time"] / max(1, stats["ticks"])
+
+def _bench_start_mission(maze, seed):
+    begin = time.perf_counter()
+    Environment(maze, tick_length = 0, verbose = False).start_mission()
+    return time.perf_counter() - begin
+
+_BENCHMARK_FUNCTIONS = {"pathfind": _bench_pathfind, "kb_tell": _bench_kb_tell, "kb_ask": _bench_kb_ask,
+                        "think": _bench_think, "start_mission": _bench_start_mission}
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_benchmark1(self):
+        baseline = run_benchmarks(sizes = (10, 12), repeat = 1)
+        self.assertEqual(set(baseline["results"]), set(BENCHMARKS))
+        for by_size in baseline["results"].values():
+            self.assertEqual(set(by_size), {"10", "12"})
+            self.assertTrue(all(seconds >= 0 for seconds in by_size.values()))
+        self.assertEqual(json.loads(json.dumps(baseline)), baseline)
+
+    def test_benchmark2(self):
+        baseline = {"results": {"pathfind": {"10": 0.001, "100": 0.1}, "think": {"10": 0.5}}}
+        current = {"results": {"pathfind": {"10": 0.0011, "100": 0.2, "1000": 9.0}, "kb_ask": {"10": 1.0}}}
+        self.assertEqual(compare(baseline, current), [("pathfind", "100", 0.1, 0.2)])
+        self.assertEqual(compare(baseline, current, tolerance = 0.05), [("pathfind", "10", 0.001, 0.0011), ("pathfind", "100", 0.1, 0.2)])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+'''
+Copy-on-write dictionary with constant-time snapshots. A CowDict's
+contents live in a stack of shared, frozen layers under a private top
+layer that takes every write; fork() freezes the top layer and hands the
+same stack to a new CowDict, so a fork costs nothing up front and each
+side then pays only for what it changes. Values are shared between forks
+as they are, so they should be immutable (or replaced rather than
+mutated in place).
+'''
+
+import unittest
+
+class CowDict:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Marks a key deleted in a layer above one that still holds it
+    _DELETED = object()
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, items = ()):
+        """
+        Constructs a CowDict holding the given mapping or (key, value) pairs
+        """
+        self._layers = ()
+        self._top = dict(items)
+        self._len = len(self._top)
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def fork(self):
+        """
+        Returns a CowDict with the same contents as this one; later writes
+        to either are not seen by the other
+        """
+        if self._top:
+            # Merge the new layer into those below it while they are not
+            # much larger, which keeps the stack O(log n) deep at an O(log n)
+            # amortized cost per write; shared layers are never changed
+            layers = list(self._layers)
+            layers.append(self._top)
+            while len(layers) > 1 and len(layers[-2]) <= 2 * len(layers[-1]):
+                merged = dict(layers[-2])
+                merged.update(layers.pop())
+                if len(layers) == 1:
+                    merged = {key: value for (key, value) in merged.items() if value is not CowDict._DELETED}
+                layers[-1] = merged
+            self._layers = tuple(layers)
+            self._top = {}
+        other = CowDict.__new__(CowDict)
+        other._layers = self._layers
+        other._top = {}
+        other._len = self._len
+        return other
+
+    def get(self, key, default = None):
+        top = self._top
+        if key in top:
+            value = top[key]
+            return default if value is CowDict._DELETED else value
+        for layer in reversed(self._layers):
+            if key in layer:
+                value = layer[key]
+                return default if value is CowDict._DELETED else value
+        return default
+
+    def pop(self, key, *default):
+        value = self.get(key, CowDict._DELETED)
+        if value is CowDict._DELETED:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        if self._layers:
+            self._top[key] = CowDict._DELETED
+        else:
+            del self._top[key]
+        self._len -= 1
+        return value
+
+    def items(self):
+        """
+        Returns a list of the (key, value) pairs held
+        """
+        if not self._layers:
+            return list(self._top.items())
+        result = {}
+        for layer in self._layers + (self._top,):
+            result.update(layer)
+        return [(key, value) for (key, value) in result.items() if value is not CowDict._DELETED]
+
+    def __getitem__(self, key):
+        value = self.get(key, CowDict._DELETED)
+        if value is CowDict._DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        top = self._top
+        if key in top:
+            if top[key] is CowDict._DELETED:
+                self._len += 1
+        elif key not in self:
+            self._len += 1
+        top[key] = value
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        return self.get(key, CowDict._DELETED) is not CowDict._DELETED
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter([key for (key, value) in self.items()])
+
+
+class CowDictTests(unittest.TestCase):
+    def test_cow1(self):
+        d = CowDict({"a": 1, "b": 2})
+        e = d.fork()
+        e["a"] = 10
+        del e["b"]
+        e["c"] = 3
+        d["d"] = 4
+        self.assertEqual(sorted(d.items()), [("a", 1), ("b", 2), ("d", 4)])
+        self.assertEqual(sorted(e.items()), [("a", 10), ("c", 3)])
+        self.assertEqual((len(d), len(e)), (3, 2))
+        self.assertTrue("b" in d and "b" not in e)
+        self.assertEqual(e.pop("b", None), None)
+        self.assertRaises(KeyError, e.__getitem__, "b")
+        e["b"] = 5
+        self.assertEqual((e["b"], len(e)), (5, 3))
+
+    def test_cow2(self):
+        # Long fork chains are merged without changing any contents
+        d = CowDict()
+        forks = []
+        for k in range(64):
+            d[k] = k
+            forks.append(d.fork())
+            if k % 2:
+                del d[k - 1]
+        self.assertEqual(sorted(d), [k for k in range(64) if k % 2 or k == 63])
+        self.assertEqual(len(d), 32)
+        self.assertEqual(sorted(forks[4]), [1, 3, 4])
+        self.assertEqual(len(forks[4]), 3)
+        self.assertTrue(len(d._layers) <= 7)
+
+if __name__ == "__main__":
+    unittest.main()
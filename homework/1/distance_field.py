@@ -0,0 +1,248 @@
+'''
+Exact cost-to-goal field over a MazeGrid, computed by running Dijkstra
+backwards from a goal cell. The field accounts for walls and for the
+cost of every cell (pits, unknowns, ...), so it serves as a perfect
+heuristic for A* toward that goal. It remembers the grid version it was
+computed for and, when cells change, repairs only the affected part of
+the field rather than recomputing it.
+'''
+
+import heapq
+import unittest
+from array import array
+from maze_grid import MazeGrid
+
+class DistanceField:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Distance of cells from which the goal cannot be reached
+    INF = 2 ** 62
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, grid, goal):
+        """
+        Computes the field of cheapest path costs from every cell to goal
+        :grid: A MazeGrid object
+        :goal: A maze location tuple
+        """
+        self.grid = grid
+        self.goal = grid.index(goal)
+        self.rebuilds = 0
+        self.repairs = 0
+        self._build()
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def refresh(self):
+        """
+        Brings the field up to date with the grid's current version,
+        repairing it from the grid's change log where possible; returns
+        True if anything had to be done
+        """
+        grid = self.grid
+        if self.version == grid.version:
+            return False
+        changed = grid.changes_since(self.version)
+        if changed is None:
+            self._build()
+        else:
+            self._repair(changed)
+        return True
+
+    def distance(self, loc):
+        """
+        Returns the cost of the cheapest path from the given maze location
+        tuple to the goal, or DistanceField.INF if there is none
+        """
+        self.refresh()
+        return self.dist[self.grid.index(loc)]
+
+    def heuristic(self, state, goal):
+        """
+        Heuristic with the same signature as pathfinder.heuristic; exact
+        for the goal this field was built for
+        """
+        return self.distance(state)
+
+    def path(self, start):
+        """
+        Returns the (cost, actions) of a cheapest path from the given maze
+        location tuple to the goal by following the field's successor
+        pointers, or None if the goal cannot be reached
+        """
+        self.refresh()
+        grid = self.grid
+        node = grid.index(start)
+        cost = self.dist[node]
+        if cost >= DistanceField.INF:
+            return None
+        soln = []
+        succ = self.succ
+        while node != self.goal:
+            nxt = succ[node]
+            soln.append(grid.action(node, nxt))
+            node = nxt
+        return (cost, soln)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _build(self):
+        """
+        Computes the whole field from scratch
+        """
+        n = len(self.grid)
+        self.dist = array('q', [DistanceField.INF]) * n
+        self.succ = array('q', [-1]) * n
+        self.version = self.grid.version
+        self.rebuilds += 1
+        self.dist[self.goal] = 0
+        self._settle([(0, self.goal)])
+
+    def _settle(self, heap):
+        """
+        Runs backward Dijkstra from the given heap of (distance, index)
+        entries, relaxing the edges into each settled cell
+        """
+        dist = self.dist
+        succ = self.succ
+        costs = self.grid.costs
+        wall = MazeGrid.WALL_COST
+        heapify = heapq.heapify
+        push = heapq.heappush
+        pop = heapq.heappop
+        heapify(heap)
+        while heap:
+            (d, v) = pop(heap)
+            if d > dist[v]:
+                continue
+            # Moving from a neighbour u onto v costs costs[v]
+            step = costs[v]
+            if step == wall:
+                continue
+            candidate = d + step
+            for u in self.grid.neighbours(v):
+                if candidate < dist[u] and costs[u] != wall:
+                    dist[u] = candidate
+                    succ[u] = v
+                    push(heap, (candidate, u))
+
+    def _repair(self, changed):
+        """
+        Repairs the field after the cells at the given flat indices changed
+        cost. Cells whose cheapest path entered a changed cell (and every
+        cell whose path runs through one of those) are reset and re-derived
+        from the unaffected cells around them; cheaper entries into changed
+        cells are then propagated outward as in Dijkstra
+        """
+        dist = self.dist
+        succ = self.succ
+        costs = self.grid.costs
+        wall = MazeGrid.WALL_COST
+        inf = DistanceField.INF
+        self.repairs += 1
+
+        # Gather the subtrees (of the successor tree) hanging off changed cells
+        affected = set()
+        stack = []
+        for v in changed:
+            if costs[v] == wall and v != self.goal:
+                stack.append(v)
+            for u in self.grid.neighbours(v):
+                if succ[u] == v:
+                    stack.append(u)
+        while stack:
+            u = stack.pop()
+            if u in affected:
+                continue
+            affected.add(u)
+            for c in self.grid.neighbours(u):
+                if succ[c] == u:
+                    stack.append(c)
+        for u in affected:
+            dist[u] = inf
+            succ[u] = -1
+
+        # Seed each reset cell from its unaffected neighbours, and each
+        # neighbour of a changed cell from the changed cell's new cost
+        heap = []
+        for u in affected:
+            if costs[u] == wall:
+                continue
+            for v in self.grid.neighbours(u):
+                if v not in affected and costs[v] != wall and dist[v] < inf:
+                    candidate = dist[v] + costs[v]
+                    if candidate < dist[u]:
+                        dist[u] = candidate
+                        succ[u] = v
+            if dist[u] < inf:
+                heap.append((dist[u], u))
+        for v in changed:
+            if costs[v] == wall:
+                continue
+            if dist[v] < inf:
+                heap.append((dist[v], v))
+            else:
+                # A cell opened up (e.g. a former wall): derive its own cost
+                for x in self.grid.neighbours(v):
+                    if costs[x] != wall and dist[x] + costs[x] < dist[v]:
+                        dist[v] = dist[x] + costs[x]
+                        succ[v] = x
+                if dist[v] < inf:
+                    heap.append((dist[v], v))
+        self._settle(heap)
+        self.version = self.grid.version
+
+
+class DistanceFieldTests(unittest.TestCase):
+    COST_MAP = {"P": 20, ".": 1, "U": 7}
+
+    def test_field1(self):
+        grid = MazeGrid.from_maze(["XXXXX",
+                                   "X.P.X",
+                                   "X.U.X",
+                                   "X...X",
+                                   "XXXXX"], self.COST_MAP, "X")
+        field = DistanceField(grid, (3, 1))
+        self.assertEqual(field.distance((3, 1)), 0)
+        self.assertEqual(field.distance((1, 1)), 6)
+        self.assertEqual(field.path((1, 1)), (6, ["D", "D", "R", "R", "U", "U"]))
+        self.assertEqual(field.distance((2, 2)), 2)
+
+    def test_field2(self):
+        grid = MazeGrid.from_maze(["XXXXX",
+                                   "X.P.X",
+                                   "X.U.X",
+                                   "X...X",
+                                   "XXXXX"], self.COST_MAP, "X")
+        field = DistanceField(grid, (3, 1))
+
+        # Cheaper cells are repaired in place, without a rebuild
+        grid.set_cell((2, 1), ".")
+        self.assertEqual(field.distance((1, 1)), 2)
+        self.assertEqual(field.rebuilds, 1)
+
+        # So are costlier cells and walls, including the cells behind them
+        grid.set_cell((2, 1), "X")
+        grid.set_cell((2, 3), "P")
+        self.assertEqual(field.distance((1, 1)), 10)
+        self.assertEqual(field.distance((1, 3)), 10)
+        grid.set_cell((3, 2), "X")
+        self.assertEqual(field.distance((1, 1)), DistanceField.INF)
+        self.assertTrue(field.path((1, 1)) is None)
+        self.assertEqual(field.rebuilds, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+'''
+Incremental replanner for agents that move through a grid maze whose
+cell costs change as they learn about it, implementing D* Lite
+(Koenig & Likhachev, 2002) over the flat cell indices of a MazeGrid.
+
+The search runs backwards from the goal, so g(n) is the cost of the
+cheapest known path from n to the goal; when cells change cost, only
+the states whose g-values are affected are re-expanded, and when the
+agent moves, the search is kept by offsetting priorities (km) rather
+than by starting over.
+'''
+
+import heapq
+import unittest
+from array import array
+from maze_grid import MazeGrid
+
+class DStarLite:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Cost-to-goal of states with no known path; cell costs may rise after
+    # construction, so this cannot be derived from the initial grid
+    INF = 2 ** 62
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, grid, start, goal):
+        """
+        Constructs a new planner and computes the initial plan
+        :grid: A MazeGrid holding the agent's current model of the maze; the
+        planner takes ownership of updates to it through update_cells
+        :start: A maze location tuple, the agent's current location
+        :goal: A maze location tuple, the goal location
+        """
+        self.grid = grid
+        n = len(grid)
+        self._inf = DStarLite.INF
+        self.g = array('q', [self._inf]) * n
+        self.rhs = array('q', [self._inf]) * n
+        self._open = []
+        self._open_key = {}
+        self._km = 0
+        self.start = grid.index(start)
+        self.goal = grid.index(goal)
+        self.expansions = 0
+
+        self.rhs[self.goal] = 0
+        self._push(self.goal)
+        self.compute()
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def move_start(self, loc):
+        """
+        Informs the planner that the agent now stands at the given location
+        tuple; priorities already on the open list stay valid by raising km
+        """
+        s = self.grid.index(loc)
+        if s != self.start:
+            self._km += self.grid.manhattan(self.start, s)
+            self.start = s
+
+    def update_cells(self, changes):
+        """
+        Applies the given cell changes to the grid and repairs the search
+        state around them, then recomputes the plan; the work done scales
+        with the number of states whose cost-to-goal actually changes.
+        Returns the number of cells whose move cost changed
+        :changes: A dict (or iterable of pairs) of maze location tuple ->
+        new maze element
+        """
+        grid = self.grid
+        costs = grid.costs
+        changed = 0
+        items = changes.items() if isinstance(changes, dict) else changes
+        for (loc, block) in items:
+            v = grid.index(loc)
+            old_cost = grid.set_cell(loc, block)
+            if costs[v] == old_cost:
+                continue
+            changed += 1
+            # The cost of entering v affects every edge into v, i.e., the
+            # rhs of each neighbour, and v itself if it became (or stopped
+            # being) a wall
+            self._update_vertex(v)
+            for u in self.grid.neighbours(v):
+                self._update_vertex(u)
+        if changed:
+            self.compute()
+        return changed
+
+    def compute(self):
+        """
+        Expands inconsistent states until the agent's location is
+        consistent and no open state could lower its cost-to-goal
+        """
+        g = self.g
+        rhs = self.rhs
+        open_list = self._open
+        open_key = self._open_key
+        start = self.start
+        while open_list:
+            (k1, k2, u) = open_list[0]
+            if open_key.get(u) != (k1, k2):
+                heapq.heappop(open_list)
+                continue
+            if (k1, k2) >= self._key(start) and rhs[start] == g[start]:
+                break
+            heapq.heappop(open_list)
+            del open_key[u]
+            self.expansions += 1
+            new_key = self._key(u)
+            if (k1, k2) < new_key:
+                # Pushed before the agent moved; requeue with its current key
+                self._push(u)
+            elif g[u] > rhs[u]:
+                # Overconsistent: cost-to-goal lowered, settle it
+                g[u] = rhs[u]
+                for p in self.grid.neighbours(u):
+                    self._update_vertex(p)
+            else:
+                # Underconsistent: cost-to-goal raised, reopen it and its
+                # predecessors
+                g[u] = self._inf
+                self._update_vertex(u)
+                for p in self.grid.neighbours(u):
+                    self._update_vertex(p)
+
+    def path(self):
+        """
+        Returns the current plan as a (cost, actions) tuple, like pathfind,
+        from the agent's location to the goal; None if the goal is unreachable
+        """
+        # Settles the agent's location first if it moved off the last plan
+        self.compute()
+        return self.grid.descend(self.start, self.goal, self.g, self._inf)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _key(self, u):
+        m = min(self.g[u], self.rhs[u])
+        return (m + self.grid.manhattan(self.start, u) + self._km, m)
+
+    def _push(self, u):
+        key = self._key(u)
+        self._open_key[u] = key
+        heapq.heappush(self._open, (key[0], key[1], u))
+
+    def _update_vertex(self, u):
+        """
+        Recomputes rhs(u) as the cheapest one-step lookahead toward the goal
+        and (re)queues u if it is inconsistent
+        """
+        g = self.g
+        costs = self.grid.costs
+        if u != self.goal:
+            best = self._inf
+            if costs[u] >= 0:
+                for v in self.grid.neighbours(u):
+                    cost = costs[v]
+                    if cost >= 0:
+                        candidate = cost + g[v]
+                        if candidate < best:
+                            best = candidate
+            self.rhs[u] = best
+        if g[u] != self.rhs[u]:
+            self._push(u)
+        elif u in self._open_key:
+            del self._open_key[u]
+
+
+class DStarLiteTests(unittest.TestCase):
+    COST_MAP = {"P": 20, ".": 1, "U": 7}
+
+    def test_dstarlite1(self):
+        maze = ["XXXXX",
+                "X...X",
+                "X.X.X",
+                "X...X",
+                "XXXXX"]
+        planner = DStarLite(MazeGrid.from_maze(maze, self.COST_MAP, "X"), (1, 1), (3, 3))
+        self.assertEqual(planner.path()[0], 4)
+        
+        # Blocking one route leaves the other, at the same cost
+        planner.update_cells({(2, 1): "X"})
+        self.assertEqual(planner.path(), (4, ["D", "D", "R", "R"]))
+        
+        # A pit on the remaining route makes the agent pay for it
+        planner.update_cells({(1, 2): "P"})
+        self.assertEqual(planner.path()[0], 23)
+        
+        # Reopening the first route is found again
+        planner.update_cells({(2, 1): "."})
+        self.assertEqual(planner.path(), (4, ["R", "R", "D", "D"]))
+        
+    def test_dstarlite2(self):
+        maze = ["XXXXX",
+                "X.X.X",
+                "XXXXX"]
+        planner = DStarLite(MazeGrid.from_maze(maze, self.COST_MAP, "X"), (1, 1), (3, 1))
+        self.assertTrue(planner.path() is None)
+        
+    def test_dstarlite3(self):
+        maze = ["XXXXXX",
+                "X....X",
+                "XXXXXX"]
+        planner = DStarLite(MazeGrid.from_maze(maze, self.COST_MAP, "X"), (1, 1), (4, 1))
+        planner.move_start((2, 1))
+        self.assertEqual(planner.update_cells({(2, 1): "."}), 0)
+        self.assertEqual(planner.path(), (2, ["R", "R"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,11 +4,10 @@ the MazePitfall problem with BlindBot agent
 '''
 
 import os
-import re
 import sys
 import time
-import copy
-from maze_agent import *
+from maze_view import MazeView
+from renderer import default_renderer
 
 class Environment:
     
@@ -33,48 +32,64 @@ class Environment:
     WRN_BLOCK  = "B"
     UNK_BLOCK  = "?"
     
+    # Byte codes of the maze contents tested on every tick
+    _WALL_CODE = ord(WALL_BLOCK)
+    _PIT_CODE  = ord(PIT_BLOCK)
+    _WRN_CODE  = ord(WRN_BLOCK)
+    _PLR_CODE  = ord(PLR_BLOCK)
+    
     
     ##################################################################
     # Constructor
     ##################################################################
     
-    def __init__ (self, maze, tick_length = 1, verbose = True):
+    def __init__ (self, maze, tick_length = 1, verbose = True, renderer = None, trace = None, think_budget = None):
         """
         Initializes the environment from a given maze, specified as an
         array of strings with maze elements
         :maze: The array of strings specifying the challenge
         :tick_length: The duration between agent decisions, in seconds
         :verbose: Whether or not the maze updates will be printed
+        :renderer: The Renderer drawing the maze updates when verbose,
+        defaulting to renderer.default_renderer() for stdout
+        :trace: An episode_trace.TraceRecorder to record each tick to, if
+        any; it stays the caller's to close, e.g. with a with statement
+        :think_budget: Seconds the agent may spend planning per tick, if
+        limited; the agent then plans with an anytime planner
         """
-        self._maze = maze
         self._tick_length = tick_length
         self._verbose = verbose
-        self._pits = set()
-        self._goals = set()
+        self._renderer = None if not verbose else default_renderer() if renderer is None else renderer
+        self._trace = trace
+        self._think_budget = think_budget
         
-        # Scan for pits and goals in the input maze
-        for (row_num, row) in enumerate(maze):
-            for (col_num, cell) in enumerate(row):
-                if cell == Environment.GOAL_BLOCK:
-                    self._goals.add((col_num, row_num))
-                if cell == Environment.PIT_BLOCK:
-                    self._pits.add((col_num, row_num))
-                if cell == Environment.PLR_BLOCK:
-                    self._player_loc = self._initial_loc = (col_num, row_num)
+        # The true map, as shown (with the player), the true map with its
+        # breezes revealed, and the agent's view are each one byte per
+        # cell, indexed y * width + x
+        shown = MazeView.from_maze(maze)
+        (w, n) = (shown.width, len(shown.cells))
+        self._width = w
+        self._maze = shown.cells
+        player = self._maze.find(Environment.PLR_BLOCK.encode("ascii"))
+        self._player_loc = self._initial_loc = (player % w, player // w)
+        self._goals = {(i % w, i // w) for i in Environment._find_all(self._maze, Environment.GOAL_BLOCK)}
         
-        breeze_lists = [Environment._get_adjacent(loc) for loc in self._pits]
-        self._breezes = {item for sublist in breeze_lists for item in sublist if item not in self._pits and item not in self._goals}
-
-        # Initialize the MazeAgent and ready simulation!
+        overlay = bytearray(self._maze)
+        overlay[player] = ord(Environment.SAFE_BLOCK)
+        self._og_maze = Environment.reveal_breezes(overlay, w, n // w)
+        
+        # Initialize the MazeAgent and ready simulation! (imported here, as
+        # the agent's modules import this one for its constants)
+        from maze_agent import MazeAgent
         self._goal_reached = False
+        self._ticks = 0
+        self._pits_hit = 0
+        self._think_time = 0.0
         self._ag_maze = self._make_agent_maze()
         self._ag_tile = Environment.SAFE_BLOCK
-        self._maze = [list(row) for row in maze] # Easier to change elements in this format
-        self._og_maze = copy.deepcopy(self._maze)
-        self._og_maze[self._player_loc[1]][self._player_loc[0]] = Environment.SAFE_BLOCK
-        for (c, r) in self._breezes:
-            self._og_maze[r][c] = Environment.WRN_BLOCK
+        start = time.perf_counter()
         self._agent = MazeAgent(self)
+        self._think_time += time.perf_counter() - start
     
     
     ##################################################################
@@ -87,6 +102,22 @@ class Environment:
         """
         return self._player_loc
     
+    def get_think_budget (self):
+        """
+        Returns the seconds the agent may spend planning per tick, or None
+        if unlimited
+        """
+        return self._think_budget
+    
+    def get_stats (self):
+        """
+        Returns a dict of the mission's record so far: ticks taken, pits
+        fallen into, whether the goal was reached, and the seconds spent
+        in the agent's planning (its constructor and think calls)
+        """
+        return {"ticks": self._ticks, "pits": self._pits_hit,
+                "goal_reached": self._goal_reached, "planning_time": self._think_time}
+    
     def get_agent_maze (self):
         """
         Returns the agent's mental model of the maze, without key
@@ -95,14 +126,23 @@ class Environment:
         """
         return self._ag_maze
     
+    def get_true_maze (self):
+        """
+        Returns the true maze, with the player and the breezes on the
+        tiles they have visited, as a list of strings
+        """
+        return MazeView(self._width, len(self._maze) // self._width, self._maze).rows()
+    
     def start_mission (self):
         """
         Manages the agent's action loop and the environment's record-keeping
         mechanics
         """
         score = 0
+        clock = time.perf_counter
         while (score > Environment.MIN_SCORE):
-            time.sleep(self._tick_length)
+            if self._tick_length:
+                time.sleep(self._tick_length)
             
             # Get player's next move in their plan, then execute
             next_act = self._agent.get_next_move()
@@ -110,21 +150,62 @@ class Environment:
             
             # Return a perception for the agent to think about and plan next
             perception = {"loc": self._player_loc, "tile": self._ag_tile}
-            self._agent.think(perception)
+            start = clock()
+            if self._think_budget is None:
+                self._agent.think(perception)
+            else:
+                self._agent.think(perception, self._think_budget)
+            think_time = clock() - start
+            self._think_time += think_time
             
             # Assess the post-move penalty and whether or not the game is complete
-            penalty = Environment.PIT_PENALTY if self._pit_test(self._player_loc) else Environment.MOV_PENALTY
-            score = score - penalty
-            if self._verbose:
-                print("\nCurrent Loc: " + str(self._player_loc) + " [" + self._ag_tile + "]\nLast Move: " + str(next_act) + "\nScore: " + str(score) + "\n")
+            self._ticks += 1
+            if self._pit_test(self._player_loc):
+                self._pits_hit += 1
+                delta = -Environment.PIT_PENALTY
+            else:
+                delta = -Environment.MOV_PENALTY
+            score += delta
+            if self._trace is not None:
+                self._trace.record(next_act, self._player_loc, self._ag_tile, delta,
+                                   self._neighbour_view(self._player_loc), self._agent.plan.qsize(), think_time)
             if self._goal_test(self._player_loc):
+                self._goal_reached = True
+            over = self._goal_reached or score <= Environment.MIN_SCORE
+            if self._verbose:
+                self._update_display(next_act, score, over)
+            if over:
                 break
         
         if self._verbose:
-            print("[!] Game Complete! Final Score: " + str(score))
+            self._renderer.close()
         return score
             
     
+    @staticmethod
+    def reveal_breezes (cells, width, height):
+        """
+        Returns a copy of the given maze cells (one byte per maze element,
+        indexed y * width + x, possibly several same-shape mazes stacked
+        one after another) with a breeze on every cell next to a pit that
+        is not itself a pit, goal or wall
+        """
+        # Shift the pit bitset one cell each way, masking off the shifts
+        # that would wrap around a row's ends or a maze's top and bottom
+        n = len(cells)
+        (w, size) = (width, width * height)
+        count = n // size if size else 0
+        pits = Environment._bitset(cells, Environment.PIT_BLOCK)
+        blocked = pits | Environment._bitset(cells, Environment.GOAL_BLOCK) | Environment._bitset(cells, Environment.WALL_BLOCK)
+        not_first = Environment._mask(("0" + "1" * (w - 1)) * (n // w))
+        not_last = Environment._mask(("1" * (w - 1) + "0") * (n // w))
+        not_top = Environment._mask(("0" * w + "1" * (size - w)) * count)
+        not_bottom = Environment._mask(("1" * (size - w) + "0" * w) * count)
+        breezes = (((pits << 1) & not_first) | ((pits >> 1) & not_last) |
+                   ((pits << w) & not_top) | ((pits >> w) & not_bottom))
+        return Environment._fill(cells, breezes & ~blocked, Environment.WRN_BLOCK)
+    
+    
     ##################################################################
     # "Private" Helper Methods
     ##################################################################
@@ -137,30 +218,86 @@ class Environment:
         (x, y) = loc
         return [(x+1, y), (x-1, y), (x, y+1), (x, y-1)]
     
-    def _update_display (self, move):
-        for (rowIndex, row) in enumerate(self._maze):
-            print(''.join(row) + "\t" + ''.join(self._ag_maze[rowIndex]))
+    @staticmethod
+    def _find_all (cells, block):
+        """
+        Yields the index of every cell holding the given maze element
+        """
+        code = block.encode("ascii")
+        i = cells.find(code)
+        while i >= 0:
+            yield i
+            i = cells.find(code, i + 1)
+    
+    @staticmethod
+    def _bitset (cells, block):
+        """
+        Returns an int whose bit i is set if cell i holds the given maze
+        element
+        """
+        table = bytearray(b"0" * 256)
+        table[ord(block)] = ord("1")
+        return int(cells.translate(table)[::-1] or b"0", 2)
+    
+    @staticmethod
+    def _mask (flags):
+        """
+        Returns an int whose bit i is set if character i of the given
+        string of 0s and 1s is a 1
+        """
+        return int(flags[::-1] or "0", 2)
+    
+    @staticmethod
+    def _fill (cells, bits, block):
+        """
+        Returns a copy of the given cells with the maze element written
+        to every cell i whose bit i is set, as one masked blend of the
+        cells read as a big int
+        """
+        n = len(cells)
+        table = bytes.maketrans(b"01", b"\x00\xff")
+        mask = int.from_bytes(format(bits, "0%db" % n)[::-1].encode("ascii").translate(table), "big")
+        fill = int.from_bytes(block.encode("ascii") * n, "big")
+        blended = (int.from_bytes(cells, "big") & ~mask) | (fill & mask)
+        return bytearray(blended.to_bytes(n, "big"))
+    
+    def _update_display (self, move, score, over):
+        """
+        Hands the renderer this tick's frame: the true maze beside the
+        agent's, then the status; the final frame is always drawn
+        """
+        def frame ():
+            lines = [row + "  " + view for (row, view) in zip(self.get_true_maze(), self._ag_maze.rows())]
+            lines += ["", "Current Loc: %s [%s]" % (self._player_loc, self._ag_tile),
+                      "Last Move: %s" % move, "Score: %d" % score]
+            if over:
+                lines += ["", "[!] Game Complete! Final Score: %d" % score]
+            return lines
+        self._renderer.render(frame, force = over)
+        
+    def _index (self, loc):
+        return loc[1] * self._width + loc[0]
         
     def _wall_test (self, loc):
-        (x, y) = loc
-        return self._maze[y][x] == Environment.WALL_BLOCK
+        return self._og_maze[self._index(loc)] == Environment._WALL_CODE
     
     def _goal_test (self, loc):
         return loc in self._goals
     
     def _breeze_test (self, loc):
-        return loc in self._breezes
+        return self._og_maze[self._index(loc)] == Environment._WRN_CODE
     
     def _pit_test (self, loc):
-        return loc in self._pits
+        return self._og_maze[self._index(loc)] == Environment._PIT_CODE
         
     def _make_agent_maze (self):
         """
         Converts the 'true' maze into one with hidden tiles (?) for the agent
         to update as it learns
         """
-        sub_regexp = "[" + Environment.PIT_BLOCK + Environment.SAFE_BLOCK + "]"
-        return [list(re.sub(sub_regexp, Environment.UNK_BLOCK, r)) for r in self._maze]
+        hidden = (Environment.PIT_BLOCK + Environment.SAFE_BLOCK).encode("ascii")
+        table = bytes.maketrans(hidden, Environment.UNK_BLOCK.encode("ascii") * len(hidden))
+        return MazeView(self._width, len(self._maze) // self._width, self._maze.translate(table))
     
     def _move_request (self, move):
         old_loc = self._player_loc
@@ -169,15 +306,22 @@ class Environment:
             new_loc = old_loc
         self._update_mazes(self._player_loc, new_loc)
         self._player_loc = new_loc
-        if self._verbose:
-            self._update_display(move)
+    
+    def _neighbour_view (self, loc):
+        """
+        Returns the agent maze's elements right of, left of, below and
+        above the given location, as 4 bytes (0 for any off the maze)
+        """
+        (i, w, cells) = (self._index(loc), self._width, self._ag_maze.cells)
+        return bytes(cells[j] if 0 <= j < len(cells) and (j // w == i // w or j % w == i % w) else 0
+                     for j in (i + 1, i - 1, i + w, i - w))
     
     def _update_mazes (self, old_loc, new_loc):
-        self._maze[old_loc[1]][old_loc[0]] = self._og_maze[old_loc[1]][old_loc[0]]
-        self._maze[new_loc[1]][new_loc[0]] = Environment.PLR_BLOCK
-        self._ag_maze[old_loc[1]][old_loc[0]] = self._og_maze[old_loc[1]][old_loc[0]]
-        self._ag_maze[new_loc[1]][new_loc[0]] = Environment.PLR_BLOCK
-        self._ag_tile = self._og_maze[new_loc[1]][new_loc[0]]
+        (old, new) = (self._index(old_loc), self._index(new_loc))
+        agent_cells = self._ag_maze.cells
+        self._maze[old] = agent_cells[old] = self._og_maze[old]
+        self._maze[new] = agent_cells[new] = Environment._PLR_CODE
+        self._ag_tile = chr(self._og_maze[new])
     
 
 if __name__ == "__main__":
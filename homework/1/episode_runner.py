@@ -0,0 +1,234 @@
+'''
+Headless batch runner for Maze Pitfall episodes. Every episode is played
+out by an Environment and its MazeAgent with no ticking delay and no
+display, spread across a pool of worker processes; each episode yields a
+record of its score, ticks, pits hit and planning time as soon as it
+finishes, and records fold into an EpisodeSummary.
+
+Environment and MazeAgent are deterministic, so a given maze is played
+once. Seeds vary the workload through maze_generator instead: a maze spec
+(a dict of generate_maze arguments) is played once per seed, each seed
+generating a different maze. Also runnable from the command line, e.g.:
+
+    python episode_runner.py mazes.txt --generate 40x30 --seeds 100 --records out.jsonl
+'''
+
+import argparse
+import json
+import multiprocessing
+import sys
+import unittest
+from environment import Environment
+from maze_generator import generate_maze
+
+class EpisodeSummary:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self):
+        """
+        Constructs an empty summary, to be fed episode records with add
+        """
+        self.episodes = 0
+        self.goals = 0
+        self.total_score = 0
+        self.min_score = None
+        self.max_score = None
+        self.total_ticks = 0
+        self.total_pits = 0
+        self.planning_time = 0.0
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def add(self, record):
+        """
+        Folds the given episode record into the summary
+        """
+        score = record["score"]
+        self.episodes += 1
+        self.goals += record["goal_reached"]
+        self.total_score += score
+        self.min_score = score if self.min_score is None else min(self.min_score, score)
+        self.max_score = score if self.max_score is None else max(self.max_score, score)
+        self.total_ticks += record["ticks"]
+        self.total_pits += record["pits"]
+        self.planning_time += record["planning_time"]
+
+    def as_dict(self):
+        """
+        Returns the summary's totals and per-episode means as a dict
+        """
+        n = self.episodes or 1
+        return {"episodes": self.episodes, "goal_rate": self.goals / n,
+                "mean_score": self.total_score / n, "min_score": self.min_score,
+                "max_score": self.max_score, "mean_ticks": self.total_ticks / n,
+                "mean_pits": self.total_pits / n, "planning_time": self.planning_time,
+                "mean_planning_time": self.planning_time / n}
+
+
+def run_episode(maze, seed = None):
+    """
+    Plays one headless episode and returns its record: a dict of the seed,
+    score, ticks, pits hit, whether the goal was reached and the seconds
+    spent planning
+    :maze: A maze as a list of strings, or a maze spec: a dict of
+    generate_maze keyword arguments (width, height and optionally
+    wall_density and pit_density)
+    :seed: The seed a maze spec is generated with; must be None for a
+    given maze, whose episode it could not change
+    """
+    if isinstance(maze, dict):
+        maze = generate_maze(seed = seed, **maze)
+    elif seed is not None:
+        raise ValueError("only generated mazes can be seeded")
+    env = Environment(maze, tick_length = 0, verbose = False)
+    score = env.start_mission()
+    record = env.get_stats()
+    record["seed"] = seed
+    record["score"] = score
+    return record
+
+def run_episodes(mazes, seeds = (0,), processes = None, chunksize = 4):
+    """
+    Generator playing every given maze once and every maze spec once per
+    seed across a pool of worker processes, yielding each episode's record
+    (see run_episode, plus the index of its maze) in the order they finish
+    :mazes: A list of mazes (lists of strings) and maze specs (dicts of
+    generate_maze arguments), as run_episode takes
+    :seeds: An iterable of seeds, each generating one maze from every spec
+    :processes: The number of worker processes, defaulting to the CPU
+    count; 1 plays the episodes in this process, in order
+    :chunksize: The number of episodes sent to a worker at a time
+    """
+    tasks = [(k, maze, None) for (k, maze) in enumerate(mazes) if not isinstance(maze, dict)]
+    tasks += [(k, maze, seed) for seed in seeds for (k, maze) in enumerate(mazes) if isinstance(maze, dict)]
+    if processes == 1:
+        for task in tasks:
+            yield _run_task(task)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for record in pool.imap_unordered(_run_task, tasks, chunksize):
+            yield record
+
+def run_batch(mazes, seeds = (0,), processes = None, chunksize = 4, sink = None):
+    """
+    Plays every episode as run_episodes does and returns their
+    EpisodeSummary; each record is also passed to sink, if given, as it
+    arrives
+    """
+    summary = EpisodeSummary()
+    for record in run_episodes(mazes, seeds, processes, chunksize):
+        summary.add(record)
+        if sink is not None:
+            sink(record)
+    return summary
+
+def read_mazes(path):
+    """
+    Returns the mazes in the given text file, one row per line and
+    separated by blank lines
+    """
+    mazes = [[]]
+    with open(path) as lines:
+        for line in lines:
+            line = line.rstrip("\n")
+            if line.strip():
+                mazes[-1].append(line)
+            elif mazes[-1]:
+                mazes.append([])
+    return [maze for maze in mazes if maze]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Play Maze Pitfall episodes headlessly and summarize them")
+    parser.add_argument("mazes", nargs = "*", help = "text files of mazes, separated by blank lines")
+    parser.add_argument("--generate", action = "append", default = [], metavar = "WIDTHxHEIGHT",
+                        help = "also play mazes of this size generated from each seed")
+    parser.add_argument("--wall-density", type = float, default = 0.2)
+    parser.add_argument("--pit-density", type = float, default = 0.1)
+    parser.add_argument("--seeds", type = int, default = 1, help = "number of mazes to generate of each size")
+    parser.add_argument("--first-seed", type = int, default = 0)
+    parser.add_argument("--processes", type = int, default = None, help = "worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type = int, default = 4)
+    parser.add_argument("--records", help = "file to write per-episode records to, as JSON lines")
+    args = parser.parse_args(argv)
+
+    mazes = [maze for path in args.mazes for maze in read_mazes(path)]
+    for size in args.generate:
+        try:
+            (width, height) = (int(n) for n in size.lower().split("x"))
+        except ValueError:
+            parser.error("--generate expects WIDTHxHEIGHT, not " + repr(size))
+        mazes.append({"width": width, "height": height, "wall_density": args.wall_density,
+                      "pit_density": args.pit_density})
+    if not mazes:
+        parser.error("no mazes to play: give maze files or --generate")
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    out = open(args.records, "w") if args.records else None
+    try:
+        sink = None if out is None else (lambda record: out.write(json.dumps(record) + "\n"))
+        summary = run_batch(mazes, seeds, args.processes, args.chunksize, sink)
+    finally:
+        if out is not None:
+            out.close()
+    json.dump(summary.as_dict(), sys.stdout, indent = 2)
+    sys.stdout.write("\n")
+    return 0
+
+
+def _run_task(task):
+    (k, maze, seed) = task
+    record = run_episode(maze, seed)
+    record["maze"] = k
+    return record
+
+
+class EpisodeRunnerTests(unittest.TestCase):
+    MAZES = [["XXXXXX",
+              "X...GX",
+              "X..PPX",
+              "X....X",
+              "X..P.X",
+              "X@...X",
+              "XXXXXX"],
+             ["XXXXXXXXX",
+              "X..PGP..X",
+              "X.......X",
+              "X..P.P..X",
+              "X.......X",
+              "X..@....X",
+              "XXXXXXXXX"]]
+
+    def test_runner1(self):
+        record = run_episode(self.MAZES[0])
+        self.assertEqual(record["score"], -7)
+        self.assertEqual((record["ticks"], record["pits"], record["goal_reached"]), (7, 0, True))
+        self.assertTrue(record["planning_time"] > 0)
+
+    def test_runner2(self):
+        # Given mazes are played once, specs once per seed, each seed
+        # generating its own maze
+        spec = {"width": 12, "height": 9, "pit_density": 0.15}
+        mazes = self.MAZES + [spec]
+        records = list(run_episodes(mazes, seeds = range(3), processes = 2, chunksize = 1))
+        self.assertEqual(sorted((r["maze"], r["seed"]) for r in records if r["maze"] == 2), [(2, 0), (2, 1), (2, 2)])
+        self.assertEqual(len(records), 5)
+        serial = {(r["maze"], r["seed"]): (r["score"], r["ticks"]) for r in run_episodes(mazes, range(3), processes = 1)}
+        self.assertEqual({(r["maze"], r["seed"]): (r["score"], r["ticks"]) for r in records}, serial)
+        self.assertEqual(len({serial[(2, seed)] for seed in range(3)}), 3)
+        env = Environment(generate_maze(12, 9, pit_density = 0.15, seed = 1), tick_length = 0, verbose = False)
+        self.assertEqual(serial[(2, 1)], (env.start_mission(), env.get_stats()["ticks"]))
+        self.assertRaises(ValueError, run_episode, self.MAZES[0], 1)
+        summary = EpisodeSummary()
+        for record in records:
+            summary.add(record)
+        stats = summary.as_dict()
+        self.assertEqual((stats["episodes"], stats["goal_rate"]), (5, 1.0))
+        self.assertEqual(stats["mean_score"], sum(score for (score, ticks) in serial.values()) / 5)
+
+if __name__ == "__main__":
+    sys.exit(main())
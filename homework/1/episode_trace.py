@@ -0,0 +1,345 @@
+'''
+Compact binary traces of Environment missions, and their replay. A
+TraceRecorder given to an Environment appends one fixed-size record per
+tick to its file: the move, the player's location, the tile perceived,
+the score delta and the agent's view of the four neighbouring cells (the
+cells MazeAgent relabels as it thinks), plus, if asked for, the plan's
+length and the seconds spent thinking. The file starts with a header
+holding the maze, so a TraceReader can seek straight to any tick's
+record, and a TraceReplay can rebuild any tick's true maze, agent maze,
+location and score from the records alone, without running MazeAgent:
+
+    python episode_trace.py mission.trace 1500
+
+Recorders and readers are context managers that close their file. Run as
+a script, the module prints a traced tick; its tests run with
+
+    python -m unittest episode_trace
+'''
+
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+from environment import Environment
+from maze_generator import generate_maze
+from maze_view import MazeView
+
+# File layout: header, maze cells (width * height bytes), then records
+_MAGIC = b"MZTR"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBII")
+
+# Record flags: which optional fields follow each record's fixed part
+PLAN_LENGTHS = 1
+TIMINGS = 2
+
+# Moves are stored as their index here; None (no move) is 0
+_MOVES = (None, "U", "D", "L", "R")
+_MOVE_CODES = {move: code for (code, move) in enumerate(_MOVES)}
+
+def _record_format(flags):
+    return "<BHHBh4s" + ("I" if flags & PLAN_LENGTHS else "") + ("f" if flags & TIMINGS else "")
+
+
+class TraceRecorder:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, path, maze, plan_lengths = False, timings = False):
+        """
+        Creates (or replaces) the trace file at the given path for a
+        mission on the given maze, and writes its header
+        :maze: The maze the Environment is given, as a list of strings
+        :plan_lengths: Whether to record the agent's plan length per tick
+        :timings: Whether to record the seconds the agent thinks per tick
+        """
+        view = MazeView.from_maze(maze)
+        if view.width > 0xffff or view.height > 0xffff:
+            raise ValueError("traces hold mazes of up to 65535 x 65535 cells")
+        self.flags = (PLAN_LENGTHS if plan_lengths else 0) | (TIMINGS if timings else 0)
+        self.ticks = 0
+        self._record = struct.Struct(_record_format(self.flags))
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, self.flags, view.width, view.height))
+        self._file.write(view.cells)
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def record(self, move, loc, tile, delta, neighbours, plan_length = 0, think_time = 0.0):
+        """
+        Appends one tick's record
+        :move: The move made (U, D, L, R or None)
+        :loc: The player's location tuple after the move
+        :tile: The tile perceived there
+        :delta: The change in score for the tick
+        :neighbours: The agent maze's elements right, left, below and above
+        loc after thinking, as 4 bytes
+        :plan_length: The number of moves left in the agent's plan, kept if
+        the recorder was made with plan_lengths
+        :think_time: The seconds spent thinking, kept if the recorder was
+        made with timings
+        """
+        fields = [_MOVE_CODES[move], loc[0], loc[1], ord(tile), delta, neighbours]
+        if self.flags & PLAN_LENGTHS:
+            fields.append(plan_length)
+        if self.flags & TIMINGS:
+            fields.append(think_time)
+        self._file.write(self._record.pack(*fields))
+        self.ticks += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TraceReader:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, path):
+        """
+        Opens the trace file at the given path; records are read as they
+        are asked for, and a partly written last record is ignored
+        """
+        self._file = open(path, "rb")
+        (magic, version, self.flags, self.width, self.height) = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("not a version %d maze trace: %s" % (_VERSION, path))
+        self.cells = bytes(self._file.read(self.width * self.height))
+        self._start = _HEADER.size + len(self.cells)
+        self._record = struct.Struct(_record_format(self.flags))
+        self.ticks = (os.fstat(self._file.fileno()).st_size - self._start) // self._record.size
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def maze(self):
+        """
+        Returns the traced mission's maze, as a list of strings
+        """
+        return MazeView(self.width, self.height, bytearray(self.cells)).rows()
+
+    def record(self, tick):
+        """
+        Returns the record of the given tick (0 being the first move) as a
+        dict of its move, loc, tile, delta and neighbours, plus its
+        plan_length and think_time if they were recorded
+        """
+        if not 0 <= tick < self.ticks:
+            raise IndexError("trace tick out of range: " + repr(tick))
+        self._file.seek(self._start + tick * self._record.size)
+        return self._as_dict(self._record.unpack(self._file.read(self._record.size)))
+
+    def raw_records(self, start = 0, stop = None, chunk = 4096):
+        """
+        Generator of the records of ticks start to stop (exclusive), as
+        tuples in the order of record's dicts, read chunk records at a time
+        """
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+        size = self._record.size
+        for first in range(start, stop, chunk):
+            self._file.seek(self._start + first * size)
+            data = self._file.read(min(chunk, stop - first) * size)
+            for fields in self._record.iter_unpack(data):
+                yield fields
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.ticks
+
+    def __iter__(self):
+        return (self._as_dict(fields) for fields in self.raw_records())
+
+    def _as_dict(self, fields):
+        record = {"move": _MOVES[fields[0]], "loc": (fields[1], fields[2]), "tile": chr(fields[3]),
+                  "delta": fields[4], "neighbours": fields[5]}
+        rest = list(fields[6:])
+        if self.flags & PLAN_LENGTHS:
+            record["plan_length"] = rest.pop(0)
+        if self.flags & TIMINGS:
+            record["think_time"] = rest.pop(0)
+        return record
+
+
+class TraceReplay:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, reader, interval = 4096):
+        """
+        Constructs a replay of the given TraceReader's mission
+        :interval: The number of ticks between the compressed snapshots
+        kept, as they are first replayed through, to seek back from
+        """
+        self.reader = reader
+        self.interval = interval
+        (w, h) = (reader.width, reader.height)
+        cells = bytearray(reader.cells)
+        self._start_loc = cells.find(Environment.PLR_BLOCK.encode("ascii"))
+        cells[self._start_loc] = ord(Environment.SAFE_BLOCK)
+        self._overlay = Environment.reveal_breezes(cells, w, h)
+        hidden = (Environment.PIT_BLOCK + Environment.SAFE_BLOCK).encode("ascii")
+        table = bytes.maketrans(hidden, Environment.UNK_BLOCK.encode("ascii") * len(hidden))
+        agent = bytearray(reader.cells.translate(table))
+        self._checkpoints = {0: self._snapshot(bytearray(reader.cells), agent, self._start_loc, 0, 0)}
+        self._restore(0)
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def state(self, tick):
+        """
+        Returns the mission's state after the given number of ticks (0
+        being its start) as a dict of its tick, the player's loc, the score,
+        the pits fallen into, and the true maze and agent maze as MazeViews
+        """
+        if not 0 <= tick <= self.reader.ticks:
+            raise IndexError("trace tick out of range: " + repr(tick))
+        nearest = max(t for t in self._checkpoints if t <= tick)
+        if tick < self._tick or nearest > self._tick:
+            self._restore(nearest)
+        self._advance(tick)
+        (w, h) = (self.reader.width, self.reader.height)
+        return {"tick": self._tick, "loc": (self._loc % w, self._loc // w), "score": self._score,
+                "pits": self._pits, "maze": MazeView(w, h, bytearray(self._shown)),
+                "agent_maze": MazeView(w, h, bytearray(self._agent))}
+
+    def _snapshot(self, shown, agent, loc, score, pits):
+        return (zlib.compress(bytes(shown), 1), zlib.compress(bytes(agent), 1), loc, score, pits)
+
+    def _restore(self, tick):
+        (shown, agent, self._loc, self._score, self._pits) = self._checkpoints[tick]
+        self._shown = bytearray(zlib.decompress(shown))
+        self._agent = bytearray(zlib.decompress(agent))
+        self._tick = tick
+
+    def _advance(self, tick):
+        """
+        Applies the records of ticks up to the given one to the current
+        state, the way Environment._update_mazes and MazeAgent would have,
+        snapshotting at every multiple of the interval
+        """
+        (w, shown, agent, overlay) = (self.reader.width, self._shown, self._agent, self._overlay)
+        (player, pit) = (ord(Environment.PLR_BLOCK), ord(Environment.PIT_BLOCK))
+        (loc, score, pits) = (self._loc, self._score, self._pits)
+        offsets = (1, -1, w, -w)
+        t = self._tick
+        for fields in self.reader.raw_records(self._tick, tick):
+            shown[loc] = agent[loc] = overlay[loc]
+            loc = fields[2] * w + fields[1]
+            shown[loc] = agent[loc] = player
+            for (offset, block) in zip(offsets, fields[5]):
+                if block:
+                    agent[loc + offset] = block
+            score += fields[4]
+            pits += fields[3] == pit
+            t += 1
+            if t % self.interval == 0 and t not in self._checkpoints:
+                self._checkpoints[t] = self._snapshot(shown, agent, loc, score, pits)
+        (self._loc, self._score, self._pits, self._tick) = (loc, score, pits, t)
+
+
+def main(argv = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python episode_trace.py TRACE TICK")
+        return 2
+    with TraceReader(argv[0]) as reader:
+        state = TraceReplay(reader).state(int(argv[1]))
+        for (row, view) in zip(state["maze"].rows(), state["agent_maze"].rows()):
+            print(row + "  " + view)
+        print("\nTick: %d of %d\nLoc: %s\nScore: %d\nPits: %d" % (state["tick"], reader.ticks, state["loc"], state["score"], state["pits"]))
+    return 0
+
+
+class EpisodeTraceTests(unittest.TestCase):
+    MAZE = generate_maze(16, 10, pit_density = 0.15, seed = 1)
+
+    def _record_mission(self, path, maze, **flags):
+        """
+        Runs a traced mission and returns its Environment, score and the
+        (true maze, agent maze, score) after every tick
+        """
+        states = []
+        with TraceRecorder(path, maze, **flags) as trace:
+            record = trace.record
+            def record_and_snapshot(move, loc, tile, delta, *rest):
+                record(move, loc, tile, delta, *rest)
+                previous = states[-1][2] if states else 0
+                states.append((env.get_true_maze(), env.get_agent_maze().rows(), previous + delta))
+            trace.record = record_and_snapshot
+            env = Environment(maze, tick_length = 0, verbose = False, trace = trace)
+            states.append((env.get_true_maze(), env.get_agent_maze().rows(), 0))
+            score = env.start_mission()
+        return (env, score, states)
+
+    def test_trace1(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "mission.trace")
+            (env, score, states) = self._record_mission(path, self.MAZE, plan_lengths = True, timings = True)
+            with TraceReader(path) as reader:
+                self.assertEqual((reader.maze(), len(reader)), (self.MAZE, env.get_stats()["ticks"]))
+                records = list(reader)
+                self.assertEqual(records[3], reader.record(3))
+                self.assertEqual(sum(r["delta"] for r in records), score)
+                self.assertTrue(all(r["think_time"] >= 0 and r["plan_length"] >= 0 for r in records))
+                self.assertEqual(records[-1]["tile"], Environment.GOAL_BLOCK)
+
+                # Any tick can be rebuilt, in any order, without the agent
+                replay = TraceReplay(reader, interval = 4)
+                for tick in list(range(len(states) - 1, -1, -1)) + [5, 2, 9]:
+                    state = replay.state(tick)
+                    self.assertEqual((state["maze"].rows(), state["agent_maze"].rows(), state["score"]), states[tick])
+                self.assertEqual(state["pits"], sum(r["tile"] == "P" for r in records[:9]))
+                self.assertEqual(replay.state(len(records))["pits"], env.get_stats()["pits"])
+                self.assertRaises(IndexError, replay.state, len(states))
+
+    def test_trace2(self):
+        # Without the optional fields a record is 12 bytes, and a partly
+        # written last record is ignored
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "mission.trace")
+            with TraceRecorder(path, ["XXXX", "X@GX", "XXXX"]) as trace:
+                trace.record("R", (2, 1), "G", -1, b"XSXX")
+                trace.record(None, (2, 1), "G", -1, b"XSXX")
+            self.assertRaises(ValueError, trace.record, None, (2, 1), "G", -1, b"XSXX")
+            self.assertEqual(os.path.getsize(path), _HEADER.size + 12 + 2 * 12)
+            with open(path, "ab") as out:
+                out.write(b"\x01\x02")
+            with TraceReader(path) as reader:
+                self.assertEqual(list(reader), [{"move": "R", "loc": (2, 1), "tile": "G", "delta": -1, "neighbours": b"XSXX"},
+                                                {"move": None, "loc": (2, 1), "tile": "G", "delta": -1, "neighbours": b"XSXX"}])
+                state = TraceReplay(reader).state(1)
+                self.assertEqual((state["maze"].rows(), state["agent_maze"].rows()), (["XXXX", "X.@X", "XXXX"], ["XXXX", "XS@X", "XXXX"]))
+
+if __name__ == "__main__":
+    sys.exit(main())
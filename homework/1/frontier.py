@@ -0,0 +1,83 @@
+'''
+Frontier class used as the open list in A* Search; a single-threaded
+binary heap (heapq) that remembers the best path cost (g) found to
+each state so that dominated entries are never pushed, and entries
+made stale by a later, cheaper push are skipped when they surface
+'''
+
+import heapq
+import itertools
+
+class Frontier:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self):
+        """
+        Frontier entries are tuples of the format:
+        (f, h, tie, g, state, item)
+
+        :f: The evaluation f(n) = g(n) + h(n) of the entry
+        :h: The heuristic cost, so that among equal f the entry closest
+        to the goal is expanded first
+        :tie: A monotonically increasing counter that settles any
+        remaining ties without ever comparing states or items
+        :g: The path cost with which the state was pushed
+        :item: Whatever the caller wants back on pop (e.g. a SearchTreeNode)
+        """
+        self._heap = []
+        self._counter = itertools.count()
+        self.best_g = {}
+        self.closed = set()
+        self.pushes = 0
+        self.pops = 0
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def push(self, state, g, h, item):
+        """
+        Adds the given state to the frontier with path cost g and heuristic
+        cost h, unless it has already been expanded or is already on the
+        frontier with a path cost no greater than g
+        Returns True if the entry was pushed, False otherwise
+        """
+        if state in self.closed:
+            return False
+        best = self.best_g.get(state)
+        if best is not None and best <= g:
+            return False
+        self.best_g[state] = g
+        heapq.heappush(self._heap, (g + h, h, next(self._counter), g, state, item))
+        self.pushes += 1
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the (state, g, item) of the entry with the
+        lowest evaluation, skipping any stale entries left behind by a
+        cheaper push of the same state; returns None when exhausted.
+        The returned state is marked as closed
+        """
+        heap = self._heap
+        while heap:
+            (f, h, tie, g, state, item) = heapq.heappop(heap)
+            if state in self.closed or g > self.best_g[state]:
+                continue
+            self.closed.add(state)
+            self.pops += 1
+            return (state, g, item)
+        return None
+
+    def __len__(self):
+        """
+        Returns the number of entries on the heap, stale ones included
+        """
+        return len(self._heap)
+
+    def __bool__(self):
+        return len(self._heap) > 0
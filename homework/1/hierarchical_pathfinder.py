@@ -0,0 +1,390 @@
+'''
+Hierarchical pathfinding (HPA*, Botea, Mueller & Schaeffer, 2004) over a
+MazeGrid. The grid is cut into square clusters; every run of open cells
+along the border between two clusters is an entrance, represented by one
+or two transitions (pairs of facing cells), whose cells become nodes of
+an abstract graph. Nodes in the same cluster are joined by the cost of
+the cheapest path between them that stays inside the cluster.
+
+A query connects its start and destination to the nodes of their
+clusters, searches the small abstract graph, and then refines each
+abstract step into moves with a search confined to one cluster, so its
+cost depends on the cluster size and the length of the route rather
+than on the size of the maze. Paths found this way are near-optimal,
+not guaranteed optimal. When cells change, only the entrances and
+cluster-internal costs they touch are recomputed.
+'''
+
+import heapq
+import unittest
+from maze_grid import MazeGrid
+
+class HierarchicalPathfinder:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Entrances wider than this get a transition at each end rather than
+    # a single one in the middle
+    MAX_SINGLE_ENTRANCE = 5
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, grid, cluster_size = 16):
+        """
+        Builds the abstraction of the given MazeGrid
+        :grid: A MazeGrid object; later changes to it are picked up from its
+        change log on the next query (or call to refresh)
+        :cluster_size: The width and height, in cells, of each cluster
+        """
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-grid.width // cluster_size)
+        self.clusters_y = -(-grid.height // cluster_size)
+        self.rebuilds = 0
+        self.local_updates = 0
+        self._build()
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def refresh(self):
+        """
+        Brings the abstraction up to date with the grid's current version,
+        recomputing only the entrances and clusters touched by changed
+        cells; returns True if anything had to be done
+        """
+        grid = self.grid
+        if self.version == grid.version:
+            return False
+        changed = grid.changes_since(self.version)
+        if changed is None:
+            self._build()
+            return True
+        borders = set()
+        clusters = set()
+        for i in changed:
+            clusters.add(self.cluster_of(i))
+            borders.update(self._borders_of_cell(i))
+        for border in borders:
+            self._build_border(border)
+            clusters.update(border)
+        for c in clusters:
+            self._build_intra(c)
+        self.version = grid.version
+        self.local_updates += 1
+        return True
+
+    def cluster_of(self, index):
+        """
+        Returns the id of the cluster holding the given flat index
+        """
+        (y, x) = divmod(index, self.grid.width)
+        return (y // self.cluster_size) * self.clusters_x + x // self.cluster_size
+
+    def path(self, start, dest):
+        """
+        Returns a (cost, actions) tuple for a path from start to dest, like
+        pathfind, or None if dest cannot be reached
+        :start: A maze location tuple
+        :dest: A maze location tuple
+        """
+        self.refresh()
+        grid = self.grid
+        (s, d) = (grid.index(start), grid.index(dest))
+        if grid.is_wall(s) or grid.is_wall(d):
+            return None
+        if s == d:
+            return (0, [])
+        route = self._abstract_search(s, d)
+        if route is None:
+            return None
+
+        # Refine each abstract step: steps between clusters cross a border
+        # in one move, steps within a cluster are searched inside it
+        costs = grid.costs
+        total = 0
+        actions = []
+        for (u, v) in zip(route, route[1:]):
+            c = self.cluster_of(u)
+            if c != self.cluster_of(v):
+                actions.append(grid.action(u, v))
+                total += costs[v]
+                continue
+            (dist, parent) = self._cluster_search(c, u, target = v)
+            segment = []
+            node = v
+            while node != u:
+                segment.append(grid.action(parent[node], node))
+                node = parent[node]
+            segment.reverse()
+            actions.extend(segment)
+            total += dist[v]
+        return (total, actions)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _build(self):
+        """
+        Builds every entrance and cluster of the abstraction from scratch
+        """
+        self._transitions = {}
+        self._inter = {}
+        self._intra = {}
+        for c in range(self.clusters_x * self.clusters_y):
+            for border in self._borders_of_cluster(c):
+                if border[0] == c:
+                    self._build_border(border)
+        for c in range(self.clusters_x * self.clusters_y):
+            self._build_intra(c)
+        self.version = self.grid.version
+        self.rebuilds += 1
+
+    def _bounds(self, c):
+        """
+        Returns the (x0, y0, x1, y1) cell bounds of cluster c, exclusive of
+        x1 and y1
+        """
+        (cy, cx) = divmod(c, self.clusters_x)
+        size = self.cluster_size
+        (x0, y0) = (cx * size, cy * size)
+        return (x0, y0, min(x0 + size, self.grid.width), min(y0 + size, self.grid.height))
+
+    def _borders_of_cluster(self, c):
+        """
+        Returns the borders of cluster c as (lower id, higher id) pairs
+        """
+        (cy, cx) = divmod(c, self.clusters_x)
+        borders = []
+        if cx > 0:
+            borders.append((c - 1, c))
+        if cx < self.clusters_x - 1:
+            borders.append((c, c + 1))
+        if cy > 0:
+            borders.append((c - self.clusters_x, c))
+        if cy < self.clusters_y - 1:
+            borders.append((c, c + self.clusters_x))
+        return borders
+
+    def _borders_of_cell(self, index):
+        """
+        Returns the borders whose entrances the given cell can be part of
+        """
+        (y, x) = divmod(index, self.grid.width)
+        size = self.cluster_size
+        c = self.cluster_of(index)
+        borders = []
+        for border in self._borders_of_cluster(c):
+            other = border[1] if border[0] == c else border[0]
+            if abs(other - c) == self.clusters_x:
+                facing = y % size == 0 if other < c else y % size == size - 1
+            else:
+                facing = x % size == 0 if other < c else x % size == size - 1
+            if facing:
+                borders.append(border)
+        return borders
+
+    def _build_border(self, border):
+        """
+        (Re)computes the transitions across the given border and their
+        edges in the abstract graph
+        """
+        for (a, b) in self._transitions.get(border, []):
+            self._unlink(a, b)
+            self._unlink(b, a)
+
+        # Facing cell pairs along the border, from the lower cluster's side
+        (c1, c2) = border
+        grid = self.grid
+        w = grid.width
+        (x0, y0, x1, y1) = self._bounds(c1)
+        if c2 - c1 == self.clusters_x:
+            pairs = [((y1 - 1) * w + x, y1 * w + x) for x in range(x0, x1)]
+        else:
+            pairs = [(y * w + x1 - 1, y * w + x1) for y in range(y0, y1)]
+
+        # Split into runs of open pairs, each run being one entrance
+        transitions = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and not grid.is_wall(pair[0]) and not grid.is_wall(pair[1]):
+                run.append(pair)
+                continue
+            if len(run) > HierarchicalPathfinder.MAX_SINGLE_ENTRANCE:
+                transitions.extend([run[0], run[-1]])
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+
+        costs = grid.costs
+        for (a, b) in transitions:
+            self._inter.setdefault(a, {})[b] = costs[b]
+            self._inter.setdefault(b, {})[a] = costs[a]
+        self._transitions[border] = transitions
+
+    def _unlink(self, a, b):
+        edges = self._inter.get(a)
+        if edges is not None:
+            edges.pop(b, None)
+            if not edges:
+                del self._inter[a]
+
+    def _cluster_nodes(self, c):
+        """
+        Returns the set of abstract nodes inside cluster c
+        """
+        nodes = set()
+        for border in self._borders_of_cluster(c):
+            for (a, b) in self._transitions.get(border, []):
+                nodes.add(a if self.cluster_of(a) == c else b)
+        return nodes
+
+    def _build_intra(self, c):
+        """
+        (Re)computes the cheapest in-cluster path costs between the
+        abstract nodes of cluster c
+        """
+        nodes = self._cluster_nodes(c)
+        edges = {}
+        for u in nodes:
+            (dist, parent) = self._cluster_search(c, u)
+            edges[u] = {v: dist[v] for v in nodes if v != u and v in dist}
+        self._intra[c] = edges
+
+    def _cluster_search(self, c, source, target = None, reverse = False):
+        """
+        Dijkstra from source confined to the cells of cluster c, stopping
+        early once target (if given) is settled; returns (dist, parent)
+        dicts. With reverse, dist holds the cost of moving from each cell
+        to source instead, and parent the next cell on the way there
+        """
+        grid = self.grid
+        costs = grid.costs
+        dist = {source: 0}
+        parent = {}
+        done = set()
+        heap = [(0, source)]
+        while heap:
+            (d, u) = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u == target:
+                break
+            for v in grid.neighbours(u):
+                if v in done or costs[v] < 0 or self.cluster_of(v) != c:
+                    continue
+                candidate = d + (costs[u] if reverse else costs[v])
+                if candidate < dist.get(v, candidate + 1):
+                    dist[v] = candidate
+                    parent[v] = u
+                    heapq.heappush(heap, (candidate, v))
+        return (dist, parent)
+
+    def _abstract_search(self, s, d):
+        """
+        A* over the abstract graph with s and d temporarily connected to
+        the nodes of their clusters; returns the list of abstract nodes
+        from s to d, or None
+        """
+        grid = self.grid
+        (cs, cd) = (self.cluster_of(s), self.cluster_of(d))
+        (dist, parent) = self._cluster_search(cs, s)
+        start_edges = {v: dist[v] for v in self._cluster_nodes(cs) if v in dist and v != s}
+        if cs == cd and d in dist:
+            start_edges[d] = dist[d]
+        (dist, parent) = self._cluster_search(cd, d, reverse = True)
+        to_dest = {u: dist[u] for u in self._cluster_nodes(cd) if u in dist and u != d}
+
+        g = {s: 0}
+        parent = {}
+        closed = set()
+        heap = [(0, 0, s)]
+        while heap:
+            (f, gu, u) = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == d:
+                route = [d]
+                while route[-1] != s:
+                    route.append(parent[route[-1]])
+                route.reverse()
+                return route
+            closed.add(u)
+            edges = [start_edges.items() if u == s else self._intra[self.cluster_of(u)].get(u, {}).items(),
+                     self._inter.get(u, {}).items()]
+            if u in to_dest:
+                edges.append([(d, to_dest[u])])
+            for items in edges:
+                for (v, cost) in items:
+                    gv = gu + cost
+                    if v not in closed and gv < g.get(v, gv + 1):
+                        g[v] = gv
+                        parent[v] = u
+                        heapq.heappush(heap, (gv + grid.manhattan(v, d), gv, v))
+        return None
+
+
+class HierarchicalPathfinderTests(unittest.TestCase):
+    COST_MAP = {"P": 20, ".": 1, "U": 7}
+
+    def _walk(self, maze, start, actions):
+        dirs = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}
+        (x, y) = start
+        cost = 0
+        for action in actions:
+            (x, y) = (x + dirs[action][0], y + dirs[action][1])
+            self.assertNotEqual(maze[y][x], "X")
+            cost += self.COST_MAP.get(maze[y][x], 1)
+        return ((x, y), cost)
+
+    def test_hpa1(self):
+        maze = ["XXXXXXXXXX",
+                "X....X...X",
+                "X.XX.X.X.X",
+                "X..X...X.X",
+                "XX.XXXXX.X",
+                "X...P....X",
+                "X.XXXX.XXX",
+                "X......P.X",
+                "XXXXXXXXXX"]
+        hpa = HierarchicalPathfinder(MazeGrid.from_maze(maze, self.COST_MAP, "X"), cluster_size = 3)
+        (cost, actions) = hpa.path((1, 1), (8, 7))
+        self.assertEqual(self._walk(maze, (1, 1), actions), ((8, 7), cost))
+        self.assertEqual(hpa.path((4, 5), (4, 5)), (0, []))
+        self.assertTrue(hpa.path((1, 1), (0, 0)) is None)
+
+    def test_hpa2(self):
+        maze = [list("XXXXXXXX"),
+                list("X......X"),
+                list("X......X"),
+                list("XXXXXXXX")]
+        grid = MazeGrid.from_maze(maze, self.COST_MAP, "X")
+        hpa = HierarchicalPathfinder(grid, cluster_size = 3)
+        (cost, actions) = hpa.path((1, 1), (6, 1))
+        self.assertEqual(self._walk(maze, (1, 1), actions), ((6, 1), cost))
+
+        # Walling off the maze is seen through a local update, not a rebuild
+        for (loc, block) in [((4, 1), "X"), ((4, 2), "X")]:
+            maze[loc[1]][loc[0]] = block
+            grid.set_cell(loc, block)
+        self.assertTrue(hpa.path((1, 1), (6, 1)) is None)
+        maze[2][4] = "P"
+        grid.set_cell((4, 2), "P")
+        (cost, actions) = hpa.path((1, 1), (6, 1))
+        self.assertEqual(self._walk(maze, (1, 1), actions), ((6, 1), cost))
+        self.assertTrue(cost >= 26)
+        self.assertEqual(hpa.rebuilds, 1)
+        self.assertEqual(hpa.local_updates, 2)
+
+if __name__ == "__main__":
+    unittest.main()
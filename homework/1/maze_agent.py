@@ -9,6 +9,8 @@ import random
 from pathfinder import *
 from maze_problem import *
 from maze_knowledge_base import *
+from dstar_lite import *
+from ara_star import *
 from queue import Queue
 
 class MazeAgent:
@@ -38,9 +40,18 @@ class MazeAgent:
         for spot in no_wall_list:
             self.agent_kb.tell(MazeClause([(("P", spot), False)]))
 
-        # let's create a path!
+        # let's create a path! The planner keeps its search between ticks
+        # and is told about changed cells rather than replanning from scratch;
+        # given a per-tick time budget, an anytime planner is used instead
         mp = MazeProblem(self.maze)
-        path = pathfind(mp, self.loc, self.goal)
+        budget = env.get_think_budget()
+        if budget is None:
+            self.planner = DStarLite(mp.grid(), self.loc, self.goal)
+        else:
+            self.planner = AraStar(mp.grid(), self.loc, self.goal)
+            self.planner.improve(budget)
+        self._last_loc = self.loc
+        path = self.planner.path()
         for action in path[1]:
             self.plan.put(action)
     
@@ -49,7 +60,7 @@ class MazeAgent:
     # Methods
     ##################################################################
     
-    def think(self, perception):
+    def think(self, perception, budget = None):
         """
         think is parameterized by the agent's perception of the tile type
         on which it is now standing, and is called during the environment's
@@ -60,10 +71,18 @@ class MazeAgent:
         :perception: A dictionary providing the agent's current location
         and current tile type being stood upon, of the format:
           {"loc": (x, y), "tile": tile_type}
+        :budget: Seconds the planner may spend this tick, if any; from the
+        first tick given one, planning switches to the anytime AraStar, which
+        plans within the budget and improves toward optimal over later ticks
         """
         
-        # update current location
+        # update current location; the environment has redrawn both the
+        # tile we left and the one we are on, so the planner hears of both
         self.loc = perception["loc"]
+        changes = {}
+        for (x, y) in (self._last_loc, self.loc):
+            changes[(x, y)] = self.maze[y][x]
+        self._last_loc = self.loc
         
         # analyze/add current tile agent is on
         if perception["tile"] == "B":
@@ -82,13 +101,19 @@ class MazeAgent:
             self.agent_kb.tell(MazeClause([(("P", self.loc), True)]))
         
         # analyze/add adjacent tiles and update path if needed
+        # (every neighbour's pit and not-pit questions go in one batch)
         adj_spots = self._no_walls_list()
-        updated = False
+        queries = []
         for spot in adj_spots:
+            queries.append(MazeClause([(("P", spot), True)]))
+            queries.append(MazeClause([(("P", spot), False)]))
+        answers = self.agent_kb.ask_many(queries)
+        updated = False
+        for (k, spot) in enumerate(adj_spots):
             test_x = spot[0]
             test_y = spot[1]
-            isPit = self.agent_kb.ask(MazeClause([(("P", (test_x, test_y)), True)]))
-            isNotPit = self.agent_kb.ask(MazeClause([(("P", (test_x, test_y)), False)]))
+            isPit = answers[2 * k]
+            isNotPit = answers[2 * k + 1]
             if isNotPit and (self.maze[test_y][test_x] != "." and self.maze[test_y][test_x] != "B"):
                 updated = True
                 self.maze[test_y][test_x] = "S"
@@ -98,12 +123,21 @@ class MazeAgent:
             if not isPit and not isNotPit and (self.maze[test_y][test_x] == "U" or self.maze[test_y][test_x] == "?"):
                 updated = True
                 self.maze[test_y][test_x] = "U"
-            if updated:
-                self.plan.queue.clear()
-                mp = MazeProblem(self.maze)
-                path = pathfind(mp, self.loc, self.goal)
-                for action in path[1]:
-                    self.plan.put(action)
+            changes[spot] = self.maze[test_y][test_x]
+        
+        # repair the plan once, after every neighbour has been relabelled
+        if budget is not None and not isinstance(self.planner, AraStar):
+            self.planner = AraStar(self.planner.grid, self.loc, self.goal)
+        self.planner.move_start(self.loc)
+        self.planner.update_cells(changes)
+        if isinstance(self.planner, AraStar):
+            # a better plan found within the budget replaces the current one
+            updated = self.planner.improve(budget)
+        if updated:
+            self.plan.queue.clear()
+            path = self.planner.path()
+            for action in path[1]:
+                self.plan.put(action)
         return
 
     def get_next_move(self):
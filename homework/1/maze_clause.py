@@ -10,30 +10,109 @@ MazePropositions (2-tuples of (symbol, location)) mapped to
 their negated status in the sentence.
 '''
 import unittest
-import itertools
+import pickle
+
+class SymbolTable:
+    """
+    Interns MazePropositions (2-tuples of (symbol, location)) to small
+    positive ints; a literal is then the id for a positive occurrence of
+    the proposition and its negation for a negated one
+    """
+    
+    def __init__(self):
+        self._ids = {}
+        self._props = [None]
+    
+    def intern(self, prop):
+        """
+        Returns the id of the given proposition, assigning the next free
+        one if it has not been seen before
+        """
+        pid = self._ids.get(prop)
+        if pid is None:
+            pid = self._ids[prop] = len(self._props)
+            self._props.append(prop)
+        return pid
+    
+    def lookup(self, prop):
+        """
+        Returns the id of the given proposition, or None if it was never
+        interned
+        """
+        return self._ids.get(prop)
+    
+    def prop(self, pid):
+        """
+        Returns the proposition with the given id
+        """
+        return self._props[pid]
+    
+    def __len__(self):
+        return len(self._props) - 1
 
 class MazeClause:
+    
+    # Table shared by all clauses, so that literals are comparable across them
+    SYMBOLS = SymbolTable()
+    
+    __slots__ = ("literals", "valid", "_hash")
+    
     def __init__(self, props):
         """
         Constructor parameterized by the propositions within this clause;
         argument props is a list of MazePropositions, like:
         [(("X", (1, 1)), True), (("X", (2, 1)), True), (("Y", (1, 2)), False)]
+        Internally, the clause is an immutable, sorted tuple of signed int
+        literals (see SymbolTable), with its hash computed once
+        """
+        intern = MazeClause.SYMBOLS.intern
+        literals = set()
+        valid = False
+        for (prop, value) in props:
+            lit = intern(prop) if value else -intern(prop)
+            # the same proposition with the opposite truth value makes
+            # this a valid sentence
+            if -lit in literals:
+                valid = True
+                literals = ()
+                break
+            literals.add(lit)
+        self.literals = tuple(sorted(literals))
+        self.valid = valid
+        self._hash = hash((self.literals, valid))
+    
+    @staticmethod
+    def from_literals(literals):
+        """
+        Returns the clause that is the disjunction of the given signed int
+        literals, which must already be interned in MazeClause.SYMBOLS
+        """
+        literals = set(literals)
+        for lit in literals:
+            if -lit in literals:
+                return MazeClause._make((), True)
+        return MazeClause._make(tuple(sorted(literals)), False)
+    
+    @staticmethod
+    def _make(literals, valid):
         """
-        self.props = {}
-        self.valid = False
-        for prop in props:
-            # check to see if there is the same proposition 
-            if prop[0] in self.props:
-                # check to see if the other proposition has the opposite truth 
-                # value and therefore a valid sentence 
-                if self.props[prop[0]] != prop[1]:
-                    # print("valid!")
-                    self.valid = True
-                    self.props = {}
-                    return
-            else:
-                self.props[prop[0]] = prop[1]
-        return
+        Builds a clause from an already sorted, tautology-free tuple of
+        literals (or () if valid) without checking it
+        """
+        clause = MazeClause.__new__(MazeClause)
+        clause.literals = literals
+        clause.valid = valid
+        clause._hash = hash((literals, valid))
+        return clause
+    
+    @property
+    def props(self):
+        """
+        A new dict mapping each MazeProposition in this clause to its
+        truth value; changing it does not change the clause
+        """
+        prop = MazeClause.SYMBOLS.prop
+        return {prop(abs(lit)): lit > 0 for lit in self.literals}
     
     def get_prop(self, prop):
         """
@@ -42,10 +121,14 @@ class MazeClause:
           - True if the requested prop is positive in the clause
           - False if the requested prop is negated in the clause
         """
-        if prop in self.props:
-            return self.props[prop]
-        else: 
+        pid = MazeClause.SYMBOLS.lookup(prop)
+        if pid is None:
             return None
+        if pid in self.literals:
+            return True
+        if -pid in self.literals:
+            return False
+        return None
     
     def is_valid(self):
         """
@@ -62,25 +145,46 @@ class MazeClause:
           - False otherwise
         (NB: valid clauses are not empty)
         """
-        if self.valid or (len(self.props) > 0):
-            return False
-        else:
-            return True
+        return not self.valid and not self.literals
+    
+    def negated(self):
+        """
+        Returns the negation of this clause in CNF, as a list of clauses:
+        one negated unit clause per literal (the empty clause if valid)
+        """
+        if self.valid:
+            return [MazeClause._make((), False)]
+        return [MazeClause._make((-lit,), False) for lit in self.literals]
     
     def __eq__(self, other):
         """
         Defines equality comparator between MazeClauses: only if they
         have the same props (in any order) or are both valid
         """
-        return self.props == other.props and self.valid == other.valid
+        return self._hash == other._hash and self.literals == other.literals and self.valid == other.valid
     
     def __hash__(self):
         """
         Provides a hash for a MazeClause to enable set membership
         """
-        # Hashes an immutable set of the stored props for ease of
-        # lookup in a set
-        return hash(frozenset(self.props.items()))
+        return self._hash
+    
+    def __reduce__(self):
+        """
+        Pickles clauses by their propositions, since literal ids are only
+        meaningful within the process (and SymbolTable) that assigned them
+        """
+        return (MazeClause._restore, (list(self.props.items()), self.valid))
+    
+    @staticmethod
+    def _restore(props, valid):
+        clause = MazeClause(props)
+        return MazeClause._make((), True) if valid else clause
+    
+    def __repr__(self):
+        if self.valid:
+            return "MazeClause(valid)"
+        return "MazeClause(" + repr(list(self.props.items())) + ")"
     
     @staticmethod
     def resolve(c1, c2):
@@ -90,24 +194,21 @@ class MazeClause:
         of 0 or 1 MazeClause, but it being a set is convenient for the
         inference engine)
         """
-
         results = set()
-        for prop in c1.props:
-            if prop in c2.props and c2.props[prop] != c1.props[prop]:
-                # same prop with opposite parity
-                # delete the two props
-                c1_copy = c1.props.copy()
-                c2_copy = c2.props.copy()
-                del c1_copy[prop]
-                del c2_copy[prop]
-                # combine the remaining props into one dict
-                # convert the dicts to a single list
-                all_clauses_list = itertools.chain(c1_copy.items(), c2_copy.items())
-                # create a new MazeClause obj with the list and convert its dict into a set
-                all_clause_obj = MazeClause(all_clauses_list)
-                if all_clause_obj.is_valid():
-                    return results
-                results.add(all_clause_obj)
+        lits2 = c2.literals
+        for lit in c1.literals:
+            if -lit in lits2:
+                # same prop with opposite parity: drop the pair and join the
+                # remaining literals, unless another such pair makes the
+                # result valid
+                merged = set(c1.literals)
+                merged.update(lits2)
+                merged.discard(lit)
+                merged.discard(-lit)
+                for other in merged:
+                    if -other in merged:
+                        return results
+                results.add(MazeClause._make(tuple(sorted(merged)), False))
                 return results
         return results
 
@@ -175,5 +276,23 @@ class MazeClauseTests(unittest.TestCase):
         self.assertEqual(len(res), 1)
         self.assertTrue(MazeClause([(("Y", (1, 1)), False), (("Z", (1, 1)), True), (("W", (1, 1)), False)]) in res)
         
+    def test_mazeprops11(self):
+        mc1 = MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), False)])
+        mc2 = MazeClause([(("Y", (1, 1)), False), (("X", (1, 1)), True)])
+        self.assertEqual(mc1, mc2)
+        self.assertEqual(hash(mc1), hash(mc2))
+        self.assertEqual(mc1.props, {("X", (1, 1)): True, ("Y", (1, 1)): False})
+        
+        # props is a copy; the clause itself never changes
+        mc1.props[("X", (1, 1))] = False
+        self.assertTrue(mc1.get_prop(("X", (1, 1))))
+        self.assertTrue(MazeClause.from_literals(mc1.literals) == mc1)
+        
+    def test_mazeprops12(self):
+        mc = MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), False)])
+        self.assertEqual(set(mc.negated()), {MazeClause([(("X", (1, 1)), False)]), MazeClause([(("Y", (1, 1)), True)])})
+        self.assertEqual(pickle.loads(pickle.dumps(mc)), mc)
+        self.assertTrue(pickle.loads(pickle.dumps(MazeClause([(("X", (1, 1)), True), (("X", (1, 1)), False)]))).is_valid())
+        
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
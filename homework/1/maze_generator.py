@@ -0,0 +1,105 @@
+'''
+Seeded generator of Maze Pitfall grids of any size. Interior cells are
+made walls and pits at the requested densities, after which a path free
+of both is carved from the start to the goal so that every generated
+maze is solvable; the start's neighbours are kept free of pits, as
+MazeAgent assumes.
+'''
+
+import random
+import unittest
+from environment import Environment
+
+def generate_maze(width, height, wall_density = 0.2, pit_density = 0.1, seed = None):
+    """
+    Returns a new maze, as a list of strings, surrounded by walls, with
+    one start (@) in its lower left and one goal (G) in its upper right
+    :width: The number of columns, walls included; at least 3
+    :height: The number of rows, walls included; at least 3
+    :wall_density: The fraction of interior cells to make walls
+    :pit_density: The fraction of interior cells to make pits
+    :seed: Seed for the generator's own random.Random, so that the same
+    arguments always produce the same maze
+    """
+    if width < 3 or height < 3 or (width - 2) * (height - 2) < 2:
+        raise ValueError("A maze needs room for a start and a goal: " + repr((width, height)))
+    rng = random.Random(seed)
+    wall = Environment.WALL_BLOCK
+    pit = Environment.PIT_BLOCK
+    safe = Environment.SAFE_BLOCK
+    maze = [[wall] * width]
+    for y in range(1, height - 1):
+        row = [wall]
+        for x in range(1, width - 1):
+            roll = rng.random()
+            row.append(wall if roll < wall_density else pit if roll < wall_density + pit_density else safe)
+        row.append(wall)
+        maze.append(row)
+    maze.append([wall] * width)
+
+    # Start in the lower left quarter of the interior, goal in the upper right
+    (w, h) = (width - 2, height - 2)
+    start = (1 + rng.randrange((w + 1) // 2), height - 2 - rng.randrange((h + 1) // 2))
+    goal = (width - 2 - rng.randrange((w + 1) // 2), 1 + rng.randrange((h + 1) // 2))
+    if goal == start:
+        goal = (width - 2, 1) if start != (width - 2, 1) else (1, height - 2)
+
+    # Carve a random monotone path between them
+    (x, y) = start
+    maze[y][x] = safe
+    while (x, y) != goal:
+        dx = goal[0] - x
+        dy = goal[1] - y
+        if dy == 0 or (dx != 0 and rng.random() < abs(dx) / (abs(dx) + abs(dy))):
+            x += 1 if dx > 0 else -1
+        else:
+            y += 1 if dy > 0 else -1
+        maze[y][x] = safe
+    for (nx, ny) in ((start[0] + 1, start[1]), (start[0] - 1, start[1]), (start[0], start[1] + 1), (start[0], start[1] - 1)):
+        if maze[ny][nx] == pit:
+            maze[ny][nx] = safe
+    maze[start[1]][start[0]] = Environment.PLR_BLOCK
+    maze[goal[1]][goal[0]] = Environment.GOAL_BLOCK
+    return ["".join(row) for row in maze]
+
+
+class MazeGeneratorTests(unittest.TestCase):
+    def _reachable(self, maze):
+        """
+        Returns True if the goal can be reached from the start without
+        entering a wall or a pit
+        """
+        start = next((row.index("@"), y) for (y, row) in enumerate(maze) if "@" in row)
+        stack = [start]
+        seen = {start}
+        while stack:
+            (x, y) = stack.pop()
+            if maze[y][x] == "G":
+                return True
+            for (nx, ny) in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if (nx, ny) not in seen and maze[ny][nx] not in "XP":
+                    seen.add((nx, ny))
+                    stack.append((nx, ny))
+        return False
+
+    def test_generate1(self):
+        for seed in range(50):
+            maze = generate_maze(12, 9, wall_density = 0.35, pit_density = 0.25, seed = seed)
+            self.assertEqual((len(maze), len(maze[0])), (9, 12))
+            self.assertEqual(sum(row.count("@") for row in maze), 1)
+            self.assertEqual(sum(row.count("G") for row in maze), 1)
+            self.assertTrue(set(maze[0]) == set(maze[-1]) == {"X"})
+            self.assertTrue(self._reachable(maze))
+        self.assertEqual(generate_maze(30, 30, seed = 7), generate_maze(30, 30, seed = 7))
+        self.assertEqual(generate_maze(3, 4, seed = 1), ["XXX", "XGX", "X@X", "XXX"])
+        self.assertRaises(ValueError, generate_maze, 3, 3)
+
+    def test_generate2(self):
+        # Generated mazes can be played through
+        maze = generate_maze(15, 10, seed = 3)
+        env = Environment(maze, tick_length = 0, verbose = False)
+        env.start_mission()
+        self.assertTrue(env.get_stats()["ticks"] > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+'''
+Compact, flat-array representation of a grid maze for use by the
+integer-state pathfinders. Cells are stored row-major as one byte each
+(the character code of the maze element), and the cost of moving onto
+each cell is precomputed from a cost map so that searches never touch
+strings or tuples. A cell's flat index is y * width + x
+'''
+
+from array import array
+
+class MazeGrid:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Cost stored for cells that cannot be entered
+    WALL_COST = -1
+    
+    # Number of cell changes remembered for changes_since before the
+    # oldest are forgotten
+    CHANGE_LOG_SIZE = 4096
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, width, height, cells, cost_table):
+        """
+        Constructs a new MazeGrid from an already encoded cell buffer
+        :width: The number of columns in the maze
+        :height: The number of rows in the maze
+        :cells: A bytearray of width * height character codes, row-major
+        :cost_table: A list of 256 costs indexed by character code, with
+        MazeGrid.WALL_COST for impassable elements
+        """
+        if len(cells) != width * height:
+            raise ValueError("cell buffer does not match a " + str(width) + "x" + str(height) + " grid")
+        self.width = width
+        self.height = height
+        self.cells = cells
+        self.cost_table = cost_table
+        self.costs = array('q', [cost_table[c] for c in cells])
+        
+        # Every change to a cell bumps the version and is logged, so that
+        # structures derived from the grid can catch up incrementally
+        self.version = 0
+        self._change_log = []
+        self._log_base = 0
+
+    @staticmethod
+    def make_cost_table(cost_map, wall_block, default_cost = 1):
+        """
+        Returns a list of 256 move costs indexed by character code
+        :cost_map: A dict of maze element -> cost of moving onto it
+        :wall_block: The maze element that cannot be moved onto
+        :default_cost: The cost of any element not in the cost_map
+        """
+        table = [default_cost] * 256
+        for (block, cost) in cost_map.items():
+            table[ord(block)] = cost
+        table[ord(wall_block)] = MazeGrid.WALL_COST
+        return table
+
+    @staticmethod
+    def from_maze(maze, cost_map, wall_block, default_cost = 1):
+        """
+        Encodes a maze given as a list of strings or a list of lists of
+        one-character strings into a new MazeGrid
+        :maze: The maze to encode; all rows must be the same length
+        :cost_map: A dict of maze element -> cost of moving onto it
+        :wall_block: The maze element that cannot be moved onto
+        :default_cost: The cost of any element not in the cost_map
+        """
+        (width, height, cells) = MazeGrid.encode(maze)
+        return MazeGrid(width, height, cells, MazeGrid.make_cost_table(cost_map, wall_block, default_cost))
+
+    @staticmethod
+    def encode(maze):
+        """
+        Returns the (width, height, cells) of a maze given as a list of
+        strings or a list of lists of one-character strings, cells being a
+        new bytearray of its elements' character codes, row-major
+        """
+        height = len(maze)
+        width = len(maze[0]) if height > 0 else 0
+        cells = bytearray()
+        for row in maze:
+            if len(row) != width:
+                raise ValueError("maze rows must all have the same length")
+            cells += ''.join(row).encode("ascii")
+        return (width, height, cells)
+
+    @staticmethod
+    def decode(cells, width, height):
+        """
+        Returns the maze encoded in the given row-major cells as a list of
+        strings, one per row; the inverse of encode
+        """
+        text = cells.decode("ascii")
+        return [text[r * width:(r + 1) * width] for r in range(height)]
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def index(self, loc):
+        """
+        Returns the flat index of the given maze location tuple
+        """
+        return loc[1] * self.width + loc[0]
+
+    def location(self, index):
+        """
+        Returns the maze location tuple (x, y) of the given flat index
+        """
+        (y, x) = divmod(index, self.width)
+        return (x, y)
+
+    def get_cell(self, loc):
+        """
+        Returns the maze element at the given location tuple
+        """
+        return chr(self.cells[self.index(loc)])
+
+    def set_cell(self, loc, block):
+        """
+        Replaces the maze element at the given location tuple, updating
+        its move cost; returns the cost the cell had beforehand
+        :loc: A maze location tuple
+        :block: The new one-character maze element
+        """
+        i = self.index(loc)
+        old_cost = self.costs[i]
+        code = ord(block)
+        if self.cells[i] != code:
+            self.cells[i] = code
+            self.costs[i] = self.cost_table[code]
+            self.version += 1
+            self._change_log.append(i)
+            if len(self._change_log) > MazeGrid.CHANGE_LOG_SIZE:
+                dropped = len(self._change_log) // 2
+                del self._change_log[:dropped]
+                self._log_base += dropped
+        return old_cost
+
+    def changes_since(self, version):
+        """
+        Returns the set of flat indices of cells changed after the given
+        version of the grid, or None if the change log no longer reaches
+        back that far (in which case derived structures must be rebuilt)
+        """
+        if version < self._log_base:
+            return None
+        return set(self._change_log[version - self._log_base:])
+
+    def is_wall(self, index):
+        return self.costs[index] == MazeGrid.WALL_COST
+
+    def neighbours(self, index):
+        """
+        Returns the flat indices of the in-bounds cells adjacent to the
+        given one, in U, D, L, R order; walls are included
+        """
+        w = self.width
+        (y, x) = divmod(index, w)
+        result = []
+        if y > 0:
+            result.append(index - w)
+        if y < self.height - 1:
+            result.append(index + w)
+        if x > 0:
+            result.append(index - 1)
+        if x < w - 1:
+            result.append(index + 1)
+        return result
+
+    def action(self, index, target):
+        """
+        Returns the action ("U", "D", "L" or "R") that moves from the given
+        flat index onto the adjacent target index
+        """
+        w = self.width
+        return {-w: "U", w: "D", -1: "L", 1: "R"}[target - index]
+
+    def manhattan(self, a, b):
+        """
+        Returns the Manhattan distance between two flat indices
+        """
+        w = self.width
+        (ay, ax) = divmod(a, w)
+        (by, bx) = divmod(b, w)
+        return abs(ax - bx) + abs(ay - by)
+
+    def descend(self, start, goal, g, unreachable):
+        """
+        Returns the (cost, actions) of the walk from start to goal that
+        always steps onto the neighbour with the least move cost plus g,
+        where g[i] estimates the cost of reaching goal from cell i and is
+        unreachable (or more) where it cannot; None if the walk gets stuck
+        or outgrows the grid
+        :start: A flat cell index
+        :goal: A flat cell index
+        :g: A sequence of per-cell cost-to-goal estimates
+        :unreachable: The estimate of cells with no path to goal
+        """
+        costs = self.costs
+        if g[start] >= unreachable:
+            return None
+        soln = []
+        total = 0
+        node = start
+        while node != goal:
+            if len(soln) > len(costs):
+                return None
+            best = None
+            best_cost = unreachable
+            for v in self.neighbours(node):
+                cost = costs[v]
+                if cost >= 0 and cost + g[v] < best_cost:
+                    best = v
+                    best_cost = cost + g[v]
+            if best is None:
+                return None
+            soln.append(self.action(node, best))
+            total += costs[best]
+            node = best
+        return (total, soln)
+
+    def rows(self):
+        """
+        Returns the maze as a list of strings, one per row
+        """
+        return MazeGrid.decode(self.cells, self.width, self.height)
+
+    def __len__(self):
+        return len(self.cells)
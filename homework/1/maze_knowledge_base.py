@@ -9,13 +9,471 @@ Logic Knowledge Base for use in Grid Maze pathfinding problems
 with side-information.
 '''
 from maze_clause import MazeClause
+from sat_solver import SatSolver
+from cow_dict import CowDict
 import unittest
-import itertools
+from collections import deque
 
-class MazeKnowledgeBase:
+class ResolutionEngine:
+    """
+    Entailment engine deciding KB |= query by resolution refutation
+    """
+    
+    # Most clauses ask_many lets the KB's resolution closure grow to before
+    # giving up on it and refuting each query on its own instead
+    SATURATION_LIMIT = 2000
+    
+    def __init__ (self):
+        # The KB's clauses (as keys), in a CowDict so that fork can share it
+        self.clauses = CowDict()
+        # Occurrence index: signed int literal -> tuple of the KB's clauses
+        # containing it, so that resolution partners of a clause are looked
+        # up by its complementary literals instead of tried one by one
+        self.index = CowDict()
+        # The KB's resolution closure, as _saturate returns it, until the
+        # next tell or forget; None while it is not known
+        self._closure = None
+    
+    def tell (self, clause):
+        """
+        Adds the given clause, which the engine has not been told before
+        """
+        self.clauses[clause] = None
+        self._closure = None
+        index = self.index
+        for lit in clause.literals:
+            index[lit] = index.get(lit, ()) + (clause,)
+    
+    def forget (self, clause):
+        """
+        Removes the given clause, which the rest of the KB implies
+        """
+        self.clauses.pop(clause, None)
+        self._closure = None
+        index = self.index
+        for lit in clause.literals:
+            index[lit] = tuple(other for other in index[lit] if other != clause)
+    
+    def fork (self):
+        """
+        Returns an independent copy of this engine, sharing its clauses
+        and index until either side changes them
+        """
+        other = ResolutionEngine()
+        other.clauses = self.clauses.fork()
+        other.index = self.index.fork()
+        # Never changed once built, so both sides can share it
+        other._closure = self._closure
+        return other
+    
+    def ask (self, query):
+        """
+        Given a MazeClause query, returns True if the KB entails
+        the query, False otherwise
+        """
+        # Given-clause saturation with the set-of-support strategy: the
+        # KB's clauses start out processed, the negated query is the set
+        # of support, and each clause taken from it (the given clause) is
+        # resolved only against clauses already processed before joining
+        # them. Every resolvent thus descends from the negated query, and
+        # no pair of clauses is ever resolved twice. Partners come from the
+        # KB's occurrence index plus a local one over the processed given
+        # clauses, so only clauses holding a complementary literal are met;
+        # resolvents subsumed by a processed given clause are dropped
+        index = self.index
+        derived = {}
+        kb = self.clauses
+        seen = set()
+        unprocessed = deque()
+        for clause in query.negated():
+            if clause.is_empty():
+                return True
+            if clause not in kb and clause not in seen:
+                seen.add(clause)
+                unprocessed.append(clause)
+        
+        while unprocessed:
+            given = unprocessed.popleft()
+            met = set()
+            for lit in given.literals:
+                for partners in (index.get(-lit, ()), derived.get(-lit, ())):
+                    for other in partners:
+                        if other in met:
+                            continue
+                        met.add(other)
+                        for resolvent in MazeClause.resolve(given, other):
+                            if resolvent.is_empty():
+                                return True
+                            if resolvent not in kb and resolvent not in seen and not ResolutionEngine._subsumed(resolvent, derived):
+                                seen.add(resolvent)
+                                unprocessed.append(resolvent)
+            for lit in given.literals:
+                if lit in derived:
+                    derived[lit].append(given)
+                else:
+                    derived[lit] = [given]
+        return False
+    
+    def _saturate (self):
+        """
+        Returns the KB's resolution closure, up to subsumption, as a signed
+        int literal -> clauses index: every clause the KB entails is a
+        superset of one in it. Returns True instead if the KB is
+        inconsistent, and False if the closure grows past SATURATION_LIMIT
+        """
+        # The same given-clause loop as ask's, with the KB's own clauses
+        # as the set of support and forward subsumption against the
+        # processed clauses, which keeps (a clause subsuming) every prime
+        # implicate of the KB
+        closure = {}
+        size = 0
+        seen = set()
+        unprocessed = deque()
+        for clause in self.clauses:
+            if not clause.is_valid() and clause not in seen:
+                seen.add(clause)
+                unprocessed.append(clause)
+        while unprocessed:
+            given = unprocessed.popleft()
+            if given.is_empty():
+                return True
+            if ResolutionEngine._subsumed(given, closure):
+                continue
+            size += 1
+            if size > ResolutionEngine.SATURATION_LIMIT:
+                return False
+            met = set()
+            for lit in given.literals:
+                for other in closure.get(-lit, ()):
+                    if other in met:
+                        continue
+                    met.add(other)
+                    for resolvent in MazeClause.resolve(given, other):
+                        if resolvent not in seen and not ResolutionEngine._subsumed(resolvent, closure):
+                            seen.add(resolvent)
+                            unprocessed.append(resolvent)
+            for lit in given.literals:
+                if lit in closure:
+                    closure[lit].append(given)
+                else:
+                    closure[lit] = [given]
+        return closure
+    
+    @staticmethod
+    def _subsumed (clause, index):
+        """
+        Returns True if a clause in the given literal -> clauses index
+        is a subset of the given clause
+        """
+        lits = set(clause.literals)
+        for lit in lits:
+            for other in index.get(lit, ()):
+                if len(other.literals) <= len(lits) and lits.issuperset(other.literals):
+                    return True
+        return False
+    
+    def ask_many (self, queries):
+        """
+        Returns the list of ask's answers to the given MazeClause queries.
+        The KB is saturated once (and again only after it changes), and a
+        query is entailed just when a clause of the closure subsumes it; if
+        the closure grows past SATURATION_LIMIT clauses, each query is
+        refuted on its own instead, and once a unit query is entailed, its
+        complement is known not to be
+        """
+        closure = self._closure
+        if closure is None:
+            closure = self._closure = self._saturate()
+        if closure is True:
+            return [True for query in queries]
+        if closure is not False:
+            return [query.is_valid() or ResolutionEngine._subsumed(query, closure) for query in queries]
+        known = {}
+        answers = []
+        for query in queries:
+            answer = known.get(query)
+            if answer is None:
+                answer = self.ask(query)
+                if answer and len(query.literals) == 1:
+                    known[MazeClause._make((-query.literals[0],), False)] = False
+            answers.append(answer)
+        return answers
+
+class SatEngine:
+    """
+    Entailment engine deciding KB |= query by checking that KB and the
+    negated query are unsatisfiable together, with an incremental CDCL
+    SatSolver: the query's negated literals are passed as assumptions, so
+    the clauses learned answering one query are kept for the next
+    """
     
     def __init__ (self):
-        self.clauses = set()
+        self.solver = SatSolver()
+        # Proposition id -> the solver's (dense) variable for it, so that
+        # the solver is sized by the propositions this engine holds
+        self._vars = {}
+    
+    def tell (self, clause):
+        """
+        Adds the given clause, which the engine has not been told before
+        """
+        if clause.is_valid():
+            return
+        variables = self._vars
+        for lit in clause.literals:
+            if abs(lit) not in variables:
+                variables[abs(lit)] = len(variables) + 1
+        self.solver.add_clause(self._local(clause.literals))
+    
+    def forget (self, clause):
+        """
+        Removes the given clause, which the rest of the KB implies
+        """
+        self.solver.remove_clause(self._local(clause.literals))
+    
+    def fork (self):
+        """
+        Returns an independent copy of this engine, learned clauses and all.
+        The solver's state is copied in full (SatSolver.copy), so forking
+        costs time and memory linear in the clauses held; a PartitionedEngine
+        keeps that down to the components either side changes
+        """
+        other = SatEngine()
+        other.solver = self.solver.copy()
+        other._vars = dict(self._vars)
+        return other
+    
+    def ask (self, query):
+        """
+        Given a MazeClause query, returns True if the KB entails
+        the query, False otherwise
+        """
+        return self.ask_many([query])[0]
+    
+    def ask_many (self, queries):
+        """
+        Returns the list of ask's answers to the given MazeClause queries.
+        The KB is solved once up front, and every model found (for it or
+        for a query that turns out not to be entailed) refutes, without a
+        solve of their own, the later queries it falsifies
+        """
+        solver = self.solver
+        models = [solver.model] if solver.solve() else []
+        answers = []
+        for query in queries:
+            if query.is_valid() or not solver.ok:
+                answers.append(True)
+                continue
+            # Literals of propositions in no clause can be made false at
+            # will, so the query is entailed just when the rest of it is
+            lits = self._local(query.literals)
+            for model in models:
+                # The model falsifies the query if none of its literals hold
+                if not any(model[abs(lit)] == (1 if lit > 0 else -1) for lit in lits):
+                    answers.append(False)
+                    break
+            else:
+                if solver.solve([-lit for lit in lits]):
+                    models.append(solver.model)
+                    answers.append(False)
+                else:
+                    answers.append(True)
+        return answers
+    
+    def _local (self, literals):
+        """
+        Returns the solver literals for those of the given literals whose
+        propositions this engine holds
+        """
+        variables = self._vars
+        result = []
+        for lit in literals:
+            var = variables.get(abs(lit))
+            if var is not None:
+                result.append(var if lit > 0 else -var)
+        return result
+
+class PartitionedEngine:
+    """
+    Entailment engine splitting the KB into its connected components, in
+    which clauses sharing a proposition are joined (tracked by union-find
+    over proposition ids as clauses arrive), each held by its own engine.
+    Since components share no propositions, a consistent KB entails a
+    query exactly when some component entails the query's literals on its
+    own propositions, so only the components the query touches are asked.
+    Forks share every component until one side changes it
+    """
+    
+    def __init__ (self, factory):
+        """
+        Constructs an empty partitioned engine
+        :factory: A callable returning a new, empty engine per component
+        """
+        self.factory = factory
+        # Union-find parent of each proposition id seen in a clause
+        self.parent = CowDict()
+        # Root proposition id -> (engine, dict of the component's clauses
+        # in the order told, owner token); a component belongs to the
+        # PartitionedEngine holding its owner token, and any other one
+        # copies it before changing it
+        self.components = CowDict()
+        self._token = object()
+    
+    def find (self, pid):
+        """
+        Returns the root proposition id of the given one's component
+        """
+        parent = self.parent
+        while parent[pid] != pid:
+            parent[pid] = parent[parent[pid]]
+            pid = parent[pid]
+        return pid
+    
+    def tell (self, clause):
+        """
+        Adds the given clause, which the engine has not been told before,
+        merging the components it links; the smaller components' clauses
+        are told to the largest one's engine
+        """
+        if not clause.literals:
+            return
+        parent = self.parent
+        roots = set()
+        for lit in clause.literals:
+            pid = abs(lit)
+            if pid not in parent:
+                parent[pid] = pid
+                self.components[pid] = (self.factory(), {}, self._token)
+            roots.add(self.find(pid))
+        components = self.components
+        root = max(roots, key = lambda r: len(components[r][1]))
+        (engine, clauses) = self._own(root)
+        for other in roots:
+            if other != root:
+                for old in components.pop(other)[1]:
+                    engine.tell(old)
+                    clauses[old] = None
+                parent[other] = root
+        engine.tell(clause)
+        clauses[clause] = None
+    
+    def forget (self, clause):
+        """
+        Removes the given clause, which the rest of the KB implies; the
+        components it joined stay joined
+        """
+        (engine, clauses) = self._own(self.find(abs(clause.literals[0])))
+        del clauses[clause]
+        engine.forget(clause)
+    
+    def fork (self):
+        """
+        Returns an independent copy of this engine, sharing all of its
+        components (which both sides will copy before changing)
+        """
+        other = PartitionedEngine.__new__(PartitionedEngine)
+        other.factory = self.factory
+        other.parent = self.parent.fork()
+        other.components = self.components.fork()
+        other._token = object()
+        self._token = object()
+        return other
+    
+    def _own (self, root):
+        """
+        Returns the (engine, clauses) of the component with the given
+        root, first copying it if it is shared with a fork
+        """
+        (engine, clauses, token) = self.components[root]
+        if token is not self._token:
+            engine = engine.fork()
+            clauses = dict(clauses)
+            self.components[root] = (engine, clauses, self._token)
+        return (engine, clauses)
+    
+    def ask (self, query):
+        """
+        Given a MazeClause query, returns True if the KB entails
+        the query, False otherwise
+        """
+        return self.ask_many([query])[0]
+    
+    def ask_many (self, queries):
+        """
+        Returns the list of ask's answers to the given MazeClause queries,
+        asking each component's engine about its parts of them in one batch
+        """
+        parent = self.parent
+        answers = []
+        # Root -> (part queries, positions of the queries they belong to)
+        batches = {}
+        for query in queries:
+            if query.is_valid():
+                answers.append(True)
+                continue
+            parts = {}
+            for lit in query.literals:
+                # Literals of propositions in no clause cannot help
+                if abs(lit) in parent:
+                    root = self.find(abs(lit))
+                    if root in parts:
+                        parts[root].append(lit)
+                    else:
+                        parts[root] = [lit]
+            for (root, lits) in parts.items():
+                part = query if len(lits) == len(query.literals) else MazeClause._make(tuple(lits), False)
+                if root in batches:
+                    batches[root][0].append(part)
+                    batches[root][1].append(len(answers))
+                else:
+                    batches[root] = ([part], [len(answers)])
+            answers.append(False)
+        for (root, (parts, positions)) in batches.items():
+            for (k, answer) in zip(positions, self.components[root][0].ask_many(parts)):
+                if answer:
+                    answers[k] = True
+        return answers
+
+class MazeKnowledgeBase:
+    
+    # Entailment engines by name; each has tell(clause), ask(query) and
+    # ask_many(queries) methods with the semantics of MazeKnowledgeBase's own
+    ENGINES = {"resolution": ResolutionEngine, "sat": SatEngine}
+    
+    def __init__ (self, engine = "resolution", partitioned = True):
+        """
+        Constructs an empty KB answering queries with the named engine
+        (one of MazeKnowledgeBase.ENGINES)
+        :partitioned: Whether to hold each connected component of the KB
+        in an engine of its own (see PartitionedEngine), so that queries
+        only reach the clauses that can bear on them
+        """
+        if engine not in MazeKnowledgeBase.ENGINES:
+            raise ValueError("Unknown entailment engine: " + repr(engine))
+        # The clauses handed to the engine: those told, simplified by the
+        # units known when they arrived, plus every unit derived since
+        # (as keys). This and the KB's other stores are CowDicts so that
+        # fork can share them
+        self.clauses = CowDict()
+        factory = MazeKnowledgeBase.ENGINES[engine]
+        self.engine = PartitionedEngine(factory) if partitioned else factory()
+        # Unit closure: proposition id -> truth value, for every
+        # proposition fixed by unit propagation over the told clauses
+        self.units = CowDict()
+        # The multi-literal clauses held, each mapped to the frozenset of
+        # its literals not yet known false, and the literal -> frozenset of
+        # clauses index over those; satisfied clauses leave both (and the
+        # engine)
+        self._remaining = CowDict()
+        self._occurs = CowDict()
+        # Number of clauses each simplification rule kept out of or took
+        # out of the clause store
+        self.removed = {"tautology": 0, "satisfied": 0, "forward": 0, "backward": 0}
+        # Count of the tells that changed the KB, and the answers given
+        # since the last of them, by query
+        self.generation = 0
+        self._answers = {}
+        self._answers_generation = 0
     
     def tell (self, clause):
         """
@@ -23,7 +481,28 @@ class MazeKnowledgeBase:
         Note: we expect that no clause added this way will ever
         make the KB inconsistent (you need not check for this)
         """
-        self.clauses.add(clause)
+        if clause in self.clauses:
+            return
+        if clause.is_valid():
+            self.removed["tautology"] += 1
+            return
+        units = self.units
+        remaining = []
+        for lit in clause.literals:
+            value = units.get(abs(lit))
+            if value is None:
+                remaining.append(lit)
+            elif value == (lit > 0):
+                # Already satisfied by a known unit
+                self.removed["satisfied"] += 1
+                return
+        self.generation += 1
+        if len(remaining) == 1:
+            self._propagate(remaining[0])
+        elif len(remaining) == len(clause.literals) or not remaining:
+            self._store(clause)
+        else:
+            self._store(MazeClause._make(tuple(remaining), False))
         return
         
     def ask (self, query):
@@ -31,53 +510,315 @@ class MazeKnowledgeBase:
         Given a MazeClause query, returns True if the KB entails
         the query, False otherwise
         """
-        # TODO: Implement resolution inference here!
-        # This is currently implemented incorrectly; see
-        # spec for details!
-        
-        # create copy of clauses
-        temp_clauses = self.clauses.copy()
-
-        # negate query and add to set of cluases
-        for key in query.props:
-            query.props[key] = not query.props[key]
-        temp_clauses.add(query)
-        new_clauses = set()
-
-        while True:
-            # iterate through each pair
-            for pair in itertools.combinations(temp_clauses, 2):
-                resolved_clause = MazeClause.resolve(pair[0], pair[1])
-                if (len(resolved_clause) == 1):
-                    resolved_clause_check = resolved_clause.pop()
-                    if resolved_clause_check.is_empty():
-                        return True
-                    resolved_clause.add(resolved_clause_check)
-                    new_clauses.update(resolved_clause)
-            if new_clauses.issubset(temp_clauses):
-                return False
-            temp_clauses.update(new_clauses)
+        return self.ask_many([query])[0]
+    
+    def ask_many (self, queries):
+        """
+        Given an iterable of MazeClause queries, returns the list of
+        answers ask would give to each; answers are cached until the next
+        tell that changes the KB, and the queries not already answered (by
+        the cache or by the unit closure) go to the engine in one batch
+        """
+        if self._answers_generation != self.generation:
+            self._answers.clear()
+            self._answers_generation = self.generation
+        cached = self._answers
+        answers = []
+        # Engine query (reduced by the unit closure) -> positions asking it
+        pending = {}
+        for query in queries:
+            answer = cached.get(query)
+            if answer is None:
+                reduced = self._reduce(query)
+                if reduced is True or reduced is False:
+                    answer = cached[query] = reduced
+                elif reduced in pending:
+                    pending[reduced].append((len(answers), query))
+                else:
+                    pending[reduced] = [(len(answers), query)]
+            answers.append(answer)
+        if pending:
+            batch = list(pending)
+            for (reduced, answer) in zip(batch, self.engine.ask_many(batch)):
+                for (k, query) in pending[reduced]:
+                    answers[k] = cached[query] = answer
+        return answers
+    
+    def _reduce (self, query):
+        """
+        Returns the answer to the given query if the unit closure settles
+        it (a literal known true, or every literal known false), otherwise
+        the query without its known-false literals
+        """
+        if query.is_valid():
+            return True
+        units = self.units
+        unknown = []
+        for lit in query.literals:
+            value = units.get(abs(lit))
+            if value is None:
+                unknown.append(lit)
+            elif value == (lit > 0):
+                return True
+        if query.literals and not unknown:
+            return False
+        if len(unknown) < len(query.literals):
+            return MazeClause._make(tuple(unknown), False)
+        return query
+    
+    def fork (self):
+        """
+        Returns an independent copy of this KB, e.g. to tell it hypothetical
+        clauses. Both KBs share their stores, copying only what either side
+        changes afterwards. A resolution engine is shared the same way; a
+        SAT engine's solver is copied in full, which with a PartitionedEngine
+        (the default) happens only per component either side changes
+        """
+        other = MazeKnowledgeBase.__new__(MazeKnowledgeBase)
+        other.clauses = self.clauses.fork()
+        other.engine = self.engine.fork()
+        other.units = self.units.fork()
+        other._remaining = self._remaining.fork()
+        other._occurs = self._occurs.fork()
+        other.removed = dict(self.removed)
+        other.generation = self.generation
+        other._answers = {}
+        other._answers_generation = self.generation
+        return other
+    
+    def stats (self):
+        """
+        Returns a dict of the number of clauses removed by each rule
+        (tautology, satisfied, forward and backward subsumption) along
+        with the current numbers of clauses held and of known units
+        """
+        stats = dict(self.removed)
+        stats["clauses"] = len(self.clauses)
+        stats["units"] = len(self.units)
+        return stats
+    
+    def _store (self, clause):
+        """
+        Hands the given (unit-simplified) clause to the engine unless a
+        clause held subsumes it, first dropping the clauses it subsumes;
+        multi-literal clauses are tracked for simplification by later units
+        """
+        if clause in self.clauses:
+            return
+        if len(clause.literals) > 1:
+            remaining = self._remaining
+            occurs = self._occurs
+            lits = frozenset(clause.literals)
+            for lit in lits:
+                for other in occurs.get(lit, ()):
+                    if remaining[other] <= lits:
+                        self.removed["forward"] += 1
+                        return
+            fewest = min((occurs.get(lit, ()) for lit in lits), key = len)
+            for other in [other for other in fewest if lits <= remaining[other]]:
+                self._forget(other, "backward")
+            remaining[clause] = lits
+            for lit in lits:
+                occurs[lit] = occurs.get(lit, frozenset()).union((clause,))
+        self.clauses[clause] = None
+        self.engine.tell(clause)
+    
+    def _forget (self, clause, rule):
+        """
+        Removes the given tracked clause from the store and the engine,
+        crediting the removal to the named rule
+        """
+        occurs = self._occurs
+        for lit in self._remaining.pop(clause):
+            others = occurs.get(lit)
+            if others is not None:
+                occurs[lit] = others.difference((clause,))
+        self.clauses.pop(clause)
+        self.engine.forget(clause)
+        self.removed[rule] += 1
+    
+    def _propagate (self, lit):
+        """
+        Makes the given literal a known unit, then every literal that the
+        tracked clauses reduce to as a result, by unit propagation; the
+        clauses it satisfies are dropped
+        """
+        units = self.units
+        remaining = self._remaining
+        occurs = self._occurs
+        pending = [lit]
+        while pending:
+            lit = pending.pop()
+            if abs(lit) in units:
+                continue
+            units[abs(lit)] = lit > 0
+            self._store(MazeClause._make((lit,), False))
+            for clause in occurs.pop(lit, ()):
+                self._forget(clause, "satisfied")
+            for clause in occurs.pop(-lit, ()):
+                lits = remaining[clause] = remaining[clause].difference((-lit,))
+                if len(lits) == 1:
+                    pending.append(next(iter(lits)))
 
 class MazeKnowledgeBaseTests(unittest.TestCase):
+    ENGINE = "resolution"
+    
     def test_mazekb1(self):
-        kb = MazeKnowledgeBase()
+        kb = MazeKnowledgeBase(self.ENGINE)
         kb.tell(MazeClause([(("X", (1, 1)), True)]))
         self.assertTrue(kb.ask(MazeClause([(("X", (1, 1)), True)])))
         
     def test_mazekb2(self):
-        kb = MazeKnowledgeBase()
+        kb = MazeKnowledgeBase(self.ENGINE)
         kb.tell(MazeClause([(("X", (1, 1)), False)]))
         kb.tell(MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), True)]))
         self.assertTrue(kb.ask(MazeClause([(("Y", (1, 1)), True)])))
         
     def test_mazekb3(self):
-        kb = MazeKnowledgeBase()
+        kb = MazeKnowledgeBase(self.ENGINE)
         kb.tell(MazeClause([(("X", (1, 1)), False), (("Y", (1, 1)), True)]))
         kb.tell(MazeClause([(("Y", (1, 1)), False), (("Z", (1, 1)), True)]))
         kb.tell(MazeClause([(("W", (1, 1)), True), (("Z", (1, 1)), False)]))
         kb.tell(MazeClause([(("X", (1, 1)), True)]))
         self.assertTrue(kb.ask(MazeClause([(("W", (1, 1)), True)])))
         self.assertFalse(kb.ask(MazeClause([(("Y", (1, 1)), False)])))
+        
+    def test_mazekb4(self):
+        # Breeze-style disjunctions, resolved down to the one remaining pit
+        kb = MazeKnowledgeBase(self.ENGINE)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True), (("P", (3, 2)), True)]))
+        kb.tell(MazeClause([(("P", (1, 2)), False)]))
+        kb.tell(MazeClause([(("P", (3, 2)), False)]))
+        query = MazeClause([(("P", (2, 1)), True)])
+        self.assertTrue(kb.ask(query))
+        self.assertFalse(kb.ask(MazeClause([(("P", (2, 1)), False)])))
+        self.assertFalse(kb.ask(MazeClause([(("P", (2, 3)), True)])))
+        self.assertTrue(query.get_prop(("P", (2, 1))))
+        
+    def test_mazekb5(self):
+        # Clauses are indexed once per literal, and telling twice is a no-op
+        kb = MazeKnowledgeBase("resolution", partitioned = False)
+        clause = MazeClause([(("P", (1, 1)), True), (("P", (2, 1)), False)])
+        kb.tell(clause)
+        kb.tell(clause)
+        kb.tell(MazeClause([(("P", (3, 1)), True)]))
+        pid = MazeClause.SYMBOLS.lookup(("P", (2, 1)))
+        self.assertEqual(kb.engine.index[-pid], (clause,))
+        self.assertFalse(pid in kb.engine.index)
+        self.assertEqual(sum(len(c) for (lit, c) in kb.engine.index.items()), 3)
+        self.assertRaises(ValueError, MazeKnowledgeBase, "tableaux")
+        
+    def test_mazekb7(self):
+        # Units propagate through told clauses as they arrive, and queries
+        # on known literals are answered from the resulting closure
+        kb = MazeKnowledgeBase(self.ENGINE)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True), (("P", (3, 2)), True)]))
+        kb.tell(MazeClause([(("P", (2, 1)), False), (("P", (2, 2)), False)]))
+        kb.tell(MazeClause([(("P", (1, 2)), False)]))
+        self.assertEqual(len(kb.units), 1)
+        kb.tell(MazeClause([(("P", (3, 2)), False)]))
+        symbols = MazeClause.SYMBOLS
+        self.assertEqual(kb.units[symbols.lookup(("P", (2, 1)))], True)
+        self.assertEqual(kb.units[symbols.lookup(("P", (2, 2)))], False)
+        self.assertTrue(kb.ask(MazeClause([(("P", (2, 2)), False), (("P", (5, 5)), True)])))
+        self.assertFalse(kb.ask(MazeClause([(("P", (2, 2)), True), (("P", (3, 2)), True)])))
+        self.assertTrue(kb.ask(MazeClause([(("P", (2, 1)), True)])))
+        
+        # Clauses already satisfied add nothing; others arrive simplified
+        size = len(kb.clauses)
+        kb.tell(MazeClause([(("P", (2, 1)), True), (("P", (4, 4)), True)]))
+        self.assertEqual(len(kb.clauses), size)
+        kb.tell(MazeClause([(("P", (2, 2)), True), (("P", (4, 4)), True), (("P", (4, 5)), True)]))
+        self.assertTrue(MazeClause([(("P", (4, 4)), True), (("P", (4, 5)), True)]) in kb.clauses)
+        self.assertFalse(kb.ask(MazeClause([(("P", (4, 4)), True)])))
+        
+    def test_mazekb8(self):
+        # Batched answers match single ones, and are cached until a tell
+        kb = MazeKnowledgeBase(self.ENGINE)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True)]))
+        kb.tell(MazeClause([(("P", (2, 1)), False), (("P", (3, 1)), True)]))
+        spots = [(1, 2), (2, 1), (3, 1), (2, 2)]
+        queries = [MazeClause([(("P", spot), value)]) for spot in spots for value in (True, False)]
+        queries.append(MazeClause([(("P", (1, 2)), True), (("P", (3, 1)), True)]))
+        queries.append(queries[0])
+        self.assertEqual(kb.ask_many(queries), [False] * 8 + [True, False])
+        self.assertEqual(kb.ask_many(queries), [kb.ask(query) for query in queries])
+        generation = kb.generation
+        kb.tell(MazeClause([(("P", (1, 2)), False)]))
+        kb.tell(MazeClause([(("P", (1, 2)), False)]))
+        self.assertEqual(kb.generation, generation + 1)
+        self.assertEqual(kb.ask_many(queries[:6]), [False, True, True, False, True, False])
+        self.assertEqual(kb.ask_many([]), [])
+        
+    def test_mazekb9(self):
+        # Redundant clauses are kept out of (or taken out of) the store
+        kb = MazeKnowledgeBase(self.ENGINE)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True), (("P", (3, 2)), True)]))
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True), (("P", (3, 2)), True), (("P", (2, 3)), True)]))
+        self.assertEqual(kb.removed["forward"], 1)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True)]))
+        self.assertEqual(kb.removed["backward"], 1)
+        kb.tell(MazeClause([(("P", (1, 2)), True), (("P", (1, 2)), False)]))
+        kb.tell(MazeClause([(("P", (2, 1)), False), (("P", (5, 5)), True)]))
+        kb.tell(MazeClause([(("P", (5, 5)), True)]))
+        self.assertEqual(kb.stats(), {"tautology": 1, "satisfied": 1, "forward": 1, "backward": 1,
+                                      "clauses": 2, "units": 1})
+        self.assertTrue(kb.ask(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True)])))
+        self.assertFalse(kb.ask(MazeClause([(("P", (1, 2)), True)])))
+        kb.tell(MazeClause([(("P", (1, 2)), False)]))
+        self.assertTrue(kb.ask(MazeClause([(("P", (2, 1)), True)])))
+        self.assertEqual(kb.stats()["satisfied"], 2)
+        
+    def test_mazekb10(self):
+        # Clauses sharing no propositions are held (and asked) apart, and
+        # a query spanning components is entailed if one entails its part
+        kb = MazeKnowledgeBase(self.ENGINE)
+        kb.tell(MazeClause([(("P", (1, 1)), True), (("P", (2, 1)), True)]))
+        kb.tell(MazeClause([(("P", (5, 5)), True), (("P", (6, 5)), True)]))
+        kb.tell(MazeClause([(("P", (6, 5)), False), (("P", (7, 5)), True)]))
+        self.assertEqual(len(kb.engine.components), 2)
+        self.assertTrue(kb.ask(MazeClause([(("P", (1, 1)), True), (("P", (2, 1)), True), (("P", (9, 9)), True)])))
+        self.assertTrue(kb.ask(MazeClause([(("P", (5, 5)), True), (("P", (7, 5)), True), (("P", (1, 1)), True)])))
+        self.assertFalse(kb.ask(MazeClause([(("P", (1, 1)), True), (("P", (5, 5)), True)])))
+        kb.tell(MazeClause([(("P", (2, 1)), False), (("P", (5, 5)), True)]))
+        self.assertEqual(len(kb.engine.components), 1)
+        self.assertTrue(kb.ask(MazeClause([(("P", (1, 1)), True), (("P", (5, 5)), True)])))
+        
+    def test_mazekb11(self):
+        # The resolution closure answers a batch as refuting each query
+        # would, and is rebuilt only once the KB changes
+        engine = ResolutionEngine()
+        engine.tell(MazeClause([(("P", (1, 2)), True), (("P", (2, 1)), True), (("P", (3, 2)), True)]))
+        engine.tell(MazeClause([(("P", (2, 1)), False), (("P", (2, 2)), True)]))
+        engine.tell(MazeClause([(("P", (3, 2)), False), (("P", (2, 2)), True)]))
+        spots = [(1, 2), (2, 1), (3, 2), (2, 2)]
+        queries = [MazeClause([(("P", spot), value)]) for spot in spots for value in (True, False)]
+        queries.append(MazeClause([(("P", (1, 2)), True), (("P", (2, 2)), True)]))
+        queries.append(MazeClause([(("P", (1, 2)), True), (("P", (1, 2)), False)]))
+        answers = engine.ask_many(queries)
+        self.assertEqual(answers, [engine.ask(query) for query in queries])
+        self.assertEqual(answers, [False] * 8 + [True, True])
+        closure = engine._closure
+        engine.ask_many(queries)
+        self.assertTrue(engine._closure is closure)
+        engine.tell(MazeClause([(("P", (2, 2)), False)]))
+        self.assertEqual(engine.ask_many(queries[:2]), [True, False])
+        engine.tell(MazeClause([(("P", (1, 2)), False)]))
+        self.assertEqual(engine.ask_many(queries[:2]), [True, True])
+
+class SatKnowledgeBaseTests(MazeKnowledgeBaseTests):
+    ENGINE = "sat"
+    
+    def test_mazekb6(self):
+        # Learned clauses carry over between asks, and tells in between
+        kb = MazeKnowledgeBase("sat")
+        spots = [(x, y) for x in range(1, 4) for y in range(1, 4)]
+        kb.tell(MazeClause([(("P", spot), True) for spot in spots]))
+        for spot in spots[:-1]:
+            self.assertFalse(kb.ask(MazeClause([(("P", spots[-1]), True)])))
+            kb.tell(MazeClause([(("P", spot), False)]))
+        self.assertTrue(kb.ask(MazeClause([(("P", spots[-1]), True)])))
+        self.assertTrue(kb.ask(MazeClause([(("P", spots[0]), True), (("P", spots[0]), False)])))
 
 
 if __name__ == "__main__":
@@ -5,6 +5,10 @@ any cardinal direction
 '''
 
 from environment import *
+from maze_grid import *
+from transition_table import *
+from distance_field import *
+from hierarchical_pathfinder import *
 
 class MazeProblem:
     
@@ -22,18 +26,39 @@ class MazeProblem:
     # Constructor
     ##################################################################
     
-    def __init__(self, maze):
+    def __init__(self, maze, compiled = False, exact_heuristic = False):
         """
-        Constructs a new pathfinding problem from a maze
+        Constructs a new pathfinding problem from a maze. The problem keeps
+        its own copy: later changes to the given maze are not seen, and the
+        problem's (read-only) maze changes only through set_cell, which
+        keeps its grid, table, distance fields and hierarchies in step
         :maze: a list of list of strings containing maze elements
+        :compiled: Whether to compile the maze into a TransitionTable up
+        front, so that transitions are read rather than computed
+        :exact_heuristic: Whether searches on this problem should be guided
+        by a DistanceField from their destination instead of Manhattan distance
         """
-        self.maze = maze
-        
-        
+        self._maze = [''.join(row) for row in maze]
+        self.exact_heuristic = exact_heuristic
+        self._grid = None
+        self._fields = {}
+        self._hierarchies = {}
+        self.table = None
+        if compiled:
+            self.compile()
+
+
     ##################################################################
     # Methods
     ##################################################################
     
+    @property
+    def maze(self):
+        """
+        The problem's maze, as a tuple of strings; use set_cell to change it
+        """
+        return tuple(self._maze)
+
     def transitions(self, state):
         """
         Given some state s, the transitions will be represented as a list of tuples
@@ -44,9 +69,14 @@ class MazeProblem:
         [("R", 1, (2, 1)), ("D", 1, (1, 2))]
         :state: A maze location tuple
         """
+        if self.table is not None:
+            grid = self._grid
+            table = self.table
+            actions = TransitionTable.ACTIONS
+            return [(actions[table.actions[k]], table.costs[k], grid.location(table.targets[k])) for k in table.edges(grid.index(state))]
         s = state
         possible = [("U", (s[0], s[1]-1)), ("D", (s[0], s[1]+1)), ("L", (s[0]-1, s[1])), ("R", (s[0]+1, s[1]))]
-        return [(s[0], self.cost(s[1]), s[1]) for s in possible if self.maze[s[1][1]][s[1][0]] != Environment.WALL_BLOCK]
+        return [(s[0], self.cost(s[1]), s[1]) for s in possible if self._maze[s[1][1]][s[1][0]] != Environment.WALL_BLOCK]
     
     def cost(self, state):
         """
@@ -55,6 +85,77 @@ class MazeProblem:
         :state: A maze location tuple
         """
         cm = MazeProblem.COST_MAP
-        cell = self.maze[state[1]][state[0]]
+        cell = self._maze[state[1]][state[0]]
         return cm[cell] if cell in cm else 1
-    
+
+    def grid(self):
+        """
+        Returns the MazeGrid encoding of this problem's maze, with move
+        costs precomputed from the COST_MAP; the encoding is built on
+        first use and reused thereafter
+        """
+        if self._grid is None:
+            self._grid = MazeGrid.from_maze(self._maze, MazeProblem.COST_MAP, Environment.WALL_BLOCK)
+        return self._grid
+
+    @staticmethod
+    def from_grid(grid, compiled = False, exact_heuristic = False):
+        """
+        Constructs a new pathfinding problem around an existing MazeGrid,
+        which must have been encoded with the MazeProblem's COST_MAP and,
+        like the problem's maze, must change only through set_cell
+        """
+        problem = MazeProblem(grid.rows(), exact_heuristic = exact_heuristic)
+        problem._grid = grid
+        if compiled:
+            problem.compile()
+        return problem
+
+    def compile(self):
+        """
+        Compiles the maze into a TransitionTable over its MazeGrid, kept in
+        sync by set_cell from then on; returns the table
+        """
+        if self.table is None:
+            self.table = TransitionTable(self.grid())
+        return self.table
+
+    def distance_field(self, goal):
+        """
+        Returns the DistanceField toward the given goal location tuple, built
+        on first request and repaired to the grid's current version on
+        every later one
+        """
+        field = self._fields.get(goal)
+        if field is None:
+            field = self._fields[goal] = DistanceField(self.grid(), goal)
+        else:
+            field.refresh()
+        return field
+
+    def hierarchy(self, cluster_size = 16):
+        """
+        Returns the HierarchicalPathfinder abstraction of this problem with
+        the given cluster size, built on first request; it catches up with
+        cells changed through set_cell when next queried
+        """
+        hpa = self._hierarchies.get(cluster_size)
+        if hpa is None:
+            hpa = self._hierarchies[cluster_size] = HierarchicalPathfinder(self.grid(), cluster_size)
+        return hpa
+
+    def set_cell(self, loc, block):
+        """
+        Replaces the maze element at the given location, keeping the
+        MazeGrid encoding and TransitionTable (if built) in sync; any
+        DistanceFields and hierarchies catch up with the change when next used
+        :loc: A maze location tuple
+        :block: The new one-character maze element
+        """
+        (x, y) = loc
+        row = self._maze[y]
+        self._maze[y] = row[:x] + block + row[x + 1:]
+        if self._grid is not None:
+            self._grid.set_cell(loc, block)
+            if self.table is not None:
+                self.table.invalidate_cell(self._grid.index(loc))
@@ -0,0 +1,161 @@
+'''
+Compact, mutable grid of one-character maze elements, stored one byte
+per cell in a flat bytearray (index y * width + x) yet readable and
+writable as maze[y][x], like the list of lists of strings it replaces.
+Rows are light proxies over the shared bytearray, so whoever holds a
+MazeView (e.g., the MazeAgent holding the Environment's view of what it
+has learned) sees every change made through any other handle on it.
+'''
+
+import unittest
+from maze_grid import MazeGrid
+
+class MazeView:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, width, height, cells):
+        """
+        Constructs a view over the given cells
+        :width: The number of columns
+        :height: The number of rows
+        :cells: A bytearray of width * height ASCII maze elements, row by
+        row; it is shared, not copied
+        """
+        if len(cells) != width * height:
+            raise ValueError("expected %d cells, got %d" % (width * height, len(cells)))
+        self.width = width
+        self.height = height
+        self.cells = cells
+        self._rows = [MazeRow(cells, y * width, width, y) for y in range(height)]
+
+    @staticmethod
+    def from_maze(maze):
+        """
+        Encodes a maze given as a list of strings or a list of lists of
+        one-character strings into a new MazeView, encoded as for MazeGrid
+        """
+        (width, height, cells) = MazeGrid.encode(maze)
+        return MazeView(width, height, cells)
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def rows(self):
+        """
+        Returns the maze as a list of strings, one per row
+        """
+        return MazeGrid.decode(self.cells, self.width, self.height)
+
+    def index(self, row):
+        """
+        Returns the number of the given row, as list.index would
+        """
+        if isinstance(row, MazeRow) and row.cells is self.cells:
+            return row.y
+        for (y, own) in enumerate(self._rows):
+            if own == row:
+                return y
+        raise ValueError("row is not in this maze")
+
+    def __getitem__(self, y):
+        return self._rows[y]
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __eq__(self, other):
+        if isinstance(other, MazeView):
+            return (self.width, self.height, self.cells) == (other.width, other.height, other.cells)
+        return self.rows() == [''.join(row) for row in other]
+
+    def __str__(self):
+        return "\n".join(self.rows())
+
+
+class MazeRow:
+    """
+    One row of a MazeView, indexable as row[x] and supporting the in,
+    index and iteration used on rows given as strings or lists
+    """
+    __slots__ = ("cells", "start", "width", "y")
+
+    def __init__(self, cells, start, width, y):
+        self.cells = cells
+        self.start = start
+        self.width = width
+        self.y = y
+
+    def _offset(self, x):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError("maze column out of range: " + repr(x))
+        return self.start + x
+
+    def index(self, block):
+        i = self.cells.find(block.encode("ascii"), self.start, self.start + self.width)
+        if i < 0:
+            raise ValueError(repr(block) + " is not in this row")
+        return i - self.start
+
+    def __getitem__(self, x):
+        return chr(self.cells[self._offset(x)])
+
+    def __setitem__(self, x, block):
+        self.cells[self._offset(x)] = ord(block)
+
+    def __contains__(self, block):
+        return self.cells.find(block.encode("ascii"), self.start, self.start + self.width) >= 0
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, MazeRow):
+            return str(self) == str(other)
+        return str(self) == ''.join(other)
+
+    def __str__(self):
+        return self.cells[self.start:self.start + self.width].decode("ascii")
+
+    def __repr__(self):
+        return "MazeRow(%r)" % str(self)
+
+
+class MazeViewTests(unittest.TestCase):
+    def test_view1(self):
+        maze = ["XXXX", "X@GX", "XXXX"]
+        view = MazeView.from_maze(maze)
+        self.assertEqual((len(view), len(view[0])), (3, 4))
+        self.assertEqual(view.rows(), maze)
+        self.assertEqual(view, maze)
+        self.assertEqual([list(row) for row in view], [list(row) for row in maze])
+        self.assertEqual((view[1][1], view[1][-1]), ("@", "X"))
+        self.assertTrue("@" in view[1] and "@" not in view[0])
+        self.assertEqual((view[1].index("G"), view.index(view[1])), (2, 1))
+        self.assertRaises(ValueError, view[0].index, "G")
+        self.assertRaises(IndexError, view[0].__getitem__, 4)
+        self.assertRaises(ValueError, MazeView.from_maze, ["XX", "X"])
+
+    def test_view2(self):
+        # Writes through any row are seen by every holder of the cells
+        view = MazeView.from_maze([list("X..X"), list("X??X")])
+        other = MazeView(view.width, view.height, view.cells)
+        view[1][2] = "S"
+        self.assertEqual(other[1][2], "S")
+        self.assertEqual(str(other), "X..X\nX?SX")
+        self.assertEqual(''.join(other[1]), "X?SX")
+
+if __name__ == "__main__":
+    unittest.main()
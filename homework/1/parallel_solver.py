@@ -0,0 +1,366 @@
+'''
+Process-pool execution layer for sweeping large batches of maze
+problems across all cores. Each job's shared part (a maze's encoded grid,
+or the pickled clauses of a knowledge base) is placed once in a shared
+memory segment that the workers read by name and decode at most once
+each, so only the queries are pickled per task; queries are split into
+chunks, at most max_pending chunks are in flight at a time, and results
+are streamed back in the order the jobs were given.
+'''
+
+import itertools
+import multiprocessing
+import os
+import pickle
+import unittest
+import weakref
+from collections import OrderedDict, deque
+from multiprocessing import resource_tracker, shared_memory
+from pathfinder import pathfind_many
+from maze_problem import MazeProblem, MazeGrid, Environment
+from maze_knowledge_base import MazeKnowledgeBase, MazeClause
+
+class ParallelSolver:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Number of jobs whose decoded MazeProblem (with its cached distance
+    # fields) or MazeKnowledgeBase each worker keeps for their later chunks
+    WORKER_CACHE_SIZE = 8
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, processes = None, chunksize = 64, max_pending = None):
+        """
+        Starts the worker pool
+        :processes: The number of worker processes; defaults to the CPU count
+        :chunksize: The number of queries sent to a worker per task
+        :max_pending: The number of tasks allowed in flight before the
+        solver waits on results; defaults to 4 per worker. Bounds memory use
+        when the input stream is much larger than the pool can keep up with
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = max(1, chunksize)
+        self.max_pending = max_pending or 4 * self.processes
+        if os.name == "posix":
+            # Workers inherit a running resource tracker rather than each
+            # starting their own, so the segments they attach stay this
+            # process's to unlink
+            resource_tracker.ensure_running()
+        self._pool = multiprocessing.Pool(self.processes)
+        self._serials = itertools.count()
+        # Result generators handed out, closed (releasing their segments)
+        # before the pool is shut down
+        self._runs = weakref.WeakSet()
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def solve(self, jobs):
+        """
+        Generator answering pathfinding jobs in parallel; yields, per job
+        and in job order, the list of pathfind-style (cost, actions) results
+        (or None) for that job's queries
+        :jobs: An iterable of (maze, queries) pairs, where maze is a list of
+        strings, a list of lists of one-character strings or a MazeProblem,
+        and queries is an iterable of (start, dest) location tuples
+        """
+        return self._start(self._path_tasks(jobs))
+
+    def ask(self, jobs):
+        """
+        Generator answering entailment jobs in parallel; yields, per job
+        and in job order, the list of MazeKnowledgeBase.ask answers for that
+        job's queries. Each job's clauses are shipped to the workers once,
+        and told to a knowledge base at most once per worker
+        :jobs: An iterable of (clauses, queries) pairs, where clauses is an
+        iterable of MazeClauses to tell a fresh MazeKnowledgeBase and
+        queries is an iterable of MazeClauses to ask it
+        """
+        return self._start(self._ask_tasks(jobs))
+
+    def close(self):
+        """
+        Shuts the worker pool down, first closing any result generator
+        still open
+        """
+        self._close_runs()
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_runs()
+            self._pool.terminate()
+        return False
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _start(self, tasks):
+        run = self._run(tasks)
+        self._runs.add(run)
+        return run
+
+    def _close_runs(self):
+        """
+        Closes every result generator still open, so that each waits for
+        its tasks in flight and releases its segments while the pool can
+        still finish them
+        """
+        for run in list(self._runs):
+            run.close()
+
+    def _chunks(self, queries):
+        queries = list(queries)
+        if not queries:
+            return [[]]
+        return [queries[i:i + self.chunksize] for i in range(0, len(queries), self.chunksize)]
+
+    def _share(self, function, data, extra, queries):
+        """
+        Generator of (function, args, segment, last) task descriptions for
+        one job: data is placed in a new shared memory segment, to be
+        released once the job's last task completes, and each chunk of the
+        queries becomes a call function((segment name, job serial, len(data),
+        extra), chunk) in a worker
+        """
+        serial = next(self._serials)
+        segment = shared_memory.SharedMemory(create = True, size = max(1, len(data)))
+        segment.buf[:len(data)] = data
+        shared = (segment.name, serial, len(data), extra)
+        chunks = self._chunks(queries)
+        for (k, chunk) in enumerate(chunks):
+            yield (function, (shared, chunk), segment, k == len(chunks) - 1)
+
+    def _path_tasks(self, jobs):
+        """
+        Generator of task descriptions for the given pathfinding jobs, each
+        sharing the job's encoded grid
+        """
+        for (maze, queries) in jobs:
+            grid = maze.grid() if isinstance(maze, MazeProblem) else MazeGrid.from_maze(maze, MazeProblem.COST_MAP, Environment.WALL_BLOCK)
+            yield from self._share(_solve_paths, bytes(grid.cells), (grid.width, grid.height), queries)
+
+    def _ask_tasks(self, jobs):
+        """
+        Generator of task descriptions for the given entailment jobs, each
+        sharing the job's pickled clauses
+        """
+        for (clauses, queries) in jobs:
+            yield from self._share(_solve_asks, pickle.dumps(list(clauses)), None, queries)
+
+    def _run(self, tasks):
+        """
+        Submits the given tasks to the pool, keeping at most max_pending of
+        them in flight, and yields each job's concatenated results in order
+        """
+        pending = deque()
+        collected = []
+        # Every segment created and not yet released, by identity, so that
+        # none outlives the generator however early its consumer stops
+        owned = {}
+        try:
+            for (function, args, segment, last) in tasks:
+                owned[id(segment)] = segment
+                if len(pending) >= self.max_pending:
+                    done = self._collect(pending.popleft(), collected, owned)
+                    if done is not None:
+                        yield done
+                        collected = []
+                pending.append((self._pool.apply_async(function, args), segment, last))
+            while pending:
+                done = self._collect(pending.popleft(), collected, owned)
+                if done is not None:
+                    yield done
+                    collected = []
+        finally:
+            # Stop creating segments, let the tasks in flight finish with
+            # theirs, then release those of any job abandoned part-way
+            # through, submitted in full or not
+            if hasattr(tasks, "close"):
+                tasks.close()
+            for (result, segment, last) in pending:
+                result.wait()
+            for segment in owned.values():
+                _release(segment)
+
+    def _collect(self, entry, collected, owned):
+        """
+        Waits on the given pending task, adding its results to collected;
+        returns collected if that was its job's last task, None otherwise
+        """
+        (result, segment, last) = entry
+        try:
+            collected.extend(result.get())
+        finally:
+            if last:
+                _release(owned.pop(id(segment)))
+        return collected if last else None
+
+
+def _release(segment):
+    segment.close()
+    segment.unlink()
+
+
+##################################################################
+# Worker-side functions (run in the pool's processes)
+##################################################################
+
+# (segment name, job serial) -> the job's decoded MazeProblem or
+# MazeKnowledgeBase, least recently used first; the serial guards against
+# the OS reusing a segment name
+_worker_jobs = OrderedDict()
+
+def _attach(shared, decode):
+    """
+    Returns decode(data, extra) for the given (segment name, job serial,
+    data length, extra), reading the job's data from its shared memory
+    segment and decoding it on first use in this worker
+    """
+    (name, serial, size, extra) = shared
+    key = (name, serial)
+    if key in _worker_jobs:
+        _worker_jobs.move_to_end(key)
+        return _worker_jobs[key]
+    segment = _attach_segment(name)
+    try:
+        data = bytes(segment.buf[:size])
+    finally:
+        segment.close()
+    decoded = _worker_jobs[key] = decode(data, extra)
+    while len(_worker_jobs) > ParallelSolver.WORKER_CACHE_SIZE:
+        _worker_jobs.popitem(last = False)
+    return decoded
+
+def _decode_problem(cells, size):
+    (width, height) = size
+    table = MazeGrid.make_cost_table(MazeProblem.COST_MAP, Environment.WALL_BLOCK)
+    return MazeProblem.from_grid(MazeGrid(width, height, bytearray(cells), table))
+
+def _decode_kb(data, extra):
+    kb = MazeKnowledgeBase()
+    for clause in pickle.loads(data):
+        kb.tell(clause)
+    return kb
+
+def _attach_segment(name):
+    """
+    Attaches to the named shared memory segment without the resource
+    tracker taking ownership of it; the parent process owns and unlinks it
+    """
+    try:
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers the segment, but
+        # with the tracker shared with the parent (see the constructor)
+        # that is a no-op, and the parent's unlink unregisters it once
+        return shared_memory.SharedMemory(name = name)
+
+def _solve_paths(shared, queries):
+    return pathfind_many(_attach(shared, _decode_problem), queries)
+
+def _solve_asks(shared, queries):
+    return _attach(shared, _decode_kb).ask_many(queries)
+
+
+class ParallelSolverTests(unittest.TestCase):
+    def test_solve1(self):
+        mazes = [["XXXXX",
+                  "X.P.X",
+                  "X...X",
+                  "XXXXX"],
+                 ["XXXXX",
+                  "X.X.X",
+                  "XXXXX"]]
+        jobs = [(mazes[0], [((1, 1), (3, 1)), ((3, 2), (1, 1))]),
+                (mazes[1], [((1, 1), (3, 1))]),
+                (MazeProblem(mazes[0]), [])] * 3
+        with ParallelSolver(processes = 2, chunksize = 1, max_pending = 2) as solver:
+            results = list(solver.solve(jobs))
+        self.assertEqual(len(results), 9)
+        for (job, result) in zip(jobs, results):
+            self.assertEqual(len(job[1]), len(result))
+        self.assertEqual(results[0][0], (4, ["D", "R", "R", "U"]))
+        self.assertEqual(results[0][1][0], 3)
+        self.assertEqual(results[1], [None])
+
+    def _segments(self):
+        """
+        Returns the names of the SharedMemory segments currently in
+        existence, where the platform lists them (the pool's semaphores
+        may be listed alongside)
+        """
+        if not os.path.isdir("/dev/shm"):
+            self.skipTest("shared memory segments are not listed on this platform")
+        return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+    def test_solve2(self):
+        # A consumer stopping early leaves no shared grid behind, including
+        # those of jobs whose last task was never submitted
+        maze = ["XXXXX",
+                "X...X",
+                "XXXXX"]
+        jobs = [(maze, [((1, 1), (3, 1))]), (maze, [((1, 1), (3, 1))] * 6), (maze, [((3, 1), (1, 1))])]
+        before = self._segments()
+        with ParallelSolver(processes = 2, chunksize = 1, max_pending = 2) as solver:
+            results = solver.solve(jobs)
+            self.assertEqual(next(results), [(2, ["R", "R"])])
+            self.assertEqual(len(self._segments() - before), 1)
+            results.close()
+            self.assertEqual(self._segments() - before, set())
+            self.assertEqual(list(solver.solve(jobs))[1], [(2, ["R", "R"])] * 6)
+        self.assertEqual(self._segments() - before, set())
+
+        # So does leaving the solver on an error with a generator still open
+        with self.assertRaises(RuntimeError):
+            with ParallelSolver(processes = 2, chunksize = 1, max_pending = 2) as solver:
+                results = solver.solve(jobs)
+                next(results)
+                raise RuntimeError("consumer failed")
+        self.assertEqual(self._segments() - before, set())
+
+    def test_ask1(self):
+        clauses = [MazeClause([(("X", (1, 1)), False)]),
+                   MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), True)])]
+        queries = [MazeClause([(("Y", (1, 1)), True)]), MazeClause([(("X", (1, 1)), True)])]
+        with ParallelSolver(processes = 2) as solver:
+            results = list(solver.ask([(clauses, queries), (clauses[:1], queries)]))
+        self.assertEqual(results, [[True, False], [False, False]])
+
+    def test_ask2(self):
+        # Many chunks of one job are answered from its clauses as shared
+        # once, and an abandoned job's clauses are released too
+        clauses = [MazeClause([(("P", (x, 1)), True), (("P", (x + 1, 1)), True)]) for x in range(10)]
+        clauses.append(MazeClause([(("P", (0, 1)), False)]))
+        queries = [MazeClause([(("P", (x, 1)), truth)]) for x in range(11) for truth in (True, False)]
+        kb = MazeKnowledgeBase()
+        for clause in clauses:
+            kb.tell(clause)
+        expected = [kb.ask(query) for query in queries]
+        self.assertEqual(expected[:4], [False, True, True, False])
+        before = self._segments()
+        with ParallelSolver(processes = 2, chunksize = 2, max_pending = 3) as solver:
+            self.assertEqual(list(solver.ask([(clauses, queries), (iter(clauses), [])])), [expected, []])
+            results = solver.ask([(clauses, queries)] * 3)
+            self.assertEqual(next(results), expected)
+            results.close()
+        self.assertEqual(self._segments() - before, set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+'''
+Bounded LRU cache of pathfinding results for one MazeProblem, keyed by
+the maze version and the (start, dest) endpoints. When cells of the
+maze change (through MazeProblem.set_cell), the cache reads them from
+the grid's change log, compares their costs with those it last saw, and
+drops only the entries they can affect: paths running through a changed
+cell, and paths that a cell made cheaper (or opened up) could undercut.
+Cells made costlier off a path, or walled off, leave it cached.
+
+The cache is opt-in, for callers that ask pathfind the same questions
+over and over (evaluation harnesses, batch tools); MazeAgent does not
+use it, since its D* Lite and ARA* planners already repair their plans
+incrementally between ticks.
+'''
+
+import unittest
+from array import array
+from collections import OrderedDict
+from pathfinder import pathfind
+from maze_problem import MazeProblem
+
+class PathCache:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, problem, capacity = 1024, solver = pathfind):
+        """
+        Constructs an empty cache in front of the given problem
+        :problem: A MazeProblem object, to be changed only via set_cell
+        :capacity: The maximum number of paths kept
+        :solver: The pathfinding function called on a miss, with pathfind's
+        signature and return format
+        """
+        self.problem = problem
+        self.capacity = capacity
+        self.solver = solver
+        self.grid = problem.grid()
+        self.version = self.grid.version
+        self._costs = array('q', self.grid.costs)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        # (start, dest) -> (cost, actions, frozenset of flat indices on path),
+        # least recently used first; cost is None for unreachable dests
+        self._entries = OrderedDict()
+        self._min_cost = min([c for c in self.grid.cost_table if c >= 0] or [0])
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def pathfind(self, start, dest):
+        """
+        Returns pathfind(problem, start, dest), from the cache if possible
+        """
+        self.refresh()
+        key = (start, dest)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return None if entry[0] is None else (entry[0], list(entry[1]))
+        self.misses += 1
+        result = self.solver(self.problem, start, dest)
+        self._store(key, result)
+        return result
+
+    def refresh(self):
+        """
+        Drops the entries made stale by cells changed since the cache last
+        looked at the grid; returns the number of entries dropped
+        """
+        grid = self.grid
+        if self.version == grid.version:
+            return 0
+        changed = grid.changes_since(self.version)
+        self.version = grid.version
+        if changed is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self._costs = array('q', grid.costs)
+        else:
+            # Each changed cell's cost as last seen and now, walls costing
+            # more than any cell
+            (seen, costs) = (self._costs, grid.costs)
+            inf = float("inf")
+            changes = []
+            for i in changed:
+                (old, new) = (seen[i], costs[i])
+                if old != new:
+                    changes.append((i, inf if old < 0 else old, inf if new < 0 else new))
+                    seen[i] = new
+            stale = [key for (key, entry) in self._entries.items() if self._affected(key, entry, changes)]
+            for key in stale:
+                del self._entries[key]
+            dropped = len(stale)
+        self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        """
+        Returns a dict of the cache's counters and current size
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations, "size": len(self._entries),
+                "capacity": self.capacity}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _store(self, key, result):
+        if self.capacity <= 0:
+            return
+        grid = self.grid
+        if result is None:
+            entry = (None, (), frozenset())
+        else:
+            (cost, actions) = result
+            dirs = {"U": -grid.width, "D": grid.width, "L": -1, "R": 1}
+            node = grid.index(key[0])
+            cells = [node]
+            for action in actions:
+                node += dirs[action]
+                cells.append(node)
+            entry = (cost, tuple(actions), frozenset(cells))
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    def _affected(self, key, entry, changes):
+        """
+        Returns True if any of the given (index, old cost, new cost) cell
+        changes may alter the cached answer
+        """
+        (cost, actions, cells) = entry
+        w = self.grid.width
+        (sx, sy) = key[0]
+        (dx, dy) = key[1]
+        for (i, old, new) in changes:
+            if i in cells:
+                # The path itself got costlier, cheaper or blocked
+                return True
+            if new >= old:
+                # Other paths only got costlier
+                continue
+            if cost is None:
+                return True
+            # Cheapest conceivable path from start through i to dest: every
+            # step costs at least the cheapest cell, entering i costs its cost
+            (y, x) = divmod(i, w)
+            to_cell = abs(x - sx) + abs(y - sy)
+            from_cell = abs(x - dx) + abs(y - dy)
+            bound = max(to_cell - 1, 0) * self._min_cost + (new if to_cell > 0 else 0) + from_cell * self._min_cost
+            if bound < cost:
+                return True
+        return False
+
+
+class PathCacheTests(unittest.TestCase):
+    def test_cache1(self):
+        maze = [list("XXXXXXX"),
+                list("X.....X"),
+                list("X.XXX.X"),
+                list("X.....X"),
+                list("XXXXXXX")]
+        mp = MazeProblem(maze)
+        cache = PathCache(mp, capacity = 2)
+        self.assertEqual(cache.pathfind((1, 1), (5, 1)), (4, ["R", "R", "R", "R"]))
+        self.assertEqual(cache.pathfind((1, 1), (5, 1)), (4, ["R", "R", "R", "R"]))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Changes far from the path, that cannot undercut it, keep it cached
+        mp.set_cell((3, 3), "P")
+        self.assertEqual(cache.pathfind((1, 1), (5, 1))[0], 4)
+        self.assertEqual((cache.hits, cache.invalidations), (2, 0))
+
+        # A change on the path drops it
+        mp.set_cell((3, 1), "U")
+        self.assertEqual(cache.pathfind((1, 1), (5, 1))[0], 10)
+        self.assertEqual((cache.misses, cache.invalidations), (2, 1))
+
+        # Nearby cells off the path that keep their cost or get costlier
+        # cannot undercut it
+        mp.set_cell((1, 3), "S")
+        mp.set_cell((1, 2), "U")
+        self.assertEqual(cache.pathfind((1, 1), (5, 1))[0], 10)
+        self.assertEqual((cache.misses, cache.invalidations), (2, 1))
+        mp.set_cell((1, 2), ".")
+        self.assertEqual(cache.pathfind((1, 1), (5, 1))[0], 10)
+        self.assertEqual(cache.invalidations, 2)
+
+        # Cheaper cells off the path that could undercut it drop it too
+        mp.set_cell((3, 3), ".")
+        self.assertEqual(cache.pathfind((1, 1), (5, 1))[0], 8)
+        self.assertEqual(cache.invalidations, 3)
+
+    def test_cache2(self):
+        maze = [list("XXXXX"),
+                list("X.X.X"),
+                list("X...X"),
+                list("XXXXX")]
+        mp = MazeProblem(maze)
+        cache = PathCache(mp, capacity = 2)
+        cache.pathfind((1, 1), (3, 1))
+        cache.pathfind((1, 2), (3, 1))
+        cache.pathfind((3, 2), (3, 1))
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache), 2)
+
+        # Unreachable answers are kept until something opens up or gets
+        # cheaper
+        mp.set_cell((2, 2), "X")
+        self.assertTrue(cache.pathfind((1, 1), (3, 1)) is None)
+        mp.set_cell((3, 2), "X")
+        mp.set_cell((1, 2), "P")
+        self.assertTrue(cache.pathfind((1, 1), (3, 1)) is None)
+        self.assertEqual(cache.stats()["hits"], 1)
+        mp.set_cell((2, 2), ".")
+        mp.set_cell((3, 2), ".")
+        self.assertEqual(cache.pathfind((1, 1), (3, 1))[0], 23)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,12 +7,14 @@ This task is done in the solve method, as parameterized
 by a maze pathfinding problem, and is aided by the SearchTreeNode DS.
 '''
 
-import queue
+import heapq
 import unittest
 import itertools
 import math
+from array import array
 from maze_problem import *
 from search_tree_node import *
+from frontier import *
 
 def _get_solution(node):
     """
@@ -46,34 +48,353 @@ def pathfind(problem, start, dest):
     :start: A maze location tuple
     :dest: A maze location tuple
     """
-    # Setup
-    frontier  = queue.PriorityQueue()
-    closedSet = set()
+    return _astar(problem, start, dest)
+
+def _astar(problem, start, dest, field = None):
+    """
+    The A* search behind pathfind. Given the DistanceField toward dest,
+    children that cannot lie on a cheapest path to dest are never pushed;
+    every state that can is still pushed and expanded in the same relative
+    order, so the path found is exactly the one pathfind would return
+    """
+    # Setup; problems that ask for it are searched with their exact
+    # distance field toward dest in place of the Manhattan heuristic
+    frontier = Frontier()
+    h = problem.distance_field(dest).heuristic if problem.exact_heuristic else heuristic
+    if field is not None:
+        index = field.grid.index
+        dist = field.dist
+        bound = dist[index(start)]
+        if bound >= DistanceField.INF:
+            return None
     
     # Search!
-    frontier.put(SearchTreeNode(start, None, None, 0, heuristic(start, dest)))
-    while not frontier.empty():
-        # Get front node of priority queue
-        expanding = frontier.get()
+    startHeuristicCost = h(start, dest)
+    frontier.push(start, 0, startHeuristicCost, SearchTreeNode(start, None, None, 0, startHeuristicCost))
+    while True:
+        # Get front node of the frontier; stale entries are skipped and the
+        # popped state is added to the frontier's closed set
+        popped = frontier.pop()
+        if popped is None:
+            break
+        (state, g, expanding) = popped
         
         # Test for goal state
-        if expanding.state == dest:
+        if state == dest:
             return _get_solution(expanding)
         
-        # Compute evaluation function for expanded node, f(n) = g(n) + h(n)
-        evaluation = expanding.evaluation()
+        # Generate new nodes on frontier, only for states whose best known
+        # path cost improves (checked here to avoid building dominated nodes)
+        for (action, cost, nextState) in problem.transitions(state):
+            childTotalCost = g + cost
+            childHeuristicCost = h(nextState, dest)
+            if nextState in frontier.closed:
+                continue
+            best = frontier.best_g.get(nextState)
+            if best is not None and best <= childTotalCost:
+                continue
+            if field is not None and childTotalCost + dist[index(nextState)] > bound:
+                continue
+            frontier.push(nextState, childTotalCost, childHeuristicCost, SearchTreeNode(nextState, action, expanding, childTotalCost, childHeuristicCost))
+    
+    # No solution
+    return None
+
+def astar_flat(grid, start, dest, table = None, h_table = None):
+    """
+    A* over the flat cell indices of a MazeGrid; path costs and parent
+    pointers are kept in arrays preallocated to the size of the grid, so
+    that no per-state objects are created during the search.
+    Returns the (g, parent) arrays if dest was reached, None otherwise,
+    where parent[i] is the index from which cell i was entered
+    :grid: A MazeGrid object
+    :start: A flat cell index
+    :dest: A flat cell index
+    :table: An optional TransitionTable compiled from grid, whose edge
+    arrays are then walked instead of computing neighbours
+    :h_table: An optional array of per-cell heuristic costs toward dest
+    (e.g. a DistanceField's dist) to use in place of Manhattan distance;
+    cells at or beyond DistanceField.INF are never pushed
+    """
+    costs = grid.costs
+    neighbours = grid.neighbours
+    manhattan = grid.manhattan
+    n = len(costs)
+    unreached = n * max(max(costs), 1) + 1
+    g = array('q', [unreached]) * n
+    parent = array('q', [-1]) * n
+    closed = bytearray(n)
+    push = heapq.heappush
+    pop = heapq.heappop
+    if table is not None:
+        (offsets, targets, edge_costs) = (table.offsets, table.targets, table.costs)
+    
+    g[start] = 0
+    hs = manhattan(start, dest) if h_table is None else h_table[start]
+    open_list = [(hs, hs, start)]
+    if h_table is not None:
+        # Same search, with each neighbour's heuristic read from the table
+        return _astar_flat_h(grid, dest, table, h_table, g, parent, closed, open_list)
+    while open_list:
+        (f, hu, u) = pop(open_list)
+        if closed[u]:
+            continue
+        if u == dest:
+            return (g, parent)
+        closed[u] = 1
+        gu = g[u]
         
-        # Add expanded node to closedSet
-        closedSet.add(expanding.state)
+        if table is not None:
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                if closed[v]:
+                    continue
+                gv = gu + edge_costs[k]
+                if gv < g[v]:
+                    g[v] = gv
+                    parent[v] = u
+                    hv = manhattan(v, dest)
+                    push(open_list, (gv + hv, hv, v))
+            continue
         
-        # Generate new nodes on frontier
-        for (action, cost, nextState) in problem.transitions(expanding.state):
-            childTotalCost = expanding.totalCost + cost
-            childHeuristicCost = heuristic(nextState, dest)
-            if nextState in closedSet:
+        for v in neighbours(u):
+            if closed[v]:
                 continue
-            frontier.put(SearchTreeNode(nextState, action, expanding, childTotalCost, childHeuristicCost))
+            cost = costs[v]
+            if cost < 0:
+                continue
+            gv = gu + cost
+            if gv < g[v]:
+                g[v] = gv
+                parent[v] = u
+                hv = manhattan(v, dest)
+                push(open_list, (gv + hv, hv, v))
+    return None
+
+def _astar_flat_h(grid, dest, table, h_table, g, parent, closed, open_list):
+    """
+    The main loop of astar_flat for searches guided by a heuristic table
+    """
+    push = heapq.heappush
+    pop = heapq.heappop
+    if table is None:
+        table = TransitionTable(grid)
+    (offsets, targets, edge_costs) = (table.offsets, table.targets, table.costs)
     
-    # No solution
+    while open_list:
+        (f, hu, u) = pop(open_list)
+        if closed[u]:
+            continue
+        if u == dest:
+            return (g, parent)
+        closed[u] = 1
+        gu = g[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            hv = h_table[v]
+            if closed[v] or hv >= DistanceField.INF:
+                continue
+            gv = gu + edge_costs[k]
+            if gv < g[v]:
+                g[v] = gv
+                parent[v] = u
+                push(open_list, (gv + hv, hv, v))
     return None
 
+def _get_flat_solution(grid, parent, g, start, dest):
+    """
+    Returns a solution (cost, sequence of actions) from the parent pointers
+    left behind by astar_flat for the given start and dest indices
+    """
+    soln = []
+    node = dest
+    while node != start:
+        prev = parent[node]
+        soln.append(grid.action(prev, node))
+        node = prev
+    soln.reverse()
+    return (g[dest], soln)
+
+def pathfind_grid(problem, start, dest):
+    """
+    Drop-in counterpart to pathfind that encodes the given MazeProblem as a
+    MazeGrid and searches over flat cell indices with astar_flat, walking
+    the problem's TransitionTable if it has been compiled and reading the
+    problem's DistanceField toward dest if it asks for an exact heuristic.
+    Returns the same (cost, actions) tuple as pathfind, or None
+    :problem: A MazeProblem object
+    :start: A maze location tuple
+    :dest: A maze location tuple
+    """
+    grid = problem.grid()
+    (s, d) = (grid.index(start), grid.index(dest))
+    if problem.exact_heuristic:
+        result = astar_flat(grid, s, d, problem.compile(), problem.distance_field(dest).dist)
+    else:
+        result = astar_flat(grid, s, d, problem.table)
+    if result is None:
+        return None
+    (g, parent) = result
+    return _get_flat_solution(grid, parent, g, s, d)
+
+def pathfind_many(problem, pairs, batch_threshold = 4):
+    """
+    Answers many pathfinding queries on the same MazeProblem at once,
+    returning a list with one pathfind-style (cost, actions) tuple (or None)
+    per (start, dest) pair, in the order given. Queries are grouped by
+    destination; a destination asked about at least batch_threshold times
+    gets a single backward Dijkstra (the problem's cached DistanceField),
+    which answers unreachable starts outright and confines the search for
+    every other start to cells on one of its cheapest paths, while rarer
+    destinations are answered by pathfind. Every answer is the very tuple
+    pathfind returns for the pair, down to its choice among equally cheap
+    paths
+    :problem: A MazeProblem object
+    :pairs: An iterable of (start, dest) maze location tuples
+    :batch_threshold: The number of queries sharing a destination from which
+    it is cheaper to solve for the destination than per query
+    """
+    pairs = list(pairs)
+    by_dest = {}
+    for (i, (start, dest)) in enumerate(pairs):
+        by_dest.setdefault(dest, []).append(i)
+    
+    results = [None] * len(pairs)
+    for (dest, indices) in by_dest.items():
+        if len(indices) >= batch_threshold:
+            field = problem.distance_field(dest)
+            for i in indices:
+                results[i] = _astar(problem, pairs[i][0], dest, field)
+        else:
+            for i in indices:
+                results[i] = pathfind(problem, pairs[i][0], dest)
+    return results
+
+def pathfind_hierarchical(problem, start, dest, cluster_size = 16):
+    """
+    Hierarchical (HPA*) counterpart to pathfind for very large mazes: searches
+    the problem's cluster abstraction first and then refines only the
+    clusters on the chosen route. Returns a (cost, actions) tuple like
+    pathfind, or None; the path is near-optimal rather than optimal
+    :problem: A MazeProblem object
+    :start: A maze location tuple
+    :dest: A maze location tuple
+    :cluster_size: The width and height, in cells, of each cluster
+    """
+    return problem.hierarchy(cluster_size).path(start, dest)
+
+class PathfinderTests(unittest.TestCase):
+    def test_pathfind1(self):
+        maze = ["XXXXXX",
+                "X...GX",
+                "X..PPX",
+                "X....X",
+                "X..P.X",
+                "X@...X",
+                "XXXXXX"]
+        (cost, actions) = pathfind(MazeProblem(maze), (1, 5), (4, 1))
+        self.assertEqual(cost, 7)
+        self.assertEqual(len(actions), 7)
+        
+    def test_pathfind2(self):
+        # Cheaper to walk around the pit than through it
+        maze = ["XXXXX",
+                "X.P.X",
+                "X...X",
+                "XXXXX"]
+        self.assertEqual(pathfind(MazeProblem(maze), (1, 1), (3, 1)), (4, ["D", "R", "R", "U"]))
+        
+    def test_pathfind3(self):
+        maze = ["XXXXX",
+                "X.X.X",
+                "XXXXX"]
+        self.assertTrue(pathfind(MazeProblem(maze), (1, 1), (3, 1)) is None)
+        self.assertTrue(pathfind_grid(MazeProblem(maze), (1, 1), (3, 1)) is None)
+        
+    def test_pathfind_grid1(self):
+        maze = ["XXXXX",
+                "X.P.X",
+                "X.U.X",
+                "X...X",
+                "XXXXX"]
+        mp = MazeProblem(maze)
+        for (start, dest) in [((1, 1), (3, 1)), ((3, 3), (1, 1)), ((2, 2), (2, 2))]:
+            self.assertEqual(pathfind_grid(mp, start, dest)[0], pathfind(mp, start, dest)[0])
+        self.assertEqual(pathfind_grid(mp, (1, 1), (3, 1)), (6, ["D", "D", "R", "R", "U", "U"]))
+        
+    def test_pathfind_compiled1(self):
+        maze = [list("XXXXX"),
+                list("X.P.X"),
+                list("X.U.X"),
+                list("X...X"),
+                list("XXXXX")]
+        mp = MazeProblem(maze, compiled = True)
+        self.assertEqual(mp.transitions((1, 1)), [("D", 1, (1, 2)), ("R", 20, (2, 1))])
+        self.assertEqual(pathfind_grid(mp, (1, 1), (3, 1))[0], 6)
+        mp.set_cell((2, 1), "S")
+        self.assertEqual((mp.maze[1][2], maze[1][2]), ("S", "P"))
+        self.assertEqual(mp.transitions((1, 1)), [("D", 1, (1, 2)), ("R", 1, (2, 1))])
+        self.assertEqual(pathfind_grid(mp, (1, 1), (3, 1)), (2, ["R", "R"]))
+        self.assertEqual(pathfind(mp, (1, 1), (3, 1)), (2, ["R", "R"]))
+        
+    def test_pathfind_exact1(self):
+        maze = [list("XXXXXXX"),
+                list("X.....X"),
+                list("X.XXX.X"),
+                list("X.PPP.X"),
+                list("X.....X"),
+                list("XXXXXXX")]
+        mp = MazeProblem(maze, exact_heuristic = True)
+        self.assertEqual(pathfind(mp, (1, 4), (5, 4)), (4, ["R", "R", "R", "R"]))
+        self.assertEqual(pathfind_grid(mp, (3, 1), (5, 4)), (5, ["R", "R", "D", "D", "D"]))
+        mp.set_cell((4, 4), "X")
+        self.assertEqual(pathfind(mp, (1, 4), (5, 4))[0], 10)
+        self.assertEqual(pathfind_grid(mp, (1, 4), (5, 4))[0], 10)
+        self.assertEqual(mp.distance_field((5, 4)).rebuilds, 1)
+        
+        # Changes to the given maze cannot leave the cached field stale
+        maze[4][2] = "X"
+        self.assertEqual(pathfind(mp, (1, 4), (5, 4))[0], 10)
+        with self.assertRaises(TypeError):
+            mp.maze[4] = "XXXXXXX"
+        
+    def test_pathfind_many1(self):
+        maze = ["XXXXXXX",
+                "X..P..X",
+                "X.X.X.X",
+                "X..U..X",
+                "XXXXXXX"]
+        mp = MazeProblem(maze)
+        pairs = [((1, 1), (5, 3)), ((3, 2), (5, 3)), ((5, 3), (5, 3)), ((1, 3), (5, 3)),
+                 ((5, 1), (1, 1)), ((2, 2), (1, 1))]
+        results = pathfind_many(mp, pairs, batch_threshold = 3)
+        for (pair, result) in zip(pairs, results):
+            self.assertEqual(result, pathfind(mp, pair[0], pair[1]))
+        self.assertEqual(results[2], (0, []))
+        self.assertEqual(results[3], (10, ["R", "R", "R", "R"]))
+        
+    def test_pathfind_hierarchical1(self):
+        maze = [list("XXXXXXXXX"),
+                list("X.......X"),
+                list("X.XXXXX.X"),
+                list("X.......X"),
+                list("XXXXXXXXX")]
+        mp = MazeProblem(maze)
+        self.assertEqual(pathfind_hierarchical(mp, (1, 1), (7, 3), cluster_size = 4)[0], 8)
+        mp.set_cell((4, 1), "X")
+        mp.set_cell((4, 3), "P")
+        self.assertEqual(pathfind_hierarchical(mp, (1, 1), (7, 3), cluster_size = 4)[0], 27)
+        self.assertEqual(mp.hierarchy(4).rebuilds, 1)
+        
+    def test_frontier1(self):
+        # Dominated and stale entries are never returned
+        f = Frontier()
+        self.assertTrue(f.push((1, 1), 5, 0, "a"))
+        self.assertFalse(f.push((1, 1), 6, 0, "b"))
+        self.assertTrue(f.push((1, 1), 2, 0, "c"))
+        self.assertEqual(f.pop(), ((1, 1), 2, "c"))
+        self.assertTrue(f.pop() is None)
+        self.assertFalse(f.push((1, 1), 1, 0, "d"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+'''
+Frame renderer for the Environment's verbose mode. A Renderer is handed
+each tick's frame (a list of lines) lazily and draws at most fps frames
+per second, dropping the rest so that the simulation never waits on the
+terminal; the frames it keeps go to a sink:
+
+    AnsiSink: redraws only the cells that changed since the last frame,
+              via ANSI cursor addressing, in one write per frame
+    FileSink: appends every frame as plain text, e.g. to a log
+    NullSink: discards frames, for benchmarking the rest of the loop
+'''
+
+import io
+import sys
+import time
+import unittest
+
+class Renderer:
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, sink, fps = 30, clock = time.perf_counter):
+        """
+        Constructs a renderer drawing to the given sink
+        :sink: An AnsiSink, FileSink or NullSink (anything with draw(lines)
+        and close())
+        :fps: The most frames drawn per second, or None to draw them all
+        :clock: The time source used to space frames, in seconds
+        """
+        self.sink = sink
+        self.fps = fps
+        self.clock = clock
+        self.frames = 0
+        self.dropped = 0
+        self._last = None
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def render(self, make_lines, force = False):
+        """
+        Draws the frame returned by make_lines unless one was drawn too
+        recently, in which case make_lines is not called at all; returns
+        whether the frame was drawn
+        :force: Draw regardless of the frame rate, e.g. for a final frame
+        """
+        now = self.clock()
+        if not force and self.fps and self._last is not None and now - self._last < 1.0 / self.fps:
+            self.dropped += 1
+            return False
+        self.sink.draw(make_lines())
+        self._last = now
+        self.frames += 1
+        return True
+
+    def close(self):
+        self.sink.close()
+
+
+class AnsiSink:
+    """
+    Draws frames to a terminal, rewriting only the runs of characters
+    that differ from the previous frame
+    """
+
+    # Unchanged runs shorter than this are rewritten rather than skipped,
+    # as a cursor move would cost about as much
+    MIN_SKIP = 8
+
+    def __init__(self, stream = None):
+        self.stream = sys.stdout if stream is None else stream
+        self._lines = None
+
+    def draw(self, lines):
+        out = []
+        if self._lines is None:
+            out.append("\x1b[2J")
+            old_lines = []
+        else:
+            old_lines = self._lines
+        for (r, line) in enumerate(lines):
+            old = old_lines[r] if r < len(old_lines) else ""
+            if line != old:
+                AnsiSink._diff_line(out, r, line.ljust(len(old)), old)
+        for r in range(len(lines), len(old_lines)):
+            out.append("\x1b[%d;1H\x1b[K" % (r + 1))
+        self._lines = list(lines)
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+    def close(self):
+        """
+        Leaves the cursor on the line below the last frame
+        """
+        if self._lines is not None:
+            self.stream.write("\x1b[%d;1H" % (len(self._lines) + 1))
+            self.stream.flush()
+
+    @staticmethod
+    def _diff_line(out, r, line, old):
+        """
+        Appends to out the cursor moves and text rewriting row r from old
+        to line, which is at least as long
+        """
+        (n, m) = (len(line), len(old))
+        i = 0
+        while i < n:
+            if i < m and line[i] == old[i]:
+                i += 1
+                continue
+            j = i + 1
+            while j < n:
+                if j < m and line[j] == old[j]:
+                    k = j
+                    while k < m and k < n and line[k] == old[k]:
+                        k += 1
+                    if k - j >= AnsiSink.MIN_SKIP or k == n:
+                        break
+                    j = k
+                else:
+                    j += 1
+            out.append("\x1b[%d;%dH%s" % (r + 1, i + 1, line[i:j]))
+            i = j
+
+
+class FileSink:
+    """
+    Appends every frame as plain lines followed by a blank line, to a
+    stream or to a file at the given path (which it then owns)
+    """
+
+    def __init__(self, target):
+        self._owned = isinstance(target, str)
+        self.stream = open(target, "w") if self._owned else target
+
+    def draw(self, lines):
+        self.stream.write("\n".join(lines) + "\n\n")
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class NullSink:
+    """
+    Discards every frame
+    """
+
+    def draw(self, lines):
+        pass
+
+    def close(self):
+        pass
+
+
+def default_renderer(stream = None):
+    """
+    Returns the renderer verbose Environments use when not given one:
+    diff-based redraws at 30 frames per second on a terminal, otherwise
+    (e.g. piped output) every frame as plain text
+    """
+    stream = sys.stdout if stream is None else stream
+    isatty = getattr(stream, "isatty", None)
+    if isatty is not None and isatty():
+        return Renderer(AnsiSink(stream))
+    return Renderer(FileSink(stream), fps = None)
+
+
+class RendererTests(unittest.TestCase):
+    def test_renderer1(self):
+        # Frames closer together than 1 / fps are dropped unless forced
+        now = [0.0]
+        sink = FileSink(io.StringIO())
+        renderer = Renderer(sink, fps = 10, clock = lambda: now[0])
+        drawn = []
+        for k in range(10):
+            now[0] = k * 0.04
+            drawn.append(renderer.render(lambda: ["frame %d" % k]))
+        self.assertEqual(drawn, [True, False, False, True, False, False, True, False, False, True])
+        self.assertTrue(renderer.render(lambda: ["last"], force = True))
+        self.assertEqual((renderer.frames, renderer.dropped), (5, 6))
+        self.assertEqual(sink.stream.getvalue(), "frame 0\n\nframe 3\n\nframe 6\n\nframe 9\n\nlast\n\n")
+        renderer = Renderer(NullSink(), fps = None)
+        self.assertTrue(all(renderer.render(lambda: ["x"]) for k in range(5)))
+
+    def test_renderer2(self):
+        # Only changed runs are rewritten, each frame in one write
+        stream = io.StringIO()
+        sink = AnsiSink(stream)
+        sink.draw(["XXXX", "X@.X", "Score: 0"])
+        self.assertEqual(stream.getvalue(), "\x1b[2J\x1b[1;1HXXXX\x1b[2;1HX@.X\x1b[3;1HScore: 0")
+        stream.truncate(0)
+        stream.seek(0)
+        sink.draw(["XXXX", "X.@X", "Score: -1"])
+        self.assertEqual(stream.getvalue(), "\x1b[2;2H.@\x1b[3;8H-1")
+        stream.truncate(0)
+        stream.seek(0)
+        sink.draw(["XXXX", "X.@X", "Score: 9", "done"])
+        sink.draw(["XXXX", "X.@X"])
+        sink.close()
+        self.assertEqual(stream.getvalue(), "\x1b[3;8H9 \x1b[4;1Hdone\x1b[3;1H\x1b[K\x1b[4;1H\x1b[K\x1b[3;1H")
+        out = []
+        AnsiSink._diff_line(out, 0, "a" + "." * 10 + "b" + ".." + "c", "." * 14)
+        self.assertEqual(out, ["\x1b[1;1Ha", "\x1b[1;12Hb..c"])
+
+if __name__ == "__main__":
+    unittest.main()
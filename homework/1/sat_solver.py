@@ -0,0 +1,457 @@
+'''
+Incremental CDCL satisfiability solver over CNF clauses of signed int
+literals (as interned by MazeClause.SYMBOLS). Clauses are watched by two
+of their literals, so unit propagation only visits clauses whose watch
+was falsified; conflicts are analysed down to a first-UIP clause that is
+learned and kept, and decisions follow VSIDS activity with phase saving.
+Queries are solved under assumptions, which are decided before any other
+variable and never become clauses, so everything learned while answering
+one query remains valid for the next.
+'''
+
+import copy
+import heapq
+import unittest
+
+class SatSolver:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Factor by which older conflicts' activity bumps fade
+    ACTIVITY_DECAY = 0.95
+
+    # Activity beyond which all activities are scaled back down
+    ACTIVITY_LIMIT = 1e100
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self):
+        """
+        Constructs a solver with no clauses (so, satisfiable)
+        """
+        # False once the clauses are known to be unsatisfiable
+        self.ok = True
+        self.learned = []
+        # Ids of the given (not learned) clauses held, which all stay
+        # referenced from the watch lists for as long as they are held
+        self._given = set()
+        # Values (1 true, -1 false, 0 free) by variable of the satisfying
+        # assignment found by the last successful solve
+        self.model = []
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+
+        # Literal -> list of clauses (lists of literals, watching their
+        # first two) in which it is watched
+        self._watches = {}
+
+        # Per variable: 1 if true, -1 if false, 0 if unassigned; the
+        # decision level and reason clause of its assignment; its VSIDS
+        # activity and saved phase; and whether it occurs in any clause
+        self._value = [0]
+        self._level = [0]
+        self._reason = [None]
+        self._activity = [0.0]
+        self._phase = [False]
+        self._used = [False]
+
+        self._trail = []
+        self._trail_lim = []
+        self._qhead = 0
+        self._order = []
+        self._var_inc = 1.0
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def add_clause(self, literals):
+        """
+        Adds the clause that is the disjunction of the given signed int
+        literals; returns False if the clauses are now unsatisfiable
+        """
+        if not self.ok:
+            return False
+        literals = set(literals)
+        for lit in literals:
+            self._use(abs(lit))
+        value = self._value
+        lits = []
+        for lit in literals:
+            if -lit in literals:
+                return True
+            v = value[abs(lit)]
+            v = v if lit > 0 else -v
+            # Assignments made between solves are permanent (level 0)
+            if v > 0:
+                return True
+            if v == 0:
+                lits.append(lit)
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self._enqueue(lits[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self._given.add(id(lits))
+            self._watch(lits)
+        return self.ok
+
+    def remove_clause(self, literals):
+        """
+        Removes the clause that is the disjunction of the given signed int
+        literals, if it is held as given; it must be implied by the other
+        clauses, so that what was learned from it stays valid. Returns True
+        if the clause was found
+        """
+        target = set(literals)
+        watches = self._watches
+        for lit in target:
+            for clause in watches.get(lit, ()):
+                if id(clause) in self._given and len(clause) == len(target) and target.issuperset(clause):
+                    for watched in clause[:2]:
+                        ws = watches[watched]
+                        del ws[next(k for k in range(len(ws)) if ws[k] is clause)]
+                    self._given.discard(id(clause))
+                    return True
+        return False
+
+    def solve(self, assumptions = ()):
+        """
+        Returns True if the clauses are satisfiable with all the given
+        signed int literals true, False otherwise
+        """
+        if not self.ok:
+            return False
+        assumptions = list(assumptions)
+        for lit in assumptions:
+            self._ensure(abs(lit))
+        value = self._value
+        try:
+            while True:
+                conflict = self._propagate()
+                if conflict is not None:
+                    self.conflicts += 1
+                    if not self._trail_lim:
+                        self.ok = False
+                        return False
+                    (learnt, level) = self._analyze(conflict)
+                    self._cancel_until(level)
+                    if len(learnt) == 1:
+                        self._enqueue(learnt[0], None)
+                    else:
+                        self.learned.append(learnt)
+                        self._watch(learnt)
+                        self._enqueue(learnt[0], learnt)
+                    self._var_inc /= SatSolver.ACTIVITY_DECAY
+                    continue
+                depth = len(self._trail_lim)
+                if depth < len(assumptions):
+                    lit = assumptions[depth]
+                    v = value[abs(lit)]
+                    v = v if lit > 0 else -v
+                    if v < 0:
+                        return False
+                    # A level per assumption, empty if it already holds
+                    self._trail_lim.append(len(self._trail))
+                    if v == 0:
+                        self._enqueue(lit, None)
+                    continue
+                var = self._pick_branch()
+                if var is None:
+                    self.model = list(value)
+                    return True
+                self.decisions += 1
+                self._trail_lim.append(len(self._trail))
+                self._enqueue(var if self._phase[var] else -var, None)
+        finally:
+            self._cancel_until(0)
+
+    def copy(self):
+        """
+        Returns an independent copy of this solver, learned clauses and
+        all; it must not be called during a solve
+        """
+        memo = {}
+        other = copy.deepcopy(self, memo)
+        other._given = {id(memo[given]) for given in self._given}
+        return other
+
+    def value(self, lit):
+        """
+        Returns True or False if the given signed int literal holds or
+        fails in every model of the clauses (as far as propagating them
+        has shown), None otherwise
+        """
+        var = abs(lit)
+        if var >= len(self._value) or self._value[var] == 0:
+            return None
+        return (self._value[var] > 0) == (lit > 0)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _ensure(self, var):
+        n = len(self._value)
+        if var >= n:
+            grow = var + 1 - n
+            self._value.extend([0] * grow)
+            self._level.extend([0] * grow)
+            self._reason.extend([None] * grow)
+            self._activity.extend([0.0] * grow)
+            self._phase.extend([False] * grow)
+            self._used.extend([False] * grow)
+
+    def _use(self, var):
+        """
+        Registers the given variable as occurring in a clause, making it a
+        candidate for decisions
+        """
+        self._ensure(var)
+        if not self._used[var]:
+            self._used[var] = True
+            heapq.heappush(self._order, (-self._activity[var], var))
+
+    def _watch(self, clause):
+        watches = self._watches
+        for lit in clause[:2]:
+            if lit in watches:
+                watches[lit].append(clause)
+            else:
+                watches[lit] = [clause]
+
+    def _enqueue(self, lit, reason):
+        var = abs(lit)
+        self._value[var] = 1 if lit > 0 else -1
+        self._level[var] = len(self._trail_lim)
+        self._reason[var] = reason
+        self._trail.append(lit)
+
+    def _propagate(self):
+        """
+        Propagates the assignments on the trail not yet propagated; returns
+        a conflicting clause, or None if there is none
+        """
+        value = self._value
+        watches = self._watches
+        trail = self._trail
+        while self._qhead < len(trail):
+            false_lit = -trail[self._qhead]
+            self._qhead += 1
+            self.propagations += 1
+            ws = watches.get(false_lit)
+            if not ws:
+                continue
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                clause = ws[i]
+                i += 1
+                # Keep the falsified watch second
+                if clause[0] == false_lit:
+                    clause[0] = clause[1]
+                    clause[1] = false_lit
+                first = clause[0]
+                v = value[abs(first)]
+                if (v if first > 0 else -v) > 0:
+                    ws[j] = clause
+                    j += 1
+                    continue
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    v = value[abs(lit)]
+                    if (v if lit > 0 else -v) >= 0:
+                        clause[1] = lit
+                        clause[k] = false_lit
+                        if lit in watches:
+                            watches[lit].append(clause)
+                        else:
+                            watches[lit] = [clause]
+                        break
+                else:
+                    ws[j] = clause
+                    j += 1
+                    v = value[abs(first)]
+                    if (v if first > 0 else -v) < 0:
+                        while i < n:
+                            ws[j] = ws[i]
+                            j += 1
+                            i += 1
+                        del ws[j:]
+                        self._qhead = len(trail)
+                        return clause
+                    self._enqueue(first, clause)
+            del ws[j:]
+        return None
+
+    def _analyze(self, conflict):
+        """
+        Returns the first-UIP clause learned from the given conflicting
+        clause, with its asserting literal first and a literal of the
+        highest remaining level second, and the level to backjump to
+        """
+        level = self._level
+        reason = self._reason
+        trail = self._trail
+        current = len(self._trail_lim)
+        seen = set()
+        learnt = [None]
+        pending = 0
+        lit = None
+        index = len(trail) - 1
+        clause = conflict
+        while True:
+            for q in (clause if lit is None else clause[1:]):
+                var = abs(q)
+                if var not in seen and level[var] > 0:
+                    seen.add(var)
+                    self._bump(var)
+                    if level[var] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while abs(trail[index]) not in seen:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            clause = reason[abs(lit)]
+            pending -= 1
+            if pending == 0:
+                break
+        learnt[0] = -lit
+        if len(learnt) == 1:
+            return (learnt, 0)
+        best = max(range(1, len(learnt)), key = lambda k: level[abs(learnt[k])])
+        (learnt[1], learnt[best]) = (learnt[best], learnt[1])
+        return (learnt, level[abs(learnt[1])])
+
+    def _cancel_until(self, target):
+        """
+        Undoes every assignment above the given decision level
+        """
+        if len(self._trail_lim) <= target:
+            return
+        value = self._value
+        reason = self._reason
+        phase = self._phase
+        activity = self._activity
+        order = self._order
+        start = self._trail_lim[target]
+        for lit in self._trail[start:]:
+            var = abs(lit)
+            value[var] = 0
+            reason[var] = None
+            phase[var] = lit > 0
+            heapq.heappush(order, (-activity[var], var))
+        del self._trail[start:]
+        del self._trail_lim[target:]
+        self._qhead = start
+
+    def _bump(self, var):
+        activity = self._activity
+        activity[var] += self._var_inc
+        if activity[var] > SatSolver.ACTIVITY_LIMIT:
+            for v in range(len(activity)):
+                activity[v] *= 1 / SatSolver.ACTIVITY_LIMIT
+            self._var_inc *= 1 / SatSolver.ACTIVITY_LIMIT
+            self._order = [(-activity[v], v) for v in range(len(activity)) if self._used[v] and self._value[v] == 0]
+            heapq.heapify(self._order)
+        elif self._value[var] == 0:
+            heapq.heappush(self._order, (-activity[var], var))
+
+    def _pick_branch(self):
+        """
+        Returns the unassigned variable of highest activity, or None if
+        every variable occurring in a clause is assigned
+        """
+        order = self._order
+        value = self._value
+        activity = self._activity
+        while order:
+            (act, var) = heapq.heappop(order)
+            if value[var] == 0 and -act == activity[var]:
+                return var
+        # Entries are only dropped once stale or assigned; make sure none
+        # was lost before concluding that everything is assigned
+        for var in range(1, len(value)):
+            if self._used[var] and value[var] == 0:
+                return var
+        return None
+
+
+class SatSolverTests(unittest.TestCase):
+    def test_sat1(self):
+        solver = SatSolver()
+        solver.add_clause([1, 2])
+        solver.add_clause([-1, 2])
+        solver.add_clause([1, -2, 3])
+        self.assertTrue(solver.solve())
+        self.assertTrue(solver.solve([-3]))
+        self.assertEqual(solver.model[2:4], [1, -1])
+        self.assertFalse(solver.solve([-2]))
+        self.assertFalse(solver.solve([-1, -3]))
+        self.assertTrue(solver.ok)
+        solver.add_clause([1, 3, 4])
+        self.assertTrue(solver.remove_clause([4, 3, 1]))
+        self.assertFalse(solver.remove_clause([4, 3, 1]))
+        self.assertTrue(solver.solve([-3]))
+        solver.add_clause([1, 3, 5])
+        other = solver.copy()
+        other.add_clause([-1])
+        self.assertFalse(other.solve([-3]))
+        self.assertTrue(solver.solve([-3]))
+        self.assertTrue(other.remove_clause([1, 3, 5]))
+        self.assertTrue(solver.remove_clause([1, 3, 5]))
+        solver.add_clause([-2])
+        self.assertFalse(solver.solve())
+        self.assertFalse(solver.ok)
+
+    def test_sat2(self):
+        # Three pigeons in two holes: unsatisfiable only through search,
+        # and the clauses learned doing so are kept for later solves
+        solver = SatSolver()
+        var = lambda p, h: 2 * p + h + 1
+        for p in range(3):
+            solver.add_clause([var(p, 0), var(p, 1)])
+        for h in range(2):
+            for p in range(3):
+                for q in range(p + 1, 3):
+                    solver.add_clause([-var(p, h), -var(q, h)])
+        self.assertFalse(solver.solve())
+        self.assertTrue(solver.conflicts > 0)
+
+        solver = SatSolver()
+        for p in range(2):
+            solver.add_clause([var(p, 0), var(p, 1)])
+        for p in range(2):
+            for q in range(p + 1, 3):
+                for h in range(2):
+                    solver.add_clause([-var(p, h), -var(q, h)])
+        self.assertTrue(solver.solve())
+        self.assertFalse(solver.solve([var(2, 0)]))
+        self.assertFalse(solver.solve([var(2, 1)]))
+        self.assertTrue(solver.solve([-var(2, 0), -var(2, 1)]))
+        self.assertTrue(solver.ok)
+
+    def test_sat3(self):
+        # A clause already satisfied at the root still sizes the solver
+        # (and its models) for its new variables
+        solver = SatSolver()
+        solver.add_clause([1])
+        solver.add_clause([1, 3])
+        self.assertTrue(solver.solve())
+        self.assertEqual(len(solver.model), 4)
+        self.assertTrue(solver.solve([-3]))
+        self.assertEqual(solver.model[3], -1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+'''
+Precompiled transition model of a MazeGrid in compressed sparse row
+(CSR) form: the legal moves out of cell i occupy the edge slots
+offsets[i] up to offsets[i+1], each slot holding the neighbour's flat
+index, the action taken (an index into ACTIONS) and the cost of moving
+onto the neighbour. Searches can walk these arrays directly instead of
+building transition lists, and single-cell cost changes are patched in
+place through the invalidation methods.
+'''
+
+import unittest
+from array import array
+from maze_grid import MazeGrid
+
+class TransitionTable:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Action codes stored per edge, in the order transitions are listed
+    ACTIONS = ("U", "D", "L", "R")
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, grid):
+        """
+        Compiles the transitions of the given MazeGrid
+        :grid: A MazeGrid object; later changes to it must be reported through
+        invalidate_cell (or invalidate_all) to keep the table in sync
+        """
+        self.grid = grid
+        self.version = 0
+        self.rebuilds = 0
+        self._build()
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    def edges(self, index):
+        """
+        Returns the range of edge slots leaving the given flat index
+        """
+        return range(self.offsets[index], self.offsets[index + 1])
+
+    def invalidate_cell(self, index):
+        """
+        Brings the table back in sync after the cell at the given flat index
+        changed in the grid. A cost change is patched in place on the (at
+        most 4) edges entering the cell; a cell turning into or out of a wall
+        changes which edges exist, so the table is recompiled.
+        Returns True if the table changed
+        """
+        grid = self.grid
+        new_cost = grid.costs[index]
+        if (new_cost == MazeGrid.WALL_COST) == self._is_enterable(index):
+            self._build()
+            self.rebuilds += 1
+            self.version += 1
+            return True
+        if new_cost == MazeGrid.WALL_COST:
+            return False
+        changed = False
+        costs = self.costs
+        targets = self.targets
+        for u in self.grid.neighbours(index):
+            for k in range(self.offsets[u], self.offsets[u + 1]):
+                if targets[k] == index and costs[k] != new_cost:
+                    costs[k] = new_cost
+                    changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def invalidate_all(self):
+        """
+        Recompiles the whole table from the grid
+        """
+        self._build()
+        self.rebuilds += 1
+        self.version += 1
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _is_enterable(self, index):
+        """
+        Returns True if the table was compiled with the given flat index
+        open (not a wall), whether or not any neighbour can reach it
+        """
+        return self._open[index] == 1
+
+    def _build(self):
+        grid = self.grid
+        w = grid.width
+        costs = grid.costs
+        wall = MazeGrid.WALL_COST
+        codes = {-w: 0, w: 1, -1: 2, 1: 3}
+        offsets = array('q', [0])
+        targets = array('q')
+        actions = bytearray()
+        edge_costs = array('q')
+        self._open = bytearray(0 if c == wall else 1 for c in costs)
+        for i in range(len(costs)):
+            for v in grid.neighbours(i):
+                if costs[v] != wall:
+                    targets.append(v)
+                    actions.append(codes[v - i])
+                    edge_costs.append(costs[v])
+            offsets.append(len(targets))
+        self.offsets = offsets
+        self.targets = targets
+        self.actions = actions
+        self.costs = edge_costs
+
+
+class TransitionTableTests(unittest.TestCase):
+    COST_MAP = {"P": 20, ".": 1, "U": 7}
+
+    def test_table1(self):
+        grid = MazeGrid.from_maze(["XXXX",
+                                   "X.PX",
+                                   "XXXX"], self.COST_MAP, "X")
+        table = TransitionTable(grid)
+        start = grid.index((1, 1))
+        self.assertEqual([(TransitionTable.ACTIONS[table.actions[k]], table.costs[k], table.targets[k]) for k in table.edges(start)],
+                         [("R", 20, grid.index((2, 1)))])
+
+        # Cost changes are patched in place
+        grid.set_cell((2, 1), "U")
+        self.assertTrue(table.invalidate_cell(grid.index((2, 1))))
+        self.assertEqual(table.rebuilds, 0)
+        self.assertEqual([table.costs[k] for k in table.edges(start)], [7])
+        self.assertFalse(table.invalidate_cell(grid.index((2, 1))))
+
+    def test_table2(self):
+        grid = MazeGrid.from_maze(["XXXX",
+                                   "X..X",
+                                   "XXXX"], self.COST_MAP, "X")
+        table = TransitionTable(grid)
+        start = grid.index((1, 1))
+
+        # Walls change which edges exist
+        grid.set_cell((2, 1), "X")
+        self.assertTrue(table.invalidate_cell(grid.index((2, 1))))
+        self.assertEqual(table.rebuilds, 1)
+        self.assertEqual(len(table.edges(start)), 0)
+        grid.set_cell((2, 1), ".")
+        self.assertTrue(table.invalidate_cell(grid.index((2, 1))))
+        self.assertEqual(len(table.edges(start)), 1)
+
+        # An open cell no neighbour leads into is patched, not recompiled
+        grid = MazeGrid.from_maze(["."], self.COST_MAP, "X")
+        table = TransitionTable(grid)
+        grid.set_cell((0, 0), "P")
+        self.assertFalse(table.invalidate_cell(0))
+        self.assertEqual(table.rebuilds, 0)
+        grid.set_cell((0, 0), "X")
+        self.assertTrue(table.invalidate_cell(0))
+        self.assertEqual(table.rebuilds, 1)
+
+if __name__ == "__main__":
+    unittest.main()
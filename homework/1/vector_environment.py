@@ -0,0 +1,250 @@
+'''
+Environment stepping N same-shape Maze Pitfall episodes in lockstep, for
+agents that decide for many episodes at once. The N true maps (breezes
+revealed) are stacked into one bytearray and each player is kept as an
+index into it, so that a step works on the whole batch at once: the
+target cells of all N moves are gathered from the buffer in one call,
+and wall blocking, pit and move penalties and goal checks are byte
+translations and element-wise maps over the gathered tiles, leaving only
+the episodes that finish (and the perceptions handed back) to per-episode
+Python code. Finished episodes are reset in place to their maze's start.
+'''
+
+import random
+import unittest
+from operator import add, itemgetter, mul, sub
+from environment import Environment
+from maze_generator import generate_maze
+from maze_view import MazeView
+
+def _byte_table(values, default = 0):
+    """
+    Returns a bytes.translate table mapping the character code of each
+    maze element in the given dict to its value, and every other code to
+    default
+    """
+    table = bytearray([default]) * 256
+    for (block, value) in values.items():
+        table[ord(block)] = value
+    return bytes(table)
+
+
+class VectorEnvironment:
+
+    ##################################################################
+    # Class Constants
+    ##################################################################
+
+    # Translation tables from tiles to wall flags, goal flags and the
+    # penalty of moving onto them
+    _WALLS = _byte_table({Environment.WALL_BLOCK: 1})
+    _GOALS = _byte_table({Environment.GOAL_BLOCK: 1})
+    _PENALTIES = _byte_table({Environment.PIT_BLOCK: Environment.PIT_PENALTY}, Environment.MOV_PENALTY)
+
+
+    ##################################################################
+    # Constructor
+    ##################################################################
+
+    def __init__(self, mazes):
+        """
+        Constructs a batch of one episode per given maze
+        :mazes: A list of mazes, each a list of strings with one start (@),
+        all of the same shape and each surrounded by walls
+        """
+        views = [MazeView.from_maze(maze) for maze in mazes]
+        if not views:
+            raise ValueError("a VectorEnvironment needs at least one maze")
+        (w, h) = (views[0].width, views[0].height)
+        if any((view.width, view.height) != (w, h) for view in views):
+            raise ValueError("all mazes must have the same shape")
+        self.count = len(views)
+        self.width = w
+        self.height = h
+        self._size = w * h
+        self._offsets = {"U": -w, "D": w, "L": -1, "R": 1, None: 0}
+        self._locations = [(i % w, i // w) for i in range(self._size)]
+        cells = bytearray()
+        for view in views:
+            cells += view.cells
+        start_code = Environment.PLR_BLOCK.encode("ascii")
+        starts = [view.cells.find(start_code) for view in views]
+        if min(starts) < 0:
+            raise ValueError("every maze needs a start")
+        self._bases = list(range(0, self.count * self._size, self._size))
+        self._starts = list(map(add, self._bases, starts))
+        self._ones = [1] * self.count
+        for start in self._starts:
+            cells[start] = ord(Environment.SAFE_BLOCK)
+        self._cells = bytes(Environment.reveal_breezes(cells, w, h))
+
+        # Per-episode state, indexed by maze; players are indices into the
+        # stacked cells
+        self._players = list(self._starts)
+        self.scores = [0] * self.count
+        self.ticks = [0] * self.count
+        self.episodes = 0
+        self.goals = 0
+
+
+    ##################################################################
+    # Methods
+    ##################################################################
+
+    @property
+    def locs(self):
+        """
+        Each episode's player location, as a flat index into its maze
+        """
+        return list(map(sub, self._players, self._bases))
+
+    def reset(self):
+        """
+        Restarts every episode and returns the batch of perceptions
+        """
+        self._players = list(self._starts)
+        self.scores = [0] * self.count
+        self.ticks = [0] * self.count
+        return self.perceptions()
+
+    def perceptions(self):
+        """
+        Returns each episode's current perception: a dict of the player's
+        location tuple and the tile there, as Environment hands MazeAgent
+        """
+        tiles = self._gather(self._players).decode("ascii")
+        return [{"loc": loc, "tile": tile} for (loc, tile) in zip(map(self._locations.__getitem__, self.locs), tiles)]
+
+    def step(self, moves):
+        """
+        Applies one move (U, D, L, R or None) to each episode and returns
+        (perceptions, scores, dones): the perceptions after the moves, each
+        episode's score after its move, and whether the move finished it,
+        by reaching a goal or Environment.MIN_SCORE; finished episodes are
+        then reset, so their perceptions are of their next episode's start
+        """
+        if len(moves) != self.count:
+            raise ValueError("expected %d moves, got %d" % (self.count, len(moves)))
+        offsets = list(map(self._offsets.__getitem__, moves))
+        players = list(map(add, self._players, offsets))
+
+        # Moves into walls are taken back, then every tile is charged for
+        walls = self._gather(players).translate(VectorEnvironment._WALLS)
+        if 1 in walls:
+            players = list(map(sub, players, map(mul, walls, offsets)))
+        tiles = self._gather(players)
+        scores = list(map(sub, self.scores, tiles.translate(VectorEnvironment._PENALTIES)))
+        ticks = list(map(add, self.ticks, self._ones))
+        results = list(scores)
+        dones = [False] * self.count
+
+        # Only the episodes that finished are visited one by one
+        goals = tiles.translate(VectorEnvironment._GOALS)
+        finished = []
+        k = goals.find(1)
+        while k >= 0:
+            finished.append(k)
+            k = goals.find(1, k + 1)
+        self.goals += len(finished)
+        if min(scores) <= Environment.MIN_SCORE:
+            finished += [k for (k, score) in enumerate(scores) if score <= Environment.MIN_SCORE and not goals[k]]
+        for k in finished:
+            dones[k] = True
+            (players[k], scores[k], ticks[k]) = (self._starts[k], 0, 0)
+        self.episodes += len(finished)
+        (self._players, self.scores, self.ticks) = (players, scores, ticks)
+        return (self.perceptions(), results, dones)
+
+
+    ##################################################################
+    # "Private" Helper Methods
+    ##################################################################
+
+    def _gather(self, indices):
+        """
+        Returns the stacked cells at the given indices, as bytes
+        """
+        if len(indices) == 1:
+            return self._cells[indices[0]:indices[0] + 1]
+        return bytes(itemgetter(*indices)(self._cells))
+
+
+class VectorEnvironmentTests(unittest.TestCase):
+    MAZES = [["XXXXXX",
+              "X...GX",
+              "X..PPX",
+              "X....X",
+              "X..P.X",
+              "X@...X",
+              "XXXXXX"],
+             ["XXXXXX",
+              "XP.PGX",
+              "X....X",
+              "X.@..X",
+              "XP.PPX",
+              "X...PX",
+              "XXXXXX"]]
+
+    class TickLog(list):
+        """
+        Stands in for a TraceRecorder, keeping each tick's (move, location,
+        tile, score delta) as an Environment reports it
+        """
+        def record(self, move, loc, tile, delta, *rest):
+            self.append((move, loc, tile, delta))
+
+    def test_vector1(self):
+        # Each episode sees what an Environment does when its MazeAgent
+        # makes the same moves
+        mazes = [generate_maze(12, 9, pit_density = 0.15, seed = seed) for seed in range(4)]
+        (logs, envs, starts, finals) = ([], [], [], [])
+        for maze in mazes:
+            log = VectorEnvironmentTests.TickLog()
+            env = Environment(maze, tick_length = 0, verbose = False, trace = log)
+            starts.append({"loc": env.get_player_loc(), "tile": Environment.SAFE_BLOCK})
+            finals.append(env.start_mission())
+            (logs, envs) = (logs + [log], envs + [env])
+        vector = VectorEnvironment(mazes)
+        self.assertEqual(vector.reset(), starts)
+        scores = [0] * len(mazes)
+        for t in range(max(len(log) for log in logs)):
+            (perceptions, results, dones) = vector.step([log[t][0] if t < len(log) else None for log in logs])
+            for (k, log) in enumerate(logs):
+                if t >= len(log):
+                    continue
+                (move, loc, tile, delta) = log[t]
+                scores[k] += delta
+                self.assertEqual((results[k], dones[k]), (scores[k], t == len(log) - 1))
+                self.assertEqual(perceptions[k], starts[k] if dones[k] else {"loc": loc, "tile": tile})
+        for (k, env) in enumerate(envs):
+            self.assertEqual((scores[k], len(logs[k])), (finals[k], env.get_stats()["ticks"]))
+            self.assertEqual(logs[k][-1][1], env.get_player_loc())
+        self.assertEqual(vector.goals, sum(env.get_stats()["goal_reached"] for env in envs))
+
+    def test_vector2(self):
+        vector = VectorEnvironment(self.MAZES * 2)
+        (perceptions, scores, dones) = vector.step(["U", "L", None, "R"])
+        self.assertEqual([p["loc"] for p in perceptions], [(1, 4), (1, 3), (1, 5), (3, 3)])
+        self.assertEqual(list(scores), [-1, -1, -1, -1])
+        (perceptions, scores, dones) = vector.step(["L", "D", "U", "D"])
+        self.assertEqual([p["loc"] for p in perceptions], [(1, 4), (1, 4), (1, 4), (3, 4)])
+        self.assertEqual(list(scores), [-2, -21, -2, -21])
+        self.assertEqual([p["tile"] for p in perceptions], [".", "P", ".", "P"])
+        self.assertEqual(dones, [False] * 4)
+        self.assertRaises(ValueError, vector.step, ["U"])
+        self.assertRaises(ValueError, VectorEnvironment, [self.MAZES[0], ["XXX", "X@X", "XXX"]])
+
+    def test_vector3(self):
+        # Random walkers finish and restart episodes without stopping
+        vector = VectorEnvironment(self.MAZES * 50)
+        rng = random.Random(0)
+        finished = 0
+        for t in range(200):
+            (perceptions, scores, dones) = vector.step([rng.choice("UDLR") for k in range(vector.count)])
+            finished += sum(dones)
+        self.assertEqual(vector.episodes, finished)
+        self.assertTrue(0 < vector.goals < finished)
+        self.assertTrue(all(score > Environment.MIN_SCORE for score in vector.scores))
+
+if __name__ == "__main__":
+    unittest.main()